@@ -442,39 +442,44 @@ class AdvancedMain:
         """运行主程序"""
         self.print_banner()
         
-        while True:
-            try:
-                self.print_main_menu()
-                choice = input("请选择操作: ").strip()
-                
-                if choice == '0':
-                    print("感谢使用AI网站搜索分析工具！")
-                    break
-                elif choice == '1':
-                    await self.handle_single_analysis()
-                elif choice == '2':
-                    await self.handle_batch_analysis()
-                elif choice == '3':
-                    self.handle_history_results()
-                elif choice == '4':
-                    await self.handle_login_management()
-                elif choice == '5':
-                    self.handle_settings()
-                elif choice == '6':
-                    self.print_help()
-                else:
-                    print("无效选择，请重新输入")
-                
-                if choice != '0':
-                    input("\n按回车键继续...")
-                    print()
+        try:
+            while True:
+                try:
+                    self.print_main_menu()
+                    choice = input("请选择操作: ").strip()
                     
-            except KeyboardInterrupt:
-                print("\n\n程序被用户中断，正在退出...")
-                break
-            except Exception as e:
-                print(f"\n程序运行出现错误: {e}")
-                input("按回车键继续...")
+                    if choice == '0':
+                        print("感谢使用AI网站搜索分析工具！")
+                        break
+                    elif choice == '1':
+                        await self.handle_single_analysis()
+                    elif choice == '2':
+                        await self.handle_batch_analysis()
+                    elif choice == '3':
+                        self.handle_history_results()
+                    elif choice == '4':
+                        await self.handle_login_management()
+                    elif choice == '5':
+                        self.handle_settings()
+                    elif choice == '6':
+                        self.print_help()
+                    else:
+                        print("无效选择，请重新输入")
+                    
+                    if choice != '0':
+                        input("\n按回车键继续...")
+                        print()
+                        
+                except KeyboardInterrupt:
+                    print("\n\n程序被用户中断，正在退出...")
+                    break
+                except Exception as e:
+                    print(f"\n程序运行出现错误: {e}")
+                    input("按回车键继续...")
+        finally:
+            # 退出时释放分析器的进程池和相关性索引
+            if self.analyzer:
+                self.analyzer.close()
 
 
 async def main():
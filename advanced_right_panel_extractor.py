@@ -9,6 +9,11 @@ import json
 import time
 from datetime import datetime
 from playwright.async_api import async_playwright
+
+from article_fetcher import ArticleFetcher
+from config import RELEVANCE_INDEX_CONFIG
+from relevance_index import RelevanceIndex
+from resource_policy import ResourcePolicy
 import re
 
 async def main():
@@ -18,6 +23,7 @@ async def main():
     print("="*80)
     
     playwright = None
+    resource_policy = None
     page = None
     
     try:
@@ -28,6 +34,10 @@ async def main():
             headless=False
         )
         
+        # 拦截图片、字体和追踪请求
+        resource_policy = ResourcePolicy("DeepSeek")
+        await resource_policy.apply(context)
+        
         if context.pages:
             page = context.pages[0]
         else:
@@ -165,72 +175,47 @@ async def main():
         website_data = []
         domains_to_visit = list(sorted(all_domains, key=lambda d: domain_info[d]['occurrences'], reverse=True))[:10]
         
-        for i, domain in enumerate(domains_to_visit):
+        # 并发抓取：先用 HTTP 连接池，被拦截或需要渲染时才占用浏览器标签页
+        urls = [domain if domain.startswith('http') else f"https://{domain}" for domain in domains_to_visit]
+        fetcher = ArticleFetcher(context)
+        try:
+            fetched = await fetcher.fetch_all(urls)
+        finally:
+            await fetcher.close()
+        fetcher.log_stats()
+        
+        # 抓到的文章写入相关性索引，后续分析可以检索整个历史
+        if RELEVANCE_INDEX_CONFIG['enabled']:
+            index = RelevanceIndex()
             try:
-                print(f"\\n访问 {i+1}/{len(domains_to_visit)}: {domain}")
-                
-                # 构造完整URL
-                if not domain.startswith('http'):
-                    url = f"https://{domain}"
-                else:
-                    url = domain
-                
-                # 创建新标签页访问网站
-                new_page = await context.new_page()
-                
-                try:
-                    # 设置较短的超时时间
-                    await new_page.goto(url, timeout=15000)
-                    await new_page.wait_for_load_state('load', timeout=10000)
-                    
-                    # 提取网站信息
-                    site_info = await new_page.evaluate("""
-                        () => {
-                            return {
-                                title: document.title || '',
-                                description: (document.querySelector('meta[name="description"]') || {}).content || '',
-                                keywords: (document.querySelector('meta[name="keywords"]') || {}).content || '',
-                                h1_texts: Array.from(document.querySelectorAll('h1')).map(h => h.innerText).slice(0, 3),
-                                h2_texts: Array.from(document.querySelectorAll('h2')).map(h => h.innerText).slice(0, 5),
-                                body_preview: document.body ? document.body.innerText.substring(0, 500) : '',
-                                links_count: document.querySelectorAll('a[href]').length,
-                                images_count: document.querySelectorAll('img').length
-                            };
-                        }
-                    """)
-                    
-                    website_data.append({
-                        'domain': domain,
-                        'url': url,
-                        'success': True,
-                        'info': site_info,
-                        'context_from_search': domain_info[domain]['contexts'][0][:200],
-                        'search_occurrences': domain_info[domain]['occurrences'],
-                        'related_dates': domain_info[domain]['dates'],
-                        'related_numbers': domain_info[domain]['numbers']
-                    })
-                    
-                    print(f"  ✅ 成功访问: {site_info['title'][:50]}...")
-                    
-                except Exception as e:
-                    website_data.append({
-                        'domain': domain,
-                        'url': url,
-                        'success': False,
-                        'error': str(e),
-                        'context_from_search': domain_info[domain]['contexts'][0][:200],
-                        'search_occurrences': domain_info[domain]['occurrences']
-                    })
-                    print(f"  ❌ 访问失败: {str(e)[:50]}...")
-                
-                finally:
-                    await new_page.close()
-                
-                # 等待一下避免请求过快
-                await asyncio.sleep(2)
-                
-            except Exception as e:
-                print(f"  ❌ 处理域名 {domain} 时出错: {e}")
+                added = index.add_articles(fetched, query)
+                print(f"  已加入相关性索引: {added} 篇文章")
+            finally:
+                index.close()
+        
+        for domain, url, site_info in zip(domains_to_visit, urls, fetched):
+            if site_info.get('success'):
+                website_data.append({
+                    'domain': domain,
+                    'url': url,
+                    'success': True,
+                    'info': site_info,
+                    'context_from_search': domain_info[domain]['contexts'][0][:200],
+                    'search_occurrences': domain_info[domain]['occurrences'],
+                    'related_dates': domain_info[domain]['dates'],
+                    'related_numbers': domain_info[domain]['numbers']
+                })
+                print(f"  ✅ 成功访问 {domain}: {site_info['title'][:50]}...")
+            else:
+                website_data.append({
+                    'domain': domain,
+                    'url': url,
+                    'success': False,
+                    'error': site_info.get('error', ''),
+                    'context_from_search': domain_info[domain]['contexts'][0][:200],
+                    'search_occurrences': domain_info[domain]['occurrences']
+                })
+                print(f"  ❌ 访问 {domain} 失败: {site_info.get('error', '')[:50]}...")
         
         # 10. 保存结果
         result = {
@@ -276,6 +261,8 @@ async def main():
         traceback.print_exc()
     
     finally:
+        if resource_policy:
+            resource_policy.log_stats()
         try:
             if page and page.context:
                 await page.context.close()
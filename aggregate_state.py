@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量分析 - 按关键词保存可合并的统计状态
+
+每个关键词的分析结果保存为一份可合并的状态：词频（流式统计结构）、情绪的累加和与直方图、
+按网站的计数和分数累加和、综合评分最高的结果。新结果到达时只分析没见过的结果并合并进状态，
+报告由合并后的状态生成，每天刷新的代价只与新数据成正比，与历史长度无关。
+每次合并都会递增状态的版本号并记录一条历史；保存格式变化后旧状态会被丢弃并重新累计。
+已统计过的结果记录在固定大小的 Bloom 过滤器中，状态文件的大小和读写代价也不随历史增长。
+"""
+
+import hashlib
+import heapq
+import json
+import logging
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import AGGREGATE_CONFIG
+from segmentation_cache import SegmentationCache
+from sentiment_lexicon import SentimentAnalyzer, polarity_label
+from streaming_counts import BloomFilter, StreamingWordCounter, domain_of, hash64
+
+logger = logging.getLogger(__name__)
+
+# 保存格式版本，字段含义变化时递增
+STATE_FORMAT = 2
+# 可以迁移的旧格式（1：已统计结果的内容键以列表保存在 JSON 字段中）
+COMPATIBLE_FORMATS = (1, STATE_FORMAT)
+
+
+def result_key(result: Dict[str, Any]) -> str:
+    """结果的内容键（同一网站、同一链接、同样内容的结果只统计一次）"""
+    text = f"{result.get('website', '')}\0{result.get('link') or result.get('url', '')}\0{result.get('content', '')}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class KeywordAggregate:
+    """一个关键词（某一类分析）的可合并统计状态"""
+
+    def __init__(self, keyword: str, kind: str):
+        """
+        Args:
+            keyword: 关键词
+            kind: 状态类型（'report' 为 DataAnalyzer 报告，'ranking' 为 AIAnalyzer 结果排名）
+        """
+        self.keyword = keyword
+        self.kind = kind
+        self.version = 0
+        self.created_at = datetime.now().isoformat()
+        self.updated_at = self.created_at
+        self.history: List[Dict[str, Any]] = []
+        # 已统计结果的内容键
+        self.seen = BloomFilter(AGGREGATE_CONFIG['seen_capacity'], AGGREGATE_CONFIG['seen_error_rate'])
+
+        self.total_results = 0
+        self.words = StreamingWordCounter(keyword)
+        # 情绪累加和：texts, polarity_sum, subjectivity_sum
+        self.sentiment: Counter = Counter()
+        self.sentiment_labels: Counter = Counter()
+        self.histogram_edges = np.linspace(-1.0, 1.0, AGGREGATE_CONFIG['histogram_bins'] + 1)
+        self.polarity_histogram = np.zeros(AGGREGATE_CONFIG['histogram_bins'], dtype=np.int64)
+        # 网站 -> 计数和分数累加和
+        self.sites: Dict[str, Counter] = {}
+        # 综合评分最高的结果
+        self.top_results: List[Dict[str, Any]] = []
+
+    # ---------- 合并 ----------
+
+    def new_results(self, results: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """过滤出没有统计过的结果（同一批中重复的结果只保留一次）"""
+        results = list(results)
+        keys = [result_key(result) for result in results]
+        seen = self.seen.contains(hash64(keys))
+        fresh, batch = [], set()
+        for result, key, known in zip(results, keys, seen.tolist()):
+            if not known and key not in batch:
+                batch.add(key)
+                fresh.append(result)
+        return fresh
+
+    def _mark_seen(self, results: Sequence[Dict[str, Any]]):
+        self.seen.update(hash64(result_key(result) for result in results))
+        previous = self.total_results
+        self.total_results += len(results)
+        if previous <= self.seen.capacity < self.total_results:
+            logger.warning(f"关键词 {self.keyword} 已统计的结果超过 {self.seen.capacity} 条，"
+                           f"新结果被误判为已统计的概率会上升，可调大 seen_capacity")
+
+    def _add_sentiment(self, websites: Sequence[str], scores: Sequence[Tuple[float, float]]):
+        if not scores:
+            return
+        polarities = np.array([polarity for polarity, _ in scores], dtype=np.float64)
+        self.sentiment['texts'] += len(scores)
+        self.sentiment['polarity_sum'] += float(polarities.sum())
+        self.sentiment['subjectivity_sum'] += float(sum(subjectivity for _, subjectivity in scores))
+        self.sentiment_labels.update(polarity_label(polarity) for polarity in polarities.tolist())
+        self.polarity_histogram += np.histogram(np.clip(polarities, -1.0, 1.0), bins=self.histogram_edges)[0]
+        for website, polarity in zip(websites, polarities.tolist()):
+            self.sites.setdefault(website, Counter())['polarity_sum'] += polarity
+
+    def _bump_version(self, new_results: int, source: str):
+        self.version += 1
+        self.updated_at = datetime.now().isoformat()
+        self.history.append({'version': self.version, 'time': self.updated_at,
+                             'new_results': new_results, 'source': source})
+        del self.history[:-AGGREGATE_CONFIG['history_limit']]
+
+    def fold_texts(self, results: Sequence[Dict[str, Any]], segmenter: SegmentationCache,
+                   sentiment: SentimentAnalyzer,
+                   collapse: Optional[Callable[[List[str]], Dict[str, Any]]] = None) -> int:
+        """
+        合并新的 AI 回答（DataAnalyzer 的输入格式）：分词计数、情绪和按网站的计数
+
+        Args:
+            collapse: 近似重复合并（DataAnalyzer.collapse_near_duplicates），
+                      重复的文本只计入结果数，不计入词频、情绪和网站的文本数
+
+        Returns:
+            新合并的结果数
+        """
+        fresh = self.new_results(results)
+        if not fresh:
+            return 0
+        with_content = [result for result in fresh if result.get('content')]
+        if collapse is not None and with_content:
+            unique = collapse([result['content'] for result in with_content])['unique_indices']
+            with_content = [with_content[i] for i in unique]
+        counted = {id(result) for result in with_content}
+        texts = [result['content'] for result in with_content]
+        websites = [result.get('website', '') for result in with_content]
+
+        for words in segmenter.iter_filtered(texts):
+            self.words.add_words(words)
+        self.words.add_domains(domain_of(result) for result in fresh)
+        self._add_sentiment(websites, sentiment.score_batch(texts))
+        for result in fresh:
+            site = self.sites.setdefault(result.get('website', ''), Counter())
+            site['results'] += 1
+            site['texts'] += 1 if id(result) in counted else 0
+
+        self._mark_seen(fresh)
+        self._bump_version(len(fresh), 'report')
+        return len(fresh)
+
+    def fold_ranking(self, results: Sequence[Dict[str, Any]],
+                     analyze: Callable[[List[Dict[str, Any]]], Dict[str, Any]]) -> int:
+        """
+        合并新的搜索结果的 AIAnalyzer 分析
+
+        Args:
+            results: 搜索结果
+            analyze: 只对新结果调用的分析函数（AIAnalyzer.analyze_results 的单批版本）
+
+        Returns:
+            新合并的结果数
+        """
+        fresh = self.new_results(results)
+        if not fresh:
+            return 0
+        analysis = analyze(fresh)
+
+        frequency = analysis['frequency_analysis']
+        for website, count in frequency['title_frequency'].items():
+            self.sites.setdefault(website, Counter())['title_hits'] += count
+        for website, count in frequency['content_frequency'].items():
+            self.sites.setdefault(website, Counter())['content_hits'] += count
+
+        detailed = analysis['detailed_analysis']
+        for item in detailed:
+            site = self.sites.setdefault(item['website'], Counter())
+            site['results'] += 1
+            site['relevance_sum'] += item['relevance_score']
+            site['authority_sum'] += item['authority_score']
+            site['overall_sum'] += item['overall_score']
+        self._add_sentiment([item['website'] for item in detailed],
+                            [(item['sentiment']['polarity'], item['sentiment']['subjectivity']) for item in detailed])
+
+        self.top_results = heapq.nlargest(AGGREGATE_CONFIG['top_results'], self.top_results + detailed,
+                                          key=lambda item: item['overall_score'])
+        self._mark_seen(fresh)
+        self._bump_version(len(fresh), 'ranking')
+        return len(fresh)
+
+    def merge(self, other: 'KeywordAggregate'):
+        """合并另一份同一关键词、同一类型的状态（例如在另一台机器上累计的状态）"""
+        # 两边都统计过的结果数 ≈ 两边各自的不同结果数之和 - 合并后的不同结果数
+        own, theirs = self.seen.estimate(), other.seen.estimate()
+        self.seen.merge(other.seen)
+        overlap = own + theirs - self.seen.estimate()
+        if overlap > max(1, 0.01 * min(own, theirs)):
+            logger.warning(f"合并的状态中约有 {overlap} 条结果两边都统计过，这部分会被重复计入")
+        self.total_results += other.total_results
+        self.words.merge(other.words)
+        self.sentiment.update(other.sentiment)
+        self.sentiment_labels.update(other.sentiment_labels)
+        self.polarity_histogram += other.polarity_histogram
+        for website, counters in other.sites.items():
+            self.sites.setdefault(website, Counter()).update(counters)
+        self.top_results = heapq.nlargest(AGGREGATE_CONFIG['top_results'], self.top_results + other.top_results,
+                                          key=lambda item: item['overall_score'])
+        self._bump_version(other.total_results, 'merge')
+
+    # ---------- 报告 ----------
+
+    def sentiment_summary(self) -> Dict[str, Any]:
+        """累计的情绪统计"""
+        texts = self.sentiment['texts']
+        average_polarity = self.sentiment['polarity_sum'] / texts if texts else 0.0
+        return {
+            'average_polarity': average_polarity,
+            'average_subjectivity': self.sentiment['subjectivity_sum'] / texts if texts else 0.0,
+            'overall_sentiment': polarity_label(average_polarity),
+            'sentiment_distribution': dict(self.sentiment_labels),
+            'polarity_histogram': {
+                'edges': self.histogram_edges.round(3).tolist(),
+                'counts': self.polarity_histogram.tolist()
+            },
+            'total_texts': texts
+        }
+
+    def report(self) -> Dict[str, Any]:
+        """由累计状态生成的关键词报告（DataAnalyzer 报告的累计版本）"""
+        stats = self.words.get_stats()
+        keyword_count = self.words.related_words.get(self.keyword, 0)
+        keyword_frequency = keyword_count / stats['total_words'] if stats['total_words'] else 0
+        return {
+            'keyword': self.keyword,
+            'version': self.version,
+            'updated_at': self.updated_at,
+            'total_results': self.total_results,
+            'frequency_analysis': {
+                'keyword': self.keyword,
+                'keyword_count': keyword_count,
+                'total_words': stats['total_words'],
+                'keyword_frequency': keyword_frequency,
+                'keyword_percentage': keyword_frequency * 100,
+                'related_words': dict(self.words.related_words),
+                'top_words': dict(self.words.most_common(20)),
+                'total_texts': stats['total_texts'],
+                'counting_mode': 'streaming',
+                'top_words_max_error': stats['max_error'],
+                'distinct_terms_estimate': stats['distinct_terms_estimate'],
+                'distinct_domains_estimate': stats['distinct_domains_estimate']
+            },
+            'sentiment_analysis': self.sentiment_summary(),
+            'site_analysis': {
+                website: {
+                    'results': int(counters['results']),
+                    'texts': int(counters['texts']),
+                    'average_polarity': counters['polarity_sum'] / counters['texts'] if counters['texts'] else 0.0
+                } for website, counters in self.sites.items()
+            },
+            'history': self.history
+        }
+
+    def ranking_report(self, query: str) -> Dict[str, Any]:
+        """由累计状态生成的结果排名（与 AIAnalyzer.analyze_results 的结构相同，另有累计字段）"""
+        title_frequency = {website: int(c['title_hits']) for website, c in self.sites.items() if c['title_hits']}
+        content_frequency = {website: int(c['content_hits']) for website, c in self.sites.items() if c['content_hits']}
+        website_frequency = {website: title_frequency.get(website, 0) + content_frequency.get(website, 0)
+                             for website in set(title_frequency) | set(content_frequency)}
+        sentiment = self.sentiment_summary()
+        return {
+            'query': query,
+            'timestamp': self.updated_at,
+            'total_results': self.total_results,
+            'websites_analyzed': len(self.sites),
+            'frequency_analysis': {
+                'total_occurrences': sum(website_frequency.values()),
+                'website_frequency': website_frequency,
+                'content_frequency': content_frequency,
+                'title_frequency': title_frequency
+            },
+            'detailed_analysis': self.top_results,
+            'sentiment_distribution': sentiment['sentiment_distribution'],
+            'website_authority': {
+                website: c['authority_sum'] / c['results'] for website, c in self.sites.items() if c['results']
+            },
+            'aggregate_version': self.version,
+            'history': self.history
+        }
+
+    # ---------- 持久化 ----------
+
+    def to_state(self) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """导出为 (可 JSON 序列化的字段, NumPy 数组)"""
+        words_meta, words_arrays = self.words.to_state()
+        meta = {
+            'format': STATE_FORMAT,
+            'keyword': self.keyword,
+            'kind': self.kind,
+            'version': self.version,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'history': self.history,
+            'seen_filter': {'capacity': self.seen.capacity, 'hashes': self.seen.num_hashes},
+            'total_results': self.total_results,
+            'words': words_meta,
+            'sentiment': dict(self.sentiment),
+            'sentiment_labels': dict(self.sentiment_labels),
+            'sites': {website: dict(counters) for website, counters in self.sites.items()},
+            'top_results': self.top_results
+        }
+        arrays = {'polarity_histogram': self.polarity_histogram, 'seen_bits': self.seen.bits, **words_arrays}
+        return meta, arrays
+
+    @classmethod
+    def from_state(cls, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> 'KeywordAggregate':
+        """由 to_state 的结果恢复"""
+        aggregate = cls(meta['keyword'], meta['kind'])
+        aggregate.version = meta['version']
+        aggregate.created_at = meta['created_at']
+        aggregate.updated_at = meta['updated_at']
+        aggregate.history = meta['history']
+        if 'seen_bits' in arrays:
+            seen_filter = meta['seen_filter']
+            aggregate.seen = BloomFilter(seen_filter['capacity'], AGGREGATE_CONFIG['seen_error_rate'],
+                                         hashes=seen_filter['hashes'], bits=len(arrays['seen_bits']) * 8)
+            aggregate.seen.bits = np.array(arrays['seen_bits'], dtype=np.uint8)
+        else:
+            # 旧格式：把保存的内容键加入过滤器
+            aggregate.seen.update(hash64(meta.get('seen', [])))
+        aggregate.total_results = meta['total_results']
+        aggregate.words = StreamingWordCounter.from_state(meta['words'], arrays)
+        aggregate.sentiment = Counter(meta['sentiment'])
+        aggregate.sentiment_labels = Counter(meta['sentiment_labels'])
+        aggregate.polarity_histogram = np.array(arrays['polarity_histogram'], dtype=np.int64)
+        aggregate.histogram_edges = np.linspace(-1.0, 1.0, len(aggregate.polarity_histogram) + 1)
+        aggregate.sites = {website: Counter(counters) for website, counters in meta['sites'].items()}
+        aggregate.top_results = meta['top_results']
+        return aggregate
+
+
+class AggregateStore:
+    """按关键词保存的统计状态（每个关键词、每种类型一个 .npz 文件）"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or AGGREGATE_CONFIG['directory']
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, keyword: str, kind: str) -> str:
+        digest = hashlib.sha1(keyword.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.directory, f"{kind}_{digest}.npz")
+
+    def load(self, keyword: str, kind: str) -> KeywordAggregate:
+        """读取关键词的状态，不存在或格式不兼容时返回空状态"""
+        path = self._path(keyword, kind)
+        if not os.path.exists(path):
+            return KeywordAggregate(keyword, kind)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data['meta']))
+                arrays = {name: data[name] for name in data.files if name != 'meta'}
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取统计状态失败 {path}: {e}")
+            return KeywordAggregate(keyword, kind)
+        if meta.get('format') not in COMPATIBLE_FORMATS or meta.get('keyword') != keyword:
+            logger.warning(f"统计状态格式已变化，重新累计: {keyword} ({kind})")
+            return KeywordAggregate(keyword, kind)
+        return KeywordAggregate.from_state(meta, arrays)
+
+    def save(self, aggregate: KeywordAggregate) -> str:
+        """保存状态（先写临时文件再替换）"""
+        path = self._path(aggregate.keyword, aggregate.kind)
+        meta, arrays = aggregate.to_state()
+        tmp_path = f"{path[:-4]}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp_path, meta=np.array(json.dumps(meta, ensure_ascii=False)), **arrays)
+        os.replace(tmp_path, path)
+        return path
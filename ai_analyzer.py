@@ -1,12 +1,11 @@
 import json
 import os
-import re
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Tuple
 import logging
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
-from textblob import TextBlob
 import nltk
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
@@ -27,14 +26,48 @@ try:
 except LookupError:
     nltk.download('stopwords')
 
-from config import DATA_CONFIG
+from aggregate_state import AggregateStore
+from config import AGGREGATE_CONFIG, DATA_CONFIG, SCORING_CONFIG
+from sentiment_lexicon import get_sentiment_analyzer, polarity_label
+from text_corpus import TokenizedCorpus
 
 logger = logging.getLogger(__name__)
 
+# 基于网站知名度的权威性评分
+AUTHORITY_WEBSITES = {
+    'OpenAI': 0.9,
+    'Anthropic': 0.85,
+    'Google AI': 0.9,
+    'Microsoft AI': 0.85,
+    'Meta AI': 0.8,
+    'DeepMind': 0.9,
+    'Hugging Face': 0.8,
+    'Stability AI': 0.75,
+    'Cohere': 0.7,
+    'Claude': 0.85,
+    'Perplexity': 0.7,
+    'You.com': 0.65,
+    'Bard': 0.8,
+    'ChatGPT': 0.9,
+    'Bing Chat': 0.8,
+    'Midjourney': 0.75,
+    'DALL-E': 0.85,
+    'Runway': 0.7,
+    'ElevenLabs': 0.65,
+    'Replicate': 0.7
+}
+
+# 综合评分可以加权的特征
+SCORING_FEATURES = ('relevance', 'sentiment', 'authority')
+
 class AIAnalyzer:
-    def __init__(self):
+    def __init__(self, profile: str = None):
         self.stop_words = set(stopwords.words('english'))
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
+        # 中文使用情感词典，英文使用TextBlob
+        self.sentiment = get_sentiment_analyzer()
+        # 综合评分使用的权重方案
+        self.profile = profile or SCORING_CONFIG['default_profile']
         
     def load_search_results(self, file_path: str) -> Dict:
         """加载搜索结果文件"""
@@ -47,180 +80,237 @@ class AIAnalyzer:
             logger.error(f"加载搜索结果文件失败: {e}")
             return None
     
-    def calculate_keyword_frequency(self, results: List[Dict], query: str) -> Dict:
-        """计算关键词频度"""
+    def build_corpus(self, results: List[Dict]) -> TokenizedCorpus:
+        """对所有结果分词一次，供频度、相关性、权威性指标共用"""
+        return TokenizedCorpus.from_results(results)
+    
+    def calculate_keyword_frequency(self, results: List[Dict], query: str,
+                                    corpus: TokenizedCorpus = None) -> Dict:
+        """计算关键词频度（标题、内容中出现的不同查询词个数，按网站汇总）"""
         frequency_data = {
             'total_occurrences': 0,
             'website_frequency': {},
             'content_frequency': {},
             'title_frequency': {}
         }
+        if not results:
+            return frequency_data
         
-        # 将查询词转换为小写并分词
-        query_words = set(re.findall(r'\b\w+\b', query.lower()))
+        corpus = corpus or self.build_corpus(results)
+        presence = corpus.presence(corpus.encode_query(query))
         
-        for result in results:
-            website = result['website']
-            title = result['title'].lower()
-            content = result['content'].lower()
-            
-            # 统计标题中的关键词出现次数
-            title_count = sum(1 for word in query_words if word in title)
+        # 按网站分组求和
+        websites, groups = np.unique([result['website'] for result in results], return_inverse=True)
+        title_counts = np.bincount(groups, weights=presence[:, 0], minlength=len(websites))
+        content_counts = np.bincount(groups, weights=presence[:, 1], minlength=len(websites))
+        
+        for website, title_count, content_count in zip(websites.tolist(), title_counts, content_counts):
             if title_count > 0:
-                frequency_data['title_frequency'][website] = frequency_data['title_frequency'].get(website, 0) + title_count
-            
-            # 统计内容中的关键词出现次数
-            content_count = sum(1 for word in query_words if word in content)
+                frequency_data['title_frequency'][website] = int(title_count)
             if content_count > 0:
-                frequency_data['content_frequency'][website] = frequency_data['content_frequency'].get(website, 0) + content_count
-            
-            # 统计总出现次数
-            total_count = title_count + content_count
+                frequency_data['content_frequency'][website] = int(content_count)
+            total_count = int(title_count + content_count)
             if total_count > 0:
-                frequency_data['website_frequency'][website] = frequency_data['website_frequency'].get(website, 0) + total_count
+                frequency_data['website_frequency'][website] = total_count
                 frequency_data['total_occurrences'] += total_count
         
         return frequency_data
     
+    def calculate_relevance_scores(self, corpus: TokenizedCorpus, query: str) -> np.ndarray:
+        """计算所有结果的相关性分数 (0-1)，标题权重更高"""
+        terms = corpus.encode_query(query)
+        if not terms:
+            return np.zeros(len(corpus))
+        
+        presence = corpus.presence(terms) / len(terms)
+        return np.minimum(presence[:, 0], 1.0) * 0.6 + np.minimum(presence[:, 1], 1.0) * 0.4
+    
     def calculate_relevance_score(self, result: Dict, query: str) -> float:
         """计算相关性分数"""
-        query_words = set(re.findall(r'\b\w+\b', query.lower()))
-        title = result['title'].lower()
-        content = result['content'].lower()
-        
-        # 标题权重更高
-        title_matches = sum(1 for word in query_words if word in title)
-        content_matches = sum(1 for word in query_words if word in content)
-        
-        # 计算相关性分数 (0-1)
-        title_score = min(title_matches / len(query_words), 1.0) * 0.6
-        content_score = min(content_matches / len(query_words), 1.0) * 0.4
-        
-        return title_score + content_score
+        return float(self.calculate_relevance_scores(self.build_corpus([result]), query)[0])
     
-    def analyze_sentiment(self, text: str) -> Dict:
-        """分析文本情绪"""
+    def _sentiment_result(self, polarity: float, subjectivity: float) -> Dict:
+        """将情绪分数转换为结果字典"""
+        return {
+            'polarity': polarity,
+            'subjectivity': subjectivity,
+            'label': polarity_label(polarity)
+        }
+    
+    def analyze_sentiments(self, texts: List[str]) -> List[Dict]:
+        """批量分析文本情绪"""
         try:
-            blob = TextBlob(text)
-            sentiment = blob.sentiment
-            
-            # 将情绪分数转换为标签
-            if sentiment.polarity > 0.1:
-                sentiment_label = "积极"
-            elif sentiment.polarity < -0.1:
-                sentiment_label = "消极"
-            else:
-                sentiment_label = "中性"
-            
-            return {
-                'polarity': sentiment.polarity,
-                'subjectivity': sentiment.subjectivity,
-                'label': sentiment_label
-            }
+            scores = self.sentiment.score_batch(texts)
         except Exception as e:
             logger.error(f"情绪分析失败: {e}")
-            return {
-                'polarity': 0.0,
-                'subjectivity': 0.0,
-                'label': "未知"
-            }
+            return [{'polarity': 0.0, 'subjectivity': 0.0, 'label': "未知"} for _ in texts]
+        return [self._sentiment_result(polarity, subjectivity) for polarity, subjectivity in scores]
     
-    def calculate_authority_score(self, result: Dict) -> float:
-        """计算权威性分数"""
-        authority_score = 0.0
+    def analyze_sentiment(self, text: str) -> Dict:
+        """分析文本情绪"""
+        return self.analyze_sentiments([text])[0]
+    
+    def calculate_authority_scores(self, results: List[Dict], corpus: TokenizedCorpus = None) -> np.ndarray:
+        """计算所有结果的权威性分数"""
+        if not results:
+            return np.zeros(0)
+        content_length = corpus.content_chars if corpus is not None else \
+            np.array([len(result['content']) for result in results])
         
         # 基于网站知名度的权威性评分
-        authority_websites = {
-            'OpenAI': 0.9,
-            'Anthropic': 0.85,
-            'Google AI': 0.9,
-            'Microsoft AI': 0.85,
-            'Meta AI': 0.8,
-            'DeepMind': 0.9,
-            'Hugging Face': 0.8,
-            'Stability AI': 0.75,
-            'Cohere': 0.7,
-            'Claude': 0.85,
-            'Perplexity': 0.7,
-            'You.com': 0.65,
-            'Bard': 0.8,
-            'ChatGPT': 0.9,
-            'Bing Chat': 0.8,
-            'Midjourney': 0.75,
-            'DALL-E': 0.85,
-            'Runway': 0.7,
-            'ElevenLabs': 0.65,
-            'Replicate': 0.7
-        }
-        
-        website = result['website']
-        if website in authority_websites:
-            authority_score += authority_websites[website] * 0.6
+        authority_score = np.array([AUTHORITY_WEBSITES.get(result['website'], 0.0) for result in results]) * 0.6
         
         # 基于内容长度的权威性评分
-        content_length = len(result['content'])
-        if content_length > 200:
-            authority_score += 0.2
-        elif content_length > 100:
-            authority_score += 0.1
-        
-        # 基于是否有链接的权威性评分
-        if result['link']:
-            authority_score += 0.1
+        authority_score += np.where(content_length > 200, 0.2, np.where(content_length > 100, 0.1, 0.0))
         
-        # 基于是否有图片的权威性评分
-        if result['image']:
-            authority_score += 0.1
+        # 基于是否有链接、图片的权威性评分
+        authority_score += np.array([0.1 if result['link'] else 0.0 for result in results])
+        authority_score += np.array([0.1 if result['image'] else 0.0 for result in results])
         
-        return min(authority_score, 1.0)
+        return np.minimum(authority_score, 1.0)
+    
+    def calculate_authority_score(self, result: Dict) -> float:
+        """计算权威性分数"""
+        return float(self.calculate_authority_scores([result])[0])
+    
+    def get_weights(self, profile: str = None) -> Dict[str, float]:
+        """综合评分的权重方案"""
+        profile = profile or self.profile
+        if profile not in SCORING_CONFIG['profiles']:
+            raise ValueError(f"未知的评分方案: {profile}")
+        weights = SCORING_CONFIG['profiles'][profile]
+        unknown = set(weights) - set(SCORING_FEATURES)
+        if unknown:
+            raise ValueError(f"评分方案 {profile} 中有未知的特征: {', '.join(sorted(unknown))}")
+        return weights
+    
+    def score_features(self, results: List[Dict], query: str, corpus: TokenizedCorpus = None) -> Dict[str, Any]:
+        """
+        计算所有结果的特征列
+        
+        Returns:
+            {'relevance', 'polarity', 'subjectivity', 'authority'} 四个长度为结果数的数组，
+            以及 sentiment_ok（情绪分析是否成功）
+        """
+        corpus = corpus or self.build_corpus(results)
+        try:
+            scores = np.asarray(self.sentiment.score_batch([result['content'] for result in results]),
+                                dtype=np.float64).reshape(-1, 2)
+            sentiment_ok = True
+        except Exception as e:
+            logger.error(f"情绪分析失败: {e}")
+            scores = np.zeros((len(results), 2))
+            sentiment_ok = False
+        
+        return {
+            'relevance': self.calculate_relevance_scores(corpus, query),
+            'polarity': scores[:, 0],
+            'subjectivity': scores[:, 1],
+            'authority': self.calculate_authority_scores(results, corpus),
+            'sentiment_ok': sentiment_ok
+        }
+    
+    def calculate_overall_scores(self, features: Dict[str, np.ndarray], profile: str = None) -> np.ndarray:
+        """按权重方案计算综合评分（情绪特征为 极性 + 1，取值 0-2）"""
+        columns = {
+            'relevance': features['relevance'],
+            'sentiment': features['polarity'] + 1,
+            'authority': features['authority']
+        }
+        weights = self.get_weights(profile)
+        overall = np.zeros(len(features['relevance']))
+        for name in SCORING_FEATURES:
+            if name in weights:
+                overall = overall + columns[name] * weights[name]
+        return overall
+    
+    @staticmethod
+    def _top_k_order(scores: np.ndarray, top_k: int) -> np.ndarray:
+        """前 k 个结果的下标，顺序与完整的稳定降序排序的前 k 个相同"""
+        if top_k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        kth = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+        above = np.flatnonzero(scores > kth)
+        # 与第 k 名分数相同的结果按原顺序补足
+        ties = np.flatnonzero(scores == kth)[:top_k - len(above)]
+        candidates = np.concatenate([above, ties])
+        return candidates[np.lexsort((candidates, -scores[candidates]))]
     
-    def analyze_results(self, results: List[Dict], query: str) -> Dict:
-        """分析所有搜索结果"""
+    def analyze_results(self, results: List[Dict], query: str, profile: str = None,
+                        top_k: int = None) -> Dict:
+        """
+        分析所有搜索结果
+        
+        Args:
+            results: 搜索结果
+            query: 查询
+            profile: 综合评分的权重方案，默认使用初始化时的方案
+            top_k: 只输出综合评分最高的 k 条详细分析（默认全部输出）
+        """
+        # 每条结果只分词一次，频度、相关性、权威性都从同一份语料计算
+        corpus = self.build_corpus(results)
+        features = self.score_features(results, query, corpus)
+        overall_scores = self.calculate_overall_scores(features, profile)
+        
         analysis_results = {
             'query': query,
             'timestamp': datetime.now().isoformat(),
             'total_results': len(results),
             'websites_analyzed': len(set(r['website'] for r in results)),
-            'frequency_analysis': self.calculate_keyword_frequency(results, query),
+            'frequency_analysis': self.calculate_keyword_frequency(results, query, corpus),
             'detailed_analysis': []
         }
         
-        for result in results:
-            # 计算相关性
-            relevance_score = self.calculate_relevance_score(result, query)
-            
-            # 分析情绪
-            sentiment = self.analyze_sentiment(result['content'])
-            
-            # 计算权威性
-            authority_score = self.calculate_authority_score(result)
-            
-            # 综合评分
-            overall_score = (relevance_score * 0.4 + 
-                           (sentiment['polarity'] + 1) * 0.2 + 
-                           authority_score * 0.4)
+        # 按综合评分排序（分数相同时保持原顺序）；只需要前 k 条时先部分排序
+        if top_k is not None and top_k < len(results):
+            order = self._top_k_order(overall_scores, top_k)
+        else:
+            order = np.argsort(-overall_scores, kind='stable')
+        
+        relevance = features['relevance'][order].tolist()
+        polarity = features['polarity'][order].tolist()
+        subjectivity = features['subjectivity'][order].tolist()
+        authority = features['authority'][order].tolist()
+        overall = overall_scores[order].tolist()
+        
+        for position, index in enumerate(order.tolist()):
+            result = results[index]
+            if features['sentiment_ok']:
+                sentiment = self._sentiment_result(polarity[position], subjectivity[position])
+            else:
+                sentiment = {'polarity': 0.0, 'subjectivity': 0.0, 'label': "未知"}
             
-            detailed_analysis = {
+            analysis_results['detailed_analysis'].append({
                 'website': result['website'],
                 'title': result['title'],
                 'link': result['link'],
-                'relevance_score': relevance_score,
+                'relevance_score': relevance[position],
                 'sentiment': sentiment,
-                'authority_score': authority_score,
-                'overall_score': overall_score,
+                'authority_score': authority[position],
+                'overall_score': overall[position],
                 'rank': result['rank']
-            }
-            
-            analysis_results['detailed_analysis'].append(detailed_analysis)
-        
-        # 按综合评分排序
-        analysis_results['detailed_analysis'].sort(
-            key=lambda x: x['overall_score'], 
-            reverse=True
-        )
+            })
         
         return analysis_results
     
+    def analyze_results_incremental(self, results: List[Dict], query: str,
+                                    store: AggregateStore = None) -> Dict:
+        """
+        增量分析：只分析没见过的结果，合并进该查询的累计状态，由累计状态生成结果
+        
+        Returns:
+            与 analyze_results 结构相同的累计结果（detailed_analysis 为综合评分最高的结果），
+            另有 sentiment_distribution、website_authority、aggregate_version 等累计字段
+        """
+        store = store or AggregateStore()
+        aggregate = store.load(query, 'ranking')
+        added = aggregate.fold_ranking(results, lambda fresh: self.analyze_results(fresh, query))
+        if added:
+            store.save(aggregate)
+        logger.info(f"增量分析: {len(results)} 条结果中新增 {added} 条，累计 {aggregate.total_results} 条"
+                    f"（版本 {aggregate.version}）")
+        return aggregate.ranking_report(query)
+    
     def generate_summary_report(self, analysis_results: Dict) -> str:
         """生成摘要报告"""
         summary = f"""
@@ -251,26 +341,31 @@ class AIAnalyzer:
             summary += f"  {i}. {result['website']} - {result['title'][:50]}... (相关性: {result['relevance_score']:.2f})\n"
         
         summary += "\n=== 情绪分析 ===\n"
-        # 情绪分布
-        sentiment_counts = {}
-        for result in analysis_results['detailed_analysis']:
-            label = result['sentiment']['label']
-            sentiment_counts[label] = sentiment_counts.get(label, 0) + 1
-        
+        # 情绪分布（增量分析的结果带有累计分布）
+        sentiment_counts = analysis_results.get('sentiment_distribution')
+        if sentiment_counts is None:
+            sentiment_counts = {}
+            for result in analysis_results['detailed_analysis']:
+                label = result['sentiment']['label']
+                sentiment_counts[label] = sentiment_counts.get(label, 0) + 1
+        
+        total_sentiments = sum(sentiment_counts.values())
         for label, count in sentiment_counts.items():
-            percentage = (count / len(analysis_results['detailed_analysis'])) * 100
+            percentage = (count / total_sentiments) * 100
             summary += f"  {label}: {count}个结果 ({percentage:.1f}%)\n"
         
         summary += "\n=== 权威性分析 ===\n"
-        # 权威性最高的网站
-        authority_scores = {}
-        for result in analysis_results['detailed_analysis']:
-            website = result['website']
-            if website not in authority_scores:
-                authority_scores[website] = []
-            authority_scores[website].append(result['authority_score'])
-        
-        avg_authority = {website: sum(scores)/len(scores) for website, scores in authority_scores.items()}
+        # 权威性最高的网站（增量分析的结果带有累计平均值）
+        avg_authority = analysis_results.get('website_authority')
+        if avg_authority is None:
+            authority_scores = {}
+            for result in analysis_results['detailed_analysis']:
+                website = result['website']
+                if website not in authority_scores:
+                    authority_scores[website] = []
+                authority_scores[website].append(result['authority_score'])
+            
+            avg_authority = {website: sum(scores)/len(scores) for website, scores in authority_scores.items()}
         sorted_authority = sorted(avg_authority.items(), key=lambda x: x[1], reverse=True)
         
         for website, score in sorted_authority[:5]:
@@ -332,9 +427,12 @@ def main():
     if not search_data:
         return
     
-    # 分析结果
+    # 分析结果（启用增量分析时只分析新结果，报告包含该查询的全部历史）
     print("正在分析搜索结果...")
-    analysis_results = analyzer.analyze_results(search_data['results'], search_data['query'])
+    if AGGREGATE_CONFIG['enabled']:
+        analysis_results = analyzer.analyze_results_incremental(search_data['results'], search_data['query'])
+    else:
+        analysis_results = analyzer.analyze_results(search_data['results'], search_data['query'])
     
     # 保存分析结果
     analysis_file, summary_file = analyzer.save_analysis(analysis_results, search_data['query'])
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+来源文章并发抓取 - 先用连接池 HTTP 请求，必要时再用浏览器标签页
+
+HTTP 请求、解码和正文解析通过共享的 requests.Session（按主机复用连接）在专用线程池中并发执行；
+返回非 HTML、被拦截或正文过短（需要 JS 渲染）的页面再交给有限数量的浏览器标签页。
+全局和单个域名都有并发上限，抓取 N 个来源的耗时接近最慢的一个而不是总和。
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import ARTICLE_FETCH_CONFIG
+from content_extractor import extract_article, extract_in_page
+from url_canonicalizer import URLCanonicalizer
+
+logger = logging.getLogger(__name__)
+
+
+class ArticleFetcher:
+    """来源文章抓取器"""
+
+    def __init__(self, context=None, max_concurrency: Optional[int] = None,
+                 per_domain: Optional[int] = None, max_tabs: Optional[int] = None,
+                 canonicalizer: Optional[URLCanonicalizer] = None):
+        """
+        初始化文章抓取器
+
+        Args:
+            context: 浏览器上下文，为 None 时只使用 HTTP 请求
+            max_concurrency: 全局并发上限
+            per_domain: 单个域名的并发上限
+            max_tabs: 浏览器回退时最多同时打开的标签页数
+            canonicalizer: URL 规范化器（多个组件共用时传入同一个实例以共享跳转缓存）
+        """
+        self.context = context
+        self.canonicalizer = canonicalizer or URLCanonicalizer()
+        self.max_concurrency = max_concurrency or ARTICLE_FETCH_CONFIG['max_concurrency']
+        self.per_domain = per_domain or ARTICLE_FETCH_CONFIG['per_domain']
+        self.max_tabs = max_tabs or ARTICLE_FETCH_CONFIG['max_tabs']
+        self.http_timeout = ARTICLE_FETCH_CONFIG['http_timeout']
+        self.browser_timeout = ARTICLE_FETCH_CONFIG['browser_timeout'] * 1000
+        self.min_text_length = ARTICLE_FETCH_CONFIG['min_text_length']
+
+        self.session = requests.Session()
+        self.session.headers.update(ARTICLE_FETCH_CONFIG['headers'])
+        adapter = HTTPAdapter(pool_connections=self.max_concurrency, pool_maxsize=self.per_domain,
+                              max_retries=ARTICLE_FETCH_CONFIG['http_retries'])
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # 专用线程池，线程数与全局并发上限一致（默认线程池的线程数与 CPU 核数相关，且与其他组件共用）
+        self.executor: Optional[ThreadPoolExecutor] = None
+        # 信号量和标签页队列需要绑定到运行中的事件循环，延迟创建
+        self._global_semaphore: Optional[asyncio.Semaphore] = None
+        self._domain_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._tabs: Optional[asyncio.Queue] = None
+        self._opened_tabs: List[Any] = []
+
+        # 统计信息
+        self.http_hits = 0
+        self.browser_fallbacks = 0
+        self.failures = 0
+        self.tabs_opened = 0
+        self.fallback_reasons: Dict[str, int] = {}
+
+    def _domain_semaphore(self, url: str) -> asyncio.Semaphore:
+        domain = urlparse(url).netloc
+        if domain not in self._domain_semaphores:
+            self._domain_semaphores[domain] = asyncio.Semaphore(self.per_domain)
+        return self._domain_semaphores[domain]
+
+    # ---------- HTTP ----------
+
+    async def _run(self, func: Callable, *args):
+        """在专用线程池中执行阻塞调用"""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='article-fetch')
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _get(self, url: str) -> Tuple[requests.Response, str]:
+        """请求页面并解码 HTML（编码探测需要扫描整个响应体，在工作线程中完成）"""
+        response = self.session.get(url, timeout=self.http_timeout, allow_redirects=True)
+        if response.status_code >= 400 or 'html' not in response.headers.get('Content-Type', 'text/html'):
+            return response, ''
+        # requests 对未声明编码的中文页面默认使用 ISO-8859-1
+        if response.encoding is None or response.encoding.lower() == 'iso-8859-1':
+            response.encoding = response.apparent_encoding
+        return response, response.text
+
+    async def _fetch_http(self, url: str) -> Dict[str, Any]:
+        """
+        通过连接池请求页面
+
+        Returns:
+            解析结果；需要浏览器渲染时包含 'fallback_reason'
+        """
+        try:
+            response, html = await self._run(self._get, url)
+        except requests.RequestException as e:
+            return {'url': url, 'fallback_reason': f"请求失败: {type(e).__name__}"}
+
+        if response.status_code in ARTICLE_FETCH_CONFIG['blocked_status']:
+            return {'url': url, 'fallback_reason': f"HTTP {response.status_code}"}
+        if response.status_code >= 400:
+            return {'url': url, 'error': f"HTTP {response.status_code}"}
+        if 'html' not in response.headers.get('Content-Type', 'text/html'):
+            return {'url': url, 'error': f"非 HTML 内容: {response.headers.get('Content-Type')}"}
+
+        info = await self._run(extract_article, html, response.url)
+
+        lowered = html[:5000].lower()
+        if any(marker in lowered for marker in ARTICLE_FETCH_CONFIG['js_required_markers']):
+            info['fallback_reason'] = "需要 JavaScript"
+        elif len(info['article_content']) < self.min_text_length:
+            info['fallback_reason'] = "正文过短"
+        return info
+
+    # ---------- 浏览器回退 ----------
+
+    async def _acquire_tab(self):
+        if self._tabs is None:
+            self._tabs = asyncio.Queue()
+        if self._tabs.empty() and len(self._opened_tabs) < self.max_tabs:
+            page = await self.context.new_page()
+            self._opened_tabs.append(page)
+            self.tabs_opened += 1
+            return page
+        return await self._tabs.get()
+
+    async def _fetch_browser(self, url: str) -> Dict[str, Any]:
+        """在标签页池中渲染页面，正文在浏览器内提取"""
+        page = await self._acquire_tab()
+        try:
+            await page.goto(url, timeout=self.browser_timeout, wait_until='domcontentloaded')
+            try:
+                await page.wait_for_load_state('load', timeout=ARTICLE_FETCH_CONFIG['load_wait'] * 1000)
+            except Exception:
+                pass
+            return await extract_in_page(page)
+        finally:
+            # 先离开当前页面，避免残留的脚本继续占用资源
+            try:
+                await page.goto('about:blank')
+            except Exception:
+                pass
+            self._tabs.put_nowait(page)
+
+    # ---------- 抓取 ----------
+
+    async def fetch(self, url: str) -> Dict[str, Any]:
+        """
+        抓取单个来源
+
+        Returns:
+            包含 success、method、elapsed 字段的页面信息
+        """
+        if self._global_semaphore is None:
+            self._global_semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        start_time = time.time()
+        async with self._global_semaphore, self._domain_semaphore(url):
+            info = await self._fetch_http(url)
+            info['method'] = 'http'
+
+            reason = info.pop('fallback_reason', None)
+            if reason and self.context is not None:
+                self.browser_fallbacks += 1
+                key = reason.split(':')[0]
+                self.fallback_reasons[key] = self.fallback_reasons.get(key, 0) + 1
+                logger.debug(f"{url} 改用浏览器抓取（{reason}）")
+                try:
+                    info = await self._fetch_browser(url)
+                    info['method'] = 'browser'
+                except Exception as e:
+                    info = {'url': url, 'method': 'browser', 'error': str(e)}
+            elif reason and 'article_content' not in info:
+                info['error'] = reason
+
+        info['success'] = not info.get('error')
+        info['elapsed'] = round(time.time() - start_time, 3)
+        if not info['success']:
+            self.failures += 1
+        elif info['method'] == 'http':
+            self.http_hits += 1
+        return info
+
+    async def fetch_all(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """
+        并发抓取多个来源（结果顺序与 urls 一致）
+
+        规范化后相同的 URL 只抓取一次，重复的输入共享同一个结果。
+        """
+        start_time = time.time()
+        canonical_urls = await self.canonicalizer.resolve_many(urls)
+        # 规范化地址只用于去重，抓取时使用第一次出现的原地址（去掉的参数可能影响页面内容）
+        originals: Dict[str, str] = {}
+        for url, canonical in zip(urls, canonical_urls):
+            originals.setdefault(canonical, url)
+        unique_urls = list(originals)
+        results = await asyncio.gather(*(self.fetch(originals[url]) for url in unique_urls), return_exceptions=True)
+
+        by_url = {}
+        for url, result in zip(unique_urls, results):
+            if isinstance(result, BaseException):
+                self.failures += 1
+                result = {'url': originals[url], 'success': False, 'error': str(result)}
+            result['canonical_url'] = url
+            by_url[url] = result
+        merged = [by_url[url] for url in canonical_urls]
+
+        slowest = max((r.get('elapsed', 0) for r in by_url.values()), default=0)
+        logger.info(f"抓取 {len(unique_urls)} 个来源（输入 {len(urls)} 个），耗时 {time.time() - start_time:.1f} 秒"
+                    f"（最慢 {slowest:.1f} 秒）")
+        return merged
+
+    async def close(self):
+        """关闭标签页和连接池"""
+        for page in self._opened_tabs:
+            try:
+                await page.close()
+            except Exception:
+                pass
+        self._opened_tabs = []
+        self._tabs = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        self.session.close()
+        self.canonicalizer.save()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取抓取统计"""
+        return {
+            'http_hits': self.http_hits,
+            'browser_fallbacks': self.browser_fallbacks,
+            'failures': self.failures,
+            'fallback_reasons': dict(self.fallback_reasons),
+            'tabs_opened': self.tabs_opened
+        }
+
+    def log_stats(self):
+        """输出抓取统计"""
+        stats = self.get_stats()
+        logger.info(
+            f"文章抓取统计: HTTP 成功 {stats['http_hits']}，浏览器回退 {stats['browser_fallbacks']} "
+            f"（原因 {stats['fallback_reasons']}），失败 {stats['failures']}"
+        )
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+静态资源本地缓存 - 通过路由拦截为新上下文提供已下载的 JS/CSS 包
+
+缓存按内容哈希存储在磁盘上，可在多个上下文和进程之间共享；
+只保存响应体和必要的响应头，不保存 Cookie。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional, Any
+from urllib.parse import urlparse
+
+from config import ASSET_CACHE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 回放时保留的响应头
+KEPT_HEADERS = ['content-type', 'etag', 'last-modified', 'cache-control', 'access-control-allow-origin']
+
+
+class AssetCache:
+    """内容寻址的静态资源磁盘缓存"""
+
+    def __init__(self, cache_dir: Optional[str] = None, ttl: Optional[int] = None,
+                 max_bytes: Optional[int] = None):
+        """
+        初始化静态资源缓存
+
+        Args:
+            cache_dir: 缓存目录
+            ttl: 重新验证间隔（秒）
+            max_bytes: 缓存最大体积（字节）
+        """
+        self.enabled = ASSET_CACHE_CONFIG.get('enabled', True)
+        self.cache_dir = cache_dir or ASSET_CACHE_CONFIG['cache_dir']
+        self.ttl = ttl if ttl is not None else ASSET_CACHE_CONFIG['ttl']
+        self.max_bytes = max_bytes if max_bytes is not None else ASSET_CACHE_CONFIG['max_bytes']
+        self.resource_types = set(ASSET_CACHE_CONFIG.get('resource_types', []))
+        self.hosts = set(ASSET_CACHE_CONFIG.get('hosts', []))
+        self.hashed_pattern = re.compile(ASSET_CACHE_CONFIG['hashed_asset_pattern'], re.IGNORECASE)
+
+        self.objects_dir = os.path.join(self.cache_dir, 'objects')
+        self.index_dir = os.path.join(self.cache_dir, 'index')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.index_dir, exist_ok=True)
+
+        # 对象目录的当前体积，首次写入时扫描目录得到，之后随写入和淘汰更新
+        self._total_bytes: Optional[int] = None
+        self._size_lock = threading.Lock()
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.bytes_served = 0
+
+    def is_cacheable(self, url: str, resource_type: str) -> bool:
+        """判断请求是否为可缓存的带哈希静态资源"""
+        if resource_type not in self.resource_types:
+            return False
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https') or parsed.hostname not in self.hosts:
+            return False
+        return bool(self.hashed_pattern.search(parsed.path + ('?' if parsed.query else '')))
+
+    def _index_path(self, url: str) -> str:
+        return os.path.join(self.index_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest)
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes):
+        """先写临时文件再替换，避免其他进程读到半个文件"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """读取缓存条目，返回索引信息（不含响应体）"""
+        index_path = self._index_path(url)
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not os.path.exists(self._object_path(entry['digest'])):
+            return None
+        return entry
+
+    def read_body(self, entry: Dict[str, Any]) -> Optional[bytes]:
+        """读取缓存的响应体，并更新最近使用时间"""
+        object_path = self._object_path(entry['digest'])
+        try:
+            with open(object_path, 'rb') as f:
+                body = f.read()
+            os.utime(object_path, None)
+            return body
+        except OSError:
+            return None
+
+    def store(self, url: str, body: bytes, headers: Dict[str, str]) -> Dict[str, Any]:
+        """保存资源（相同内容只保存一份），写入新对象后缓存超出上限时执行淘汰"""
+        digest = hashlib.sha256(body).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            self._atomic_write(object_path, body)
+            self._account(len(body))
+
+        entry = {
+            'url': url,
+            'digest': digest,
+            'size': len(body),
+            'headers': {k: v for k, v in headers.items() if k.lower() in KEPT_HEADERS},
+            'stored_at': time.time()
+        }
+        self._atomic_write(self._index_path(url), json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+        return entry
+
+    def touch(self, url: str, entry: Dict[str, Any]):
+        """重新验证通过后刷新条目时间"""
+        entry['stored_at'] = time.time()
+        self._atomic_write(self._index_path(url), json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get('stored_at', 0) < self.ttl
+
+    def _account(self, added: int):
+        """记录新写入的对象体积，超出上限时淘汰"""
+        with self._size_lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += added
+            if self._total_bytes > self.max_bytes:
+                try:
+                    self.evict()
+                except Exception as e:
+                    logger.warning(f"静态资源缓存淘汰失败: {e}")
+
+    def _scan_size(self) -> int:
+        total = 0
+        for name in os.listdir(self.objects_dir):
+            try:
+                total += os.stat(os.path.join(self.objects_dir, name)).st_size
+            except OSError:
+                continue
+        return total
+
+    def evict(self) -> int:
+        """按最近使用时间淘汰对象，直到缓存体积不超过上限，返回淘汰数量"""
+        objects = []
+        total = 0
+        for name in os.listdir(self.objects_dir):
+            path = os.path.join(self.objects_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            objects.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        self._total_bytes = total
+        if total <= self.max_bytes:
+            return 0
+
+        evicted = 0
+        for _, size, path in sorted(objects):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                evicted += 1
+            except OSError:
+                continue
+        self._total_bytes = total
+
+        # 索引条目在 lookup 时发现对象缺失会自动失效
+        logger.info(f"静态资源缓存淘汰 {evicted} 个对象，当前体积 {total / 1024 / 1024:.1f} MB")
+        return evicted
+
+    @staticmethod
+    def _fulfill_headers(entry: Dict[str, Any]) -> Dict[str, str]:
+        headers = dict(entry.get('headers', {}))
+        headers['x-asset-cache'] = 'hit'
+        return headers
+
+    async def _handle_route(self, route, request):
+        """路由处理函数"""
+        url = request.url
+        if request.method != 'GET' or not self.is_cacheable(url, request.resource_type):
+            await route.fallback()
+            return
+
+        # 磁盘读写放到线程中执行，不阻塞事件循环上的其他页面
+        entry = await asyncio.to_thread(self.lookup, url)
+        if entry and self.is_fresh(entry):
+            body = await asyncio.to_thread(self.read_body, entry)
+            if body is not None:
+                self.hits += 1
+                self.bytes_served += len(body)
+                await route.fulfill(status=200, headers=self._fulfill_headers(entry), body=body)
+                return
+
+        # fulfill 已经调用过（无论是否成功）时路由已被处理，不能再 fallback
+        fulfilling = False
+        try:
+            # 过期条目带条件头向源站验证
+            headers = dict(request.headers)
+            if entry:
+                cached_headers = {k.lower(): v for k, v in entry.get('headers', {}).items()}
+                if 'etag' in cached_headers:
+                    headers['if-none-match'] = cached_headers['etag']
+                if 'last-modified' in cached_headers:
+                    headers['if-modified-since'] = cached_headers['last-modified']
+
+            response = await route.fetch(headers=headers)
+
+            if response.status == 304 and entry:
+                body = await asyncio.to_thread(self.read_body, entry)
+                if body is not None:
+                    self.revalidations += 1
+                    self.bytes_served += len(body)
+                    await asyncio.to_thread(self.touch, url, entry)
+                    fulfilling = True
+                    await route.fulfill(status=200, headers=self._fulfill_headers(entry), body=body)
+                    return
+
+            body = await response.body()
+            if response.status == 200:
+                self.misses += 1
+                await asyncio.to_thread(self.store, url, body, response.headers)
+            fulfilling = True
+            await route.fulfill(response=response, body=body)
+
+        except Exception as e:
+            logger.debug(f"静态资源缓存处理失败 {url}: {e}")
+            if not fulfilling:
+                await route.fallback()
+
+    async def apply(self, target) -> bool:
+        """
+        在 Page 或 BrowserContext 上安装缓存路由
+
+        Args:
+            target: Page 或 BrowserContext
+
+        Returns:
+            是否安装成功
+        """
+        if not self.enabled:
+            return False
+
+        try:
+            await target.route("**/*", self._handle_route)
+            logger.info("已启用静态资源本地缓存")
+            return True
+        except Exception as e:
+            logger.warning(f"启用静态资源缓存失败: {e}")
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+            'bytes_served': self.bytes_served
+        }
+
+    def log_stats(self):
+        """输出缓存统计"""
+        stats = self.get_stats()
+        logger.info(
+            f"静态资源缓存统计: 命中 {stats['hits']}，未命中 {stats['misses']}，"
+            f"重新验证 {stats['revalidations']}，本地提供 {stats['bytes_served'] / 1024:.1f} KB"
+        )
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+正文提取吞吐量测试 - 在保存的页面上对比文本密度提取与原来的"最长容器"提取
+
+用法:
+    python benchmark_content_extractor.py [HTML 文件或通配符 ...] [--rounds N]
+默认使用 data/*.html。
+"""
+
+import argparse
+import glob
+import os
+import time
+
+from bs4 import BeautifulSoup
+
+from content_extractor import extract_article
+
+# 原 extract_page_info 使用的候选容器
+LEGACY_SELECTORS = [
+    'article', 'main', '.content', '.article', '.post',
+    '.entry-content', '.post-content', '.article-content',
+    '[class*="content"]', '[class*="article"]'
+]
+
+
+def legacy_extract(html: str) -> str:
+    """原方法：在候选容器中取文本最长的一个，找不到时取整个 body"""
+    soup = BeautifulSoup(html, 'lxml')
+    content = ''
+    for selector in LEGACY_SELECTORS:
+        element = soup.select_one(selector)
+        if element:
+            text = element.get_text('\n', strip=True)
+            if len(text) > len(content):
+                content = text
+    if not content and soup.body:
+        content = soup.body.get_text('\n', strip=True)
+    return content
+
+
+def run(name: str, pages, extract, rounds: int):
+    """重复提取所有页面，返回 (页面/秒, MB/秒, 平均输出字数)"""
+    total_bytes = sum(len(html.encode('utf-8')) for _, html in pages)
+    output_chars = 0
+    start_time = time.perf_counter()
+    for _ in range(rounds):
+        for _, html in pages:
+            output_chars += len(extract(html))
+    elapsed = time.perf_counter() - start_time
+
+    count = len(pages) * rounds
+    pages_per_second = count / elapsed if elapsed else 0
+    mb_per_second = total_bytes * rounds / 1024 / 1024 / elapsed if elapsed else 0
+    print(f"{name:<12} {pages_per_second:>10.1f} 页/秒 {mb_per_second:>8.2f} MB/秒  平均输出 {output_chars // count} 字")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="正文提取吞吐量测试")
+    parser.add_argument('patterns', nargs='*', default=['data/*.html'], help="HTML 文件或通配符")
+    parser.add_argument('--rounds', type=int, default=20, help="每个页面重复提取的次数")
+    args = parser.parse_args()
+
+    files = sorted({path for pattern in args.patterns for path in glob.glob(pattern)})
+    if not files:
+        print(f"没有找到页面: {' '.join(args.patterns)}")
+        return
+
+    pages = []
+    for path in files:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            pages.append((path, f.read()))
+    print(f"页面数: {len(pages)}，总大小 {sum(len(h) for _, h in pages) / 1024:.1f} KB，重复 {args.rounds} 轮")
+    print("-" * 70)
+
+    run("最长容器", pages, legacy_extract, args.rounds)
+    run("文本密度", pages, lambda html: extract_article(html)['article_content'], args.rounds)
+
+    print("-" * 70)
+    for path, html in pages:
+        info = extract_article(html)
+        print(f"{os.path.basename(path)}: 标题 {info['title'][:30]!r}，日期 {info['publish_date'] or '-'}，"
+              f"作者 {info['author'] or '-'}，正文 {len(info['article_content'])} 字 / 原方法 {len(legacy_extract(html))} 字")
+
+
+if __name__ == "__main__":
+    main()
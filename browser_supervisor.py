@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+浏览器监控与自动恢复 - 检测浏览器断开、页面崩溃和渲染进程无响应
+
+被监控的对象需要提供 browser、page 属性以及 init_browser()/close_browser() 方法
+（WebScraper、DeepSeekWebSearch、ChatWithLogin 等）。页面崩溃时只替换页面，
+浏览器断开或替换页面后仍无响应时重启整个浏览器；正在执行的任务重新执行一次。
+任务实际使用的其他页面（热备标签页、对冲页面）通过 use_page() 纳入监控，
+这些页面故障时直接关闭，任务重新执行时会换用新的页面；PageRecycler 替换的
+新主页面通过 watch_page() 注册崩溃事件。
+同一个浏览器上可以同时执行多个任务（会话池中并发上限大于 1 的账号），每个任务只清理
+自己登记的页面，恢复操作串行执行，避免多个任务同时重启浏览器。
+"""
+
+import asyncio
+import logging
+import time
+import weakref
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, List, Optional
+
+from config import SUPERVISOR_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 当前任务（run 的一次执行）登记的页面
+_run_pages: ContextVar[Optional[List[Any]]] = ContextVar('supervised_run_pages', default=None)
+
+
+class BrowserSupervisor:
+    """浏览器监控器"""
+
+    def __init__(self, owner, name: Optional[str] = None,
+                 page_setup: Optional[Callable[[Any], Awaitable[Any]]] = None):
+        """
+        初始化浏览器监控器
+
+        Args:
+            owner: 持有 browser/page 的对象
+            name: 日志中显示的名称
+            page_setup: 替换页面后执行的初始化（如安装静态资源缓存路由）
+        """
+        self.owner = owner
+        self.name = name or type(owner).__name__
+        self.page_setup = page_setup
+        self.probe_timeout = SUPERVISOR_CONFIG['probe_timeout']
+        self.close_timeout = SUPERVISOR_CONFIG['close_timeout']
+        self.max_retries = SUPERVISOR_CONFIG['max_retries']
+        self.restart_window = SUPERVISOR_CONFIG['restart_window']
+        self.max_restarts = SUPERVISOR_CONFIG['max_restarts_per_window']
+
+        self.failure: Optional[str] = None
+        # 发生故障的页面（None 表示主页面或浏览器本身）
+        self.failed_page = None
+        # 当前任务使用的主页面以外的页面
+        self.job_pages: List[Any] = []
+        # 已注册过事件的浏览器/上下文/页面，避免重复注册
+        self.watched = weakref.WeakSet()
+        self.restart_times = deque()
+        self.backoff = SUPERVISOR_CONFIG['backoff']
+        self._recover_lock: Optional[asyncio.Lock] = None
+
+        # 统计信息
+        self.browser_restarts = 0
+        self.page_restarts = 0
+        self.requeued_jobs = 0
+        self.failed_jobs = 0
+
+    # ---------- 事件监听 ----------
+
+    def attach(self):
+        """在当前的 browser/page 上注册崩溃事件（init_browser 成功后调用）"""
+        self.failure = None
+        self.failed_page = None
+        self.job_pages = []
+        browser = getattr(self.owner, 'browser', None)
+        page = getattr(self.owner, 'page', None)
+        if browser:
+            if self._watch(browser):
+                browser.on("disconnected", lambda *_: self._mark("浏览器连接断开"))
+        elif page:
+            # 持久化上下文没有 Browser 对象，上下文关闭即浏览器断开
+            context = page.context
+            if self._watch(context):
+                context.on("close", lambda *_: self._mark("浏览器连接断开"))
+        if page:
+            self.watch_page(page)
+
+    def _watch(self, target) -> bool:
+        """第一次见到该对象时返回 True"""
+        if target in self.watched:
+            return False
+        self.watched.add(target)
+        return True
+
+    def watch_page(self, page):
+        """在页面上注册崩溃事件（每个页面只注册一次），用于替换后的新页面"""
+        if self._watch(page):
+            page.on("crash", lambda *_: self._on_crash(page))
+
+    def use_page(self, page):
+        """
+        登记任务实际使用的页面（热备标签页、对冲页面等），使其崩溃和无响应能被检测到
+
+        Args:
+            page: 任务使用的页面，主页面也可以传入
+        """
+        if page is None:
+            return
+        self.watch_page(page)
+        if page is not getattr(self.owner, 'page', None) and page not in self.job_pages:
+            self.job_pages.append(page)
+            run_pages = _run_pages.get()
+            if run_pages is not None:
+                run_pages.append(page)
+
+    def _on_crash(self, page):
+        if page is getattr(self.owner, 'page', None):
+            self._mark("页面崩溃")
+        elif page in self.job_pages:
+            self._mark("任务页面崩溃", page)
+        else:
+            # 空闲的热备标签页崩溃：直接关闭，标签页池取用时会跳过已关闭的页面
+            logger.warning(f"[{self.name}] 空闲页面崩溃，已关闭")
+            asyncio.ensure_future(self._discard_page(page))
+
+    def _mark(self, reason: str, page=None):
+        if not self.failure:
+            logger.warning(f"[{self.name}] 检测到{reason}")
+            self.failed_page = page
+        self.failure = self.failure or reason
+
+    # ---------- 健康检查 ----------
+
+    async def check_health(self) -> Optional[str]:
+        """
+        检查浏览器和页面状态
+
+        Returns:
+            故障原因，正常时返回 None
+        """
+        if self.failure:
+            return self.failure
+
+        browser = getattr(self.owner, 'browser', None)
+        page = getattr(self.owner, 'page', None)
+        if browser is not None and not browser.is_connected():
+            return "浏览器连接断开"
+        if page is None:
+            return "页面未初始化"
+        if page.is_closed():
+            return "页面已关闭"
+
+        reason = await self._probe(page)
+        if reason:
+            return reason
+
+        # 任务使用过的其他页面：主动关闭的（如对冲页面）不再检查
+        for job_page in list(self.job_pages):
+            if job_page.is_closed():
+                continue
+            reason = await self._probe(job_page)
+            if reason:
+                self.failure = f"任务{reason}"
+                self.failed_page = job_page
+                return self.failure
+        return None
+
+    async def _probe(self, page) -> Optional[str]:
+        # 渲染进程卡死时 evaluate 不会返回
+        try:
+            await asyncio.wait_for(page.evaluate("1"), self.probe_timeout)
+        except asyncio.TimeoutError:
+            return "页面无响应"
+        except Exception as e:
+            return f"页面检查失败: {e}"
+        return None
+
+    # ---------- 恢复 ----------
+
+    def restart_rate(self) -> float:
+        """统计窗口内的重启次数（按小时折算）"""
+        now = time.time()
+        while self.restart_times and now - self.restart_times[0] > self.restart_window:
+            self.restart_times.popleft()
+        return len(self.restart_times) * 3600 / self.restart_window
+
+    async def _throttle_restarts(self):
+        """重启过于频繁时退避，避免在持续故障时空转"""
+        self.restart_rate()
+        if len(self.restart_times) >= self.max_restarts:
+            logger.warning(f"[{self.name}] 重启过于频繁，等待 {self.backoff} 秒后再重启")
+            await asyncio.sleep(self.backoff)
+            self.backoff = min(self.backoff * 2, SUPERVISOR_CONFIG['max_backoff'])
+        else:
+            self.backoff = SUPERVISOR_CONFIG['backoff']
+        self.restart_times.append(time.time())
+
+    async def _discard_page(self, page):
+        try:
+            await asyncio.wait_for(page.close(), self.close_timeout)
+        except Exception:
+            pass
+
+    async def _drop_job_page(self) -> bool:
+        """关闭故障的任务页面（热备标签页等），主页面正常即视为恢复"""
+        page = self.failed_page
+        await self._discard_page(page)
+        if page in self.job_pages:
+            self.job_pages.remove(page)
+        self.failure = None
+        self.failed_page = None
+        self.page_restarts += 1
+        logger.info(f"[{self.name}] 已关闭故障的任务页面")
+        return await self.check_health() is None
+
+    async def _replace_page(self) -> bool:
+        """在原上下文中替换崩溃或无响应的页面"""
+        old_page = self.owner.page
+        try:
+            context = old_page.context
+            page = await asyncio.wait_for(context.new_page(), self.close_timeout)
+            page.set_default_timeout(30000)
+            if self.page_setup:
+                await self.page_setup(page)
+        except Exception as e:
+            logger.warning(f"[{self.name}] 替换页面失败: {e}")
+            return False
+
+        try:
+            await asyncio.wait_for(old_page.close(), self.close_timeout)
+        except Exception:
+            pass
+
+        self.owner.page = page
+        self.failure = None
+        self.failed_page = None
+        self.watch_page(page)
+        self.page_restarts += 1
+        logger.info(f"[{self.name}] 已替换页面")
+        return await self.check_health() is None
+
+    async def _restart_browser(self) -> bool:
+        """关闭并重新初始化浏览器"""
+        try:
+            await asyncio.wait_for(self.owner.close_browser(), self.close_timeout)
+        except Exception as e:
+            logger.warning(f"[{self.name}] 关闭浏览器失败: {e}")
+        # close_browser 在页面关闭失败时会跳过后续步骤，这里补充清理
+        for closer in (getattr(self.owner, 'browser', None), getattr(self.owner, 'playwright', None)):
+            if closer is None:
+                continue
+            try:
+                close = closer.close if hasattr(closer, 'close') else closer.stop
+                await asyncio.wait_for(close(), self.close_timeout)
+            except Exception:
+                pass
+
+        self.owner.browser = None
+        self.owner.page = None
+        # init_browser 成功后会自行调用 attach() 注册事件，这里不再重复注册
+        if not await self.owner.init_browser():
+            logger.error(f"[{self.name}] 重新初始化浏览器失败")
+            return False
+
+        self.browser_restarts += 1
+        logger.info(f"[{self.name}] 浏览器已重启")
+        return True
+
+    async def recover(self, reason: str) -> bool:
+        """
+        按故障类型恢复：页面故障先替换页面，仍不正常再重启浏览器
+
+        Returns:
+            是否恢复成功
+        """
+        await self._throttle_restarts()
+        logger.warning(f"[{self.name}] 开始恢复: {reason}")
+
+        if self.failed_page is not None and self.failed_page is not getattr(self.owner, 'page', None):
+            if await self._drop_job_page():
+                return True
+
+        browser = getattr(self.owner, 'browser', None)
+        browser_alive = browser is None or browser.is_connected()
+        if browser_alive and getattr(self.owner, 'page', None) is not None and "浏览器" not in reason:
+            if await self._replace_page():
+                return True
+        return await self._restart_browser()
+
+    async def ensure_healthy(self) -> bool:
+        """执行任务前检查，有故障时先恢复（并发任务中只有一个执行恢复，其余等待后重新检查）"""
+        if self._recover_lock is None:
+            self._recover_lock = asyncio.Lock()
+        async with self._recover_lock:
+            reason = await self.check_health()
+            if reason is None:
+                return True
+            return await self.recover(reason)
+
+    def _forget_run_pages(self, run_pages: List[Any]):
+        for page in run_pages:
+            if page in self.job_pages:
+                self.job_pages.remove(page)
+        run_pages.clear()
+
+    # ---------- 任务执行 ----------
+
+    async def run(self, job: Callable[[], Awaitable[Any]], default: Any = None) -> Any:
+        """
+        在监控下执行任务：任务因浏览器故障失败时恢复并重新执行一次
+
+        Args:
+            job: 无参数的协程函数（每次执行重新调用）
+            default: 无法恢复时返回的值
+
+        Returns:
+            任务结果（重试后仍失败时返回最后一次的结果）
+        """
+        last_result = default
+        run_pages: List[Any] = []
+        token = _run_pages.set(run_pages)
+        try:
+            for attempt in range(self.max_retries + 1):
+                if not await self.ensure_healthy():
+                    self.failed_jobs += 1
+                    return last_result
+
+                # 只清理本任务上一次执行登记的页面，同时执行的其他任务的页面继续监控
+                self._forget_run_pages(run_pages)
+                try:
+                    result = await job()
+                except Exception as e:
+                    reason = await self.check_health()
+                    if reason is None:
+                        raise
+                    logger.warning(f"[{self.name}] 任务因{reason}中断: {e}")
+                else:
+                    last_result = result
+                    # 任务内部捕获了异常时，通过健康检查判断是否为浏览器故障
+                    reason = await self.check_health()
+                    if reason is None:
+                        return result
+                    logger.warning(f"[{self.name}] 任务执行期间{reason}")
+
+                if attempt < self.max_retries:
+                    self.requeued_jobs += 1
+                    logger.info(f"[{self.name}] 恢复后重新执行任务")
+
+            # 重试后仍失败，恢复浏览器供后续任务使用
+            self.failed_jobs += 1
+            await self.ensure_healthy()
+            return last_result
+        finally:
+            self._forget_run_pages(run_pages)
+            _run_pages.reset(token)
+
+    def get_stats(self):
+        """获取监控统计"""
+        return {
+            'browser_restarts': self.browser_restarts,
+            'page_restarts': self.page_restarts,
+            'requeued_jobs': self.requeued_jobs,
+            'failed_jobs': self.failed_jobs,
+            'restarts_per_hour': round(self.restart_rate(), 2)
+        }
+
+    def log_stats(self):
+        """输出监控统计"""
+        stats = self.get_stats()
+        logger.info(
+            f"[{self.name}] 浏览器监控统计: 重启浏览器 {stats['browser_restarts']} 次，替换页面 "
+            f"{stats['page_restarts']} 次，重新执行任务 {stats['requeued_jobs']} 个，"
+            f"放弃任务 {stats['failed_jobs']} 个，重启频率 {stats['restarts_per_hour']}/小时"
+        )
@@ -4,11 +4,19 @@
 import asyncio
 import json
 import os
+import time
+import weakref
 from datetime import datetime
 from typing import Dict, List, Optional
 import logging
 
-from playwright.async_api import async_playwright, Browser, Page
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+
+from config import RESOURCE_POLICY_CONFIG
+from asset_cache import AssetCache
+from browser_supervisor import BrowserSupervisor
+from resource_policy import ResourcePolicy
+from session_pool import PooledClients, SessionPool, detect_rate_limit
 
 # 设置日志
 logging.basicConfig(
@@ -20,11 +28,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 这些域名返回 429 时视为账号被限流
+THROTTLE_HOSTS = ("deepseek.com", "openai.com", "chatgpt.com")
+
 class ChatWithLogin:
-    def __init__(self):
+    def __init__(self, state_file: Optional[str] = "login_state.json", user_data_dir: Optional[str] = None):
+        """
+        Args:
+            state_file: 登录状态文件（storage state）
+            user_data_dir: 持久化用户数据目录，指定后使用该目录的登录状态，忽略 state_file
+        """
         self.browser: Optional[Browser] = None
+        self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
-        self.state_file = "login_state.json"
+        self.state_file = state_file
+        self.user_data_dir = user_data_dir
+        # 页面 -> 最近一次收到 429 的时间，限流只记在发出请求的页面上
+        self.throttled_pages = weakref.WeakKeyDictionary()
+        # 同一上下文会访问 DeepSeek 和 ChatGPT，合并两者的白名单
+        self.resource_policy = ResourcePolicy("ChatGPT", overrides=RESOURCE_POLICY_CONFIG["DeepSeek"])
+        self.asset_cache = AssetCache()
+        self.supervisor = BrowserSupervisor(self, page_setup=self.asset_cache.apply)
         
     async def init_browser(self):
         """初始化浏览器，使用登录状态"""
@@ -36,30 +60,57 @@ class ChatWithLogin:
                 '--disable-dev-shm-usage',
             ]
             
-            self.browser = await self.playwright.chromium.launch(
-                headless=False,  # 改为有头模式，可以看到浏览器窗口
-                args=browser_args,
-                timeout=60000,
-            )
-            
-            # 检查是否有登录状态文件
-            if os.path.exists(self.state_file):
-                logger.info(f"使用登录状态文件: {self.state_file}")
-                context = await self.browser.new_context(
-                    storage_state=self.state_file,
-                    user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+            user_agent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+            
+            if self.user_data_dir:
+                # 持久化用户数据目录自带登录状态，上下文即浏览器（没有单独的 Browser 对象）
+                logger.info(f"使用用户数据目录: {self.user_data_dir}")
+                context = await self.playwright.chromium.launch_persistent_context(
+                    user_data_dir=self.user_data_dir,
+                    headless=False,
+                    args=browser_args,
+                    timeout=60000,
+                    user_agent=user_agent,
                     viewport={'width': 1280, 'height': 720},
                 )
             else:
-                logger.warning("未找到登录状态文件，将使用无登录状态")
-                context = await self.browser.new_context(
-                    user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                    viewport={'width': 1280, 'height': 720},
+                self.browser = await self.playwright.chromium.launch(
+                    headless=False,  # 改为有头模式，可以看到浏览器窗口
+                    args=browser_args,
+                    timeout=60000,
                 )
-            
-            self.page = await context.new_page()
+                
+                # 检查是否有登录状态文件
+                if self.state_file and os.path.exists(self.state_file):
+                    logger.info(f"使用登录状态文件: {self.state_file}")
+                    context = await self.browser.new_context(
+                        storage_state=self.state_file,
+                        user_agent=user_agent,
+                        viewport={'width': 1280, 'height': 720},
+                    )
+                else:
+                    logger.warning("未找到登录状态文件，将使用无登录状态")
+                    context = await self.browser.new_context(
+                        user_agent=user_agent,
+                        viewport={'width': 1280, 'height': 720},
+                    )
+            self.context = context
+            
+            # 拦截图片、字体和追踪请求
+            await self.resource_policy.apply(context)
+            # 记录接口返回的 429，用于会话池判断账号是否被限流
+            context.on("response", self._on_response)
+            
+            # 持久化上下文启动时自带一个空白页，直接使用
+            self.page = context.pages[0] if context.pages else await context.new_page()
             self.page.set_default_timeout(30000)
             
+            # 新上下文没有HTTP缓存，从本地缓存提供带哈希的JS/CSS包
+            await self.asset_cache.apply(self.page)
+            
+            # 监听浏览器断开和页面崩溃
+            self.supervisor.attach()
+            
             logger.info("浏览器初始化成功")
             return True
             
@@ -76,13 +127,51 @@ class ChatWithLogin:
                 await self.page.close()
             if self.browser:
                 await self.browser.close()
+            elif self.context:
+                # 持久化上下文没有 Browser 对象，关闭上下文即关闭浏览器
+                await self.context.close()
+            self.context = None
             if hasattr(self, 'playwright'):
                 await self.playwright.stop()
+            self.resource_policy.log_stats()
+            self.asset_cache.log_stats()
             logger.info("浏览器已关闭")
         except Exception as e:
             logger.error(f"关闭浏览器时出错: {e}")
     
-    async def chat_with_deepseek(self, query: str) -> Dict:
+    def _on_response(self, response):
+        if response.status == 429 and any(host in response.url for host in THROTTLE_HOSTS):
+            try:
+                self.throttled_pages[response.frame.page] = time.time()
+            except Exception:
+                # Service Worker 发出的请求没有所属页面
+                pass
+    
+    async def chat(self, platform: str, query: str, page: Optional[Page] = None) -> Dict:
+        """
+        与指定平台聊天，并标记限流（接口返回 429 或回复是限流提示）
+        
+        Args:
+            platform: 'DeepSeek' 或 'ChatGPT'
+            query: 搜索关键词
+            page: 指定使用的页面，默认使用主页面
+        """
+        start_time = time.time()
+        chat_func = self.chat_with_chatgpt if platform == 'ChatGPT' else self.chat_with_deepseek
+        result = await chat_func(query, page=page)
+        
+        content = result.get('content', '')
+        if result.get('success') and len(content) < 200 and detect_rate_limit(content):
+            # 简短的"服务器繁忙"类回复是限流提示，不是回答
+            result['error'] = content
+            result['content'] = ''
+            result['success'] = False
+            result['rate_limited'] = True
+        if self.throttled_pages.get(page or self.page, 0) >= start_time:
+            result['rate_limited'] = True
+        return result
+    
+    async def chat_with_deepseek(self, query: str, page: Optional[Page] = None) -> Dict:
         """与DeepSeek聊天"""
         result = {
             'website': 'DeepSeek',
@@ -103,13 +192,15 @@ class ChatWithLogin:
             result['error'] = "浏览器页面未初始化"
             return result
         
+        page = page or self.page
+        
         try:
             logger.info(f"正在访问 DeepSeek...")
-            await self.page.goto("https://chat.deepseek.com", timeout=30000)
-            await self.page.wait_for_timeout(3000)
+            await page.goto("https://chat.deepseek.com", timeout=30000)
+            await page.wait_for_timeout(3000)
             
             # 检查页面标题
-            title = await self.page.title()
+            title = await page.title()
             logger.info(f"页面标题: {title}")
             
             # 检查是否在聊天页面
@@ -131,7 +222,7 @@ class ChatWithLogin:
             
             for selector in selectors:
                 try:
-                    chat_input = await self.page.wait_for_selector(selector, timeout=5000)
+                    chat_input = await page.wait_for_selector(selector, timeout=5000)
                     if chat_input:
                         logger.info(f"找到聊天输入框: {selector}")
                         break
@@ -148,14 +239,14 @@ class ChatWithLogin:
             
             # 输入聊天内容
             await chat_input.fill(chat_prompt)
-            await self.page.wait_for_timeout(1000)
+            await page.wait_for_timeout(1000)
             
             # 发送消息
             await chat_input.press('Enter')
             logger.info("已发送消息，等待回复...")
             
             # 等待回复 - 增加等待时间
-            await self.page.wait_for_timeout(25000)  # 等待25秒
+            await page.wait_for_timeout(25000)  # 等待25秒
             
             # 尝试获取回复 - 更多选择器
             response_selectors = [
@@ -179,7 +270,7 @@ class ChatWithLogin:
             for attempt in range(5):  # 增加尝试次数
                 for selector in response_selectors:
                     try:
-                        response_elements = await self.page.query_selector_all(selector)
+                        response_elements = await page.query_selector_all(selector)
                         if response_elements:
                             # 获取最后一个回复（最新的）
                             latest_element = response_elements[-1]
@@ -196,7 +287,7 @@ class ChatWithLogin:
                 
                 if not result['success']:
                     logger.info(f"第 {attempt + 1} 次尝试未找到回复，继续等待...")
-                    await self.page.wait_for_timeout(5000)
+                    await page.wait_for_timeout(5000)
             
             if not result['success']:
                 result['error'] = "未能获取到回复，可能需要更长时间等待"
@@ -208,7 +299,7 @@ class ChatWithLogin:
         
         return result
 
-    async def chat_with_deepseek_web_search(self, query: str) -> Dict:
+    async def chat_with_deepseek_web_search(self, query: str, page: Optional[Page] = None) -> Dict:
         """与DeepSeek聊天并启用联网搜索"""
         result = {
             'website': 'DeepSeek',
@@ -229,13 +320,15 @@ class ChatWithLogin:
             result['error'] = "浏览器页面未初始化"
             return result
         
+        page = page or self.page
+        
         try:
             logger.info(f"正在访问 DeepSeek...")
-            await self.page.goto("https://chat.deepseek.com", timeout=30000)
-            await self.page.wait_for_timeout(3000)
+            await page.goto("https://chat.deepseek.com", timeout=30000)
+            await page.wait_for_timeout(3000)
             
             # 检查页面标题
-            title = await self.page.title()
+            title = await page.title()
             logger.info(f"页面标题: {title}")
             
             # 检查是否在聊天页面
@@ -257,7 +350,7 @@ class ChatWithLogin:
             
             for selector in selectors:
                 try:
-                    chat_input = await self.page.wait_for_selector(selector, timeout=5000)
+                    chat_input = await page.wait_for_selector(selector, timeout=5000)
                     if chat_input:
                         logger.info(f"找到聊天输入框: {selector}")
                         break
@@ -274,14 +367,14 @@ class ChatWithLogin:
             
             # 输入聊天内容
             await chat_input.fill(chat_prompt)
-            await self.page.wait_for_timeout(1000)
+            await page.wait_for_timeout(1000)
             
             # 发送消息
             await chat_input.press('Enter')
             logger.info("已发送消息，等待回复...")
             
             # 等待回复 - 增加等待时间
-            await self.page.wait_for_timeout(25000)  # 等待25秒
+            await page.wait_for_timeout(25000)  # 等待25秒
             
             # 尝试获取回复 - 更多选择器
             response_selectors = [
@@ -305,7 +398,7 @@ class ChatWithLogin:
             for attempt in range(5):  # 增加尝试次数
                 for selector in response_selectors:
                     try:
-                        response_elements = await self.page.query_selector_all(selector)
+                        response_elements = await page.query_selector_all(selector)
                         if response_elements:
                             # 获取最后一个回复（最新的）
                             latest_element = response_elements[-1]
@@ -322,7 +415,7 @@ class ChatWithLogin:
                 
                 if not result['success']:
                     logger.info(f"第 {attempt + 1} 次尝试未找到回复，继续等待...")
-                    await self.page.wait_for_timeout(5000)
+                    await page.wait_for_timeout(5000)
             
             if not result['success']:
                 result['error'] = "未能获取到回复，可能需要更长时间等待"
@@ -334,7 +427,7 @@ class ChatWithLogin:
         
         return result
 
-    async def chat_with_chatgpt(self, query: str) -> Dict:
+    async def chat_with_chatgpt(self, query: str, page: Optional[Page] = None) -> Dict:
         """与ChatGPT聊天"""
         result = {
             'website': 'ChatGPT',
@@ -355,13 +448,15 @@ class ChatWithLogin:
             result['error'] = "浏览器页面未初始化"
             return result
         
+        page = page or self.page
+        
         try:
             logger.info(f"正在访问 ChatGPT...")
-            await self.page.goto("https://chat.openai.com", timeout=30000)
-            await self.page.wait_for_timeout(3000)
+            await page.goto("https://chat.openai.com", timeout=30000)
+            await page.wait_for_timeout(3000)
             
             # 检查页面标题
-            title = await self.page.title()
+            title = await page.title()
             logger.info(f"页面标题: {title}")
             
             # 检查是否在聊天页面
@@ -382,7 +477,7 @@ class ChatWithLogin:
             
             for selector in selectors:
                 try:
-                    chat_input = await self.page.wait_for_selector(selector, timeout=5000)
+                    chat_input = await page.wait_for_selector(selector, timeout=5000)
                     if chat_input:
                         logger.info(f"找到聊天输入框: {selector}")
                         break
@@ -399,14 +494,14 @@ class ChatWithLogin:
             
             # 输入聊天内容
             await chat_input.fill(chat_prompt)
-            await self.page.wait_for_timeout(1000)
+            await page.wait_for_timeout(1000)
             
             # 发送消息
             await chat_input.press('Enter')
             logger.info("已发送消息，等待回复...")
             
             # 等待回复
-            await self.page.wait_for_timeout(15000)  # 等待15秒
+            await page.wait_for_timeout(15000)  # 等待15秒
             
             # 尝试获取回复
             response_selectors = [
@@ -421,7 +516,7 @@ class ChatWithLogin:
             for attempt in range(3):
                 for selector in response_selectors:
                     try:
-                        response_elements = await self.page.query_selector_all(selector)
+                        response_elements = await page.query_selector_all(selector)
                         if response_elements:
                             # 获取最后一个回复（最新的）
                             latest_element = response_elements[-1]
@@ -438,7 +533,7 @@ class ChatWithLogin:
                 
                 if not result['success']:
                     logger.info(f"第 {attempt + 1} 次尝试未找到回复，继续等待...")
-                    await self.page.wait_for_timeout(5000)
+                    await page.wait_for_timeout(5000)
             
             if not result['success']:
                 result['error'] = "未能获取到回复"
@@ -450,6 +545,24 @@ class ChatWithLogin:
         
         return result
 
+async def chat_with_session_pool(queries: List[str], platform: str = 'DeepSeek',
+                                 pool: Optional[SessionPool] = None) -> List[Dict]:
+    """
+    使用多账号会话池并发执行多个查询，每个账号一个浏览器客户端
+    
+    Args:
+        queries: 搜索关键词列表
+        platform: 'DeepSeek' 或 'ChatGPT'
+        pool: 会话池，默认按 SESSION_POOL_CONFIG 注册该平台的账号
+    """
+    clients = PooledClients(pool or SessionPool.from_config(platform),
+                            lambda session: ChatWithLogin(state_file=session.storage_state,
+                                                          user_data_dir=session.user_data_dir))
+    try:
+        return await clients.map(queries, lambda client, query, page: client.chat(platform, query, page))
+    finally:
+        await clients.close_browser()
+
 async def main():
     """主函数"""
     print("=== AI 聊天搜索（支持登录态复用）===")
@@ -461,10 +574,8 @@ async def main():
     
     if platform_choice == "1":
         platform_name = "DeepSeek"
-        platform_url = "https://chat.deepseek.com"
     elif platform_choice == "2":
         platform_name = "ChatGPT"
-        platform_url = "https://chat.openai.com"
     else:
         print("无效的选择")
         return
@@ -476,48 +587,38 @@ async def main():
         print(f"选择选项{platform_choice}进行手动登录")
         print()
     
-    query = input("请输入要搜索的关键词: ").strip()
-    if not query:
+    text = input("请输入要搜索的关键词（多个关键词用逗号分隔）: ").strip()
+    queries = [query.strip() for query in text.replace('，', ',').split(',') if query.strip()]
+    if not queries:
         print("关键词不能为空！")
         return
     
-    chat = ChatWithLogin()
-    
     try:
-        # 初始化浏览器
-        if not await chat.init_browser():
-            print("浏览器初始化失败")
-            return
-        
-        # 执行聊天搜索
-        print(f"正在使用 {platform_name} 搜索关键词: {query}")
+        # 按 SESSION_POOL_CONFIG 中该平台的账号分配查询，多个账号时并发执行；
+        # 浏览器崩溃或页面卡死时自动恢复并重试
+        print(f"正在使用 {platform_name} 搜索 {len(queries)} 个关键词")
+        results = await chat_with_session_pool(queries, platform_name)
         
-        if platform_choice == "1":
-            result = await chat.chat_with_deepseek(query)
-        else:
-            result = await chat.chat_with_chatgpt(query)
-        
-        # 显示结果
-        if result['success']:
-            print(f"\n=== {platform_name} 回复 ===")
-            print(result['content'])
-            
-            # 保存结果
-            os.makedirs("data", exist_ok=True)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"data/{platform_name.lower()}_result_{query}_{timestamp}.json"
-            
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
-            
-            print(f"\n结果已保存到: {filename}")
-        else:
-            print(f"\n✗ 搜索失败: {result['error']}")
+        for query, result in zip(queries, results):
+            # 显示结果
+            if result['success']:
+                print(f"\n=== {platform_name} 回复: {query}（账号 {result.get('session', '-')}）===")
+                print(result['content'])
+                
+                # 保存结果
+                os.makedirs("data", exist_ok=True)
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                filename = f"data/{platform_name.lower()}_result_{query}_{timestamp}.json"
+                
+                with open(filename, 'w', encoding='utf-8') as f:
+                    json.dump(result, f, ensure_ascii=False, indent=2)
+                
+                print(f"\n结果已保存到: {filename}")
+            else:
+                print(f"\n✗ {query} 搜索失败: {result['error']}")
             
     except Exception as e:
         print(f"程序执行出错: {e}")
-    finally:
-        await chat.close_browser()
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
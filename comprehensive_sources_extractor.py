@@ -10,101 +10,13 @@ import time
 from datetime import datetime
 from playwright.async_api import async_playwright
 
+from content_extractor import extract_in_page
+from resource_policy import ResourcePolicy
+
 async def extract_page_info(page):
-    """提取页面的详细信息"""
+    """提取页面的详细信息（在浏览器内按文本密度提取正文，只传回提取结果）"""
     try:
-        # 获取基本信息
-        url = page.url
-        title = await page.title()
-        
-        # 获取描述
-        description = ""
-        try:
-            desc_element = await page.query_selector('meta[name="description"]')
-            if desc_element:
-                description = await desc_element.get_attribute('content') or ""
-        except:
-            pass
-        
-        # 获取关键词
-        keywords = ""
-        try:
-            keywords_element = await page.query_selector('meta[name="keywords"]')
-            if keywords_element:
-                keywords = await keywords_element.get_attribute('keywords') or ""
-        except:
-            pass
-        
-        # 获取H1和H2标题
-        h1_texts = []
-        h2_texts = []
-        try:
-            h1_elements = await page.query_selector_all('h1')
-            for h1 in h1_elements:
-                text = await h1.inner_text()
-                if text.strip():
-                    h1_texts.append(text.strip())
-            
-            h2_elements = await page.query_selector_all('h2')
-            for h2 in h2_elements:
-                text = await h2.inner_text()
-                if text.strip():
-                    h2_texts.append(text.strip())
-        except:
-            pass
-        
-        # 获取主要内容
-        article_content = ""
-        content_selectors = [
-            'article', 'main', '.content', '.article', '.post', 
-            '.entry-content', '.post-content', '.article-content',
-            '[class*="content"]', '[class*="article"]'
-        ]
-        
-        for selector in content_selectors:
-            try:
-                content_element = await page.query_selector(selector)
-                if content_element:
-                    content_text = await content_element.inner_text()
-                    if len(content_text) > len(article_content):
-                        article_content = content_text
-            except:
-                continue
-        
-        # 如果没有找到主要内容，获取body内容
-        if not article_content:
-            try:
-                body_element = await page.query_selector('body')
-                if body_element:
-                    article_content = await body_element.inner_text()
-            except:
-                pass
-        
-        # 统计链接和图片数量
-        links_count = len(await page.query_selector_all('a'))
-        images_count = len(await page.query_selector_all('img'))
-        
-        # 获取域名
-        domain = ""
-        try:
-            from urllib.parse import urlparse
-            parsed_url = urlparse(url)
-            domain = parsed_url.netloc
-        except:
-            pass
-        
-        return {
-            "url": url,
-            "title": title,
-            "description": description,
-            "keywords": keywords,
-            "h1_texts": h1_texts,
-            "h2_texts": h2_texts,
-            "article_content": article_content[:2000],  # 限制长度
-            "links_count": links_count,
-            "images_count": images_count,
-            "domain": domain
-        }
+        return await extract_in_page(page)
     except Exception as e:
         print(f"提取页面信息出错: {e}")
         return {}
@@ -221,6 +133,7 @@ async def main():
     print("="*80)
     
     playwright = None
+    resource_policy = None
     context = None
     
     try:
@@ -232,6 +145,10 @@ async def main():
             viewport={'width': 1920, 'height': 1080}
         )
         
+        # 拦截图片、字体和追踪请求
+        resource_policy = ResourcePolicy("DeepSeek")
+        await resource_policy.apply(context)
+        
         if context.pages:
             page = context.pages[0]
         else:
@@ -430,6 +347,8 @@ async def main():
         return None
         
     finally:
+        if resource_policy:
+            resource_policy.log_stats()
         if context:
             await context.close()
         if playwright:
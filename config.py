@@ -164,4 +164,405 @@ DATA_CONFIG = {
     "results_file": "search_results.json",
     "analysis_file": "analysis_results.json",
     "logs_file": "scraping_logs.txt"
-} 
\ No newline at end of file
+} 
+
+# 请求级资源拦截配置（按提供方区分，未列出的提供方使用 default）
+RESOURCE_POLICY_CONFIG = {
+    "enabled": True,
+    "default": {
+        # 按资源类型拦截（Playwright request.resource_type）
+        "block_resource_types": ["image", "media", "font"],
+        # 按追踪域名拦截（分析统计、广告和追踪信标）：匹配该域名及其子域名，
+        # 带路径的条目（域名/路径前缀）只拦截该域名下的指定路径
+        "block_url_patterns": [
+            "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+            "hm.baidu.com", "cnzz.com", "umeng.com", "sentry.io",
+            "hotjar.com", "segment.io", "mixpanel.com", "facebook.net",
+            "bat.bing.com", "clarity.ms", "log.mmstat.com", "www.facebook.com/tr"
+        ],
+        # 白名单URL片段，命中后一律放行（优先级高于拦截规则）
+        "allow_url_patterns": [],
+        # 被拦截请求的估算体积（字节），用于统计节省的流量
+        "estimated_bytes": {
+            "image": 40000,
+            "media": 500000,
+            "font": 60000,
+            "script": 30000,
+            "xhr": 2000,
+            "fetch": 2000,
+            "other": 1000
+        }
+    },
+    "DeepSeek": {
+        "allow_url_patterns": ["chat.deepseek.com/api/", "cdn.deepseek.com"]
+    },
+    "Kimi": {
+        "allow_url_patterns": ["kimi.moonshot.cn/api/", "statics.moonshot.cn"]
+    },
+    "ChatGPT": {
+        # ChatGPT 的人机验证依赖部分图片和脚本，不拦截 challenge 相关资源
+        "allow_url_patterns": ["chat.openai.com/backend-api/", "challenges.cloudflare.com"]
+    }
+}
+
+# 静态资源本地缓存配置（跨上下文、跨进程复用 JS/CSS 包）
+ASSET_CACHE_CONFIG = {
+    "enabled": True,
+    "cache_dir": ".asset_cache",
+    "ttl": 24 * 3600,  # 超过该时间（秒）后向源站做条件请求重新验证
+    "max_bytes": 512 * 1024 * 1024,  # 缓存目录最大体积，超出后按最近使用时间淘汰
+    "resource_types": ["script", "stylesheet"],
+    # 仅缓存这些站点的静态资源
+    "hosts": [
+        "chat.deepseek.com", "cdn.deepseek.com",
+        "kimi.moonshot.cn", "statics.moonshot.cn"
+    ],
+    # 文件名中带内容哈希的资源视为不可变
+    "hashed_asset_pattern": r"[.\-_][0-9a-f]{8,}(\.chunk)?\.(js|mjs|css)(\?|$)"
+}
+
+# 热备聊天标签页配置（预先打开页面并定位输入框，供下一次查询直接使用）
+STANDBY_CONFIG = {
+    "enabled": True,
+    "pool_size": 1,  # 同时保持就绪的标签页数量
+    "warm_timeout": 30,  # 预热单个标签页的超时时间（秒）
+    "input_selectors": [
+        "textarea",
+        "[contenteditable='true']",
+        "textarea[placeholder*='Message']",
+        ".chat-input"
+    ],
+    # 开启新对话的入口（优先于整页重新加载）
+    "new_chat_selectors": [
+        "text=开启新对话",
+        "text=新对话",
+        "text=New chat",
+        "[class*='new-chat']"
+    ]
+}
+
+# 对冲请求配置（回答超过历史 p90 延迟后在第二个标签页重发同一问题）
+HEDGE_CONFIG = {
+    "enabled": False,  # 默认关闭，交互式单关键词分析时可开启
+    "budget": 0.1,  # 最多对冲的请求比例
+    "percentile": 0.9,  # 触发对冲的历史延迟分位数
+    "min_samples": 5,  # 样本不足时使用 default_delay
+    "default_delay": 60,  # 默认对冲等待时间（秒）
+    "max_samples": 200,  # 每个提供方保留的延迟样本数
+    "stats_file": "data/latency_stats.json"
+}
+
+# 任务时间预算配置（秒），所有等待和导航的超时从剩余预算中扣除
+DEADLINE_CONFIG = {
+    "deepseek_job_budget": 150,  # 单次 DeepSeek 问答
+    "sources_job_budget": 180,  # 单次问答 + 网页源提取
+    "scraper_job_budget": 900,  # WebScraper 单个关键词遍历所有网站
+    "min_timeout": 0.5  # 剩余预算低于该值（秒）视为已超时
+}
+
+# 登录状态快速验证配置（离线检查 Cookie/Token，必要时用轻量 API 探测）
+LOGIN_VALIDATION_CONFIG = {
+    "cache_file": "data/login_cache.json",
+    "ttl": 600,  # 结论缓存时间（秒）
+    "probe_timeout": 10,  # API 探测超时（秒）
+    "providers": {
+        "DeepSeek": {
+            "domains": ["deepseek.com"],
+            "auth_cookies": [],  # DeepSeek 的登录凭证保存在 localStorage 中
+            "origin": "https://chat.deepseek.com",
+            "token_key": "userToken",
+            "probe_url": "https://chat.deepseek.com/api/v0/users/current",
+            "token_header": "Authorization",
+            "token_prefix": "Bearer "
+        },
+        "ChatGPT": {
+            "domains": ["openai.com", "chatgpt.com"],
+            "auth_cookies": ["__Secure-next-auth.session-token"],
+            "origin": "https://chat.openai.com",
+            "token_key": None,
+            "probe_url": "https://chat.openai.com/api/auth/session"
+        }
+    }
+}
+
+# 浏览器用户数据模板配置（从已登录的用户数据目录生成精简模板，按工作进程克隆）
+PROFILE_TEMPLATE_CONFIG = {
+    "source_dir": "./deepseek_user_data",
+    "template_dir": ".profiles/template",
+    "workers_dir": ".profiles/workers",
+    "workers": 2,  # 批量提取时同时运行的浏览器数量（每个浏览器一份克隆的用户数据目录）
+    # 生成模板时剔除的缓存和锁文件（按文件/目录名匹配，任意层级）
+    "strip_patterns": [
+        "GrShaderCache", "ShaderCache", "GraphiteDawnCache", "DawnGraphiteCache", "DawnWebGPUCache",
+        "GPUCache", "Cache", "Code Cache", "component_crx_cache", "extensions_crx_cache",
+        "segmentation_platform", "Segmentation Platform", "optimization_guide_*", "Crashpad",
+        "History*", "Favicons*", "Top Sites*", "Visited Links", "Shortcuts*", "Sessions",
+        "Network Action Predictor*", "BrowsingTopics*", "DIPS*", "LOG", "LOG.old", "Singleton*"
+    ],
+    # 需要同步回模板的登录相关数据（相对用户数据目录的路径）
+    "auth_paths": [
+        "Local State",  # 包含 Cookie 加密密钥
+        "Default/Network/Cookies",  # 新版 Chromium 的 Cookie 位置
+        "Default/Network/Cookies-journal",
+        "Default/Cookies",
+        "Default/Cookies-journal",
+        "Default/Local Storage",
+        "Default/Session Storage",
+        "Default/IndexedDB"
+    ],
+    # 只会整体写入、不会原地修改的文件（LevelDB 的 SSTable），可以硬链接共享
+    "hardlink_patterns": ["*.ldb"]
+}
+
+# 多账号会话池配置（每个账号一个 storage state 或用户数据目录，按负载分配任务）
+SESSION_POOL_CONFIG = {
+    "accounts": {
+        "DeepSeek": [
+            {"name": "default", "storage_state": "login_state.json", "max_concurrency": 1},
+            # {"name": "account2", "storage_state": "login_state_account2.json", "max_concurrency": 1},
+        ],
+        "ChatGPT": [
+            {"name": "default", "storage_state": "login_state.json", "max_concurrency": 1},
+        ]
+    },
+    "cooldown": 120,  # 首次限流后的冷却时间（秒），连续限流时指数增长
+    "max_cooldown": 1800,
+    "failure_threshold": 3,  # 连续失败次数达到该值时按限流处理
+    "acquire_timeout": 300,  # 等待空闲会话的最长时间（秒）
+    # 回复或错误信息中出现这些文字视为被限流
+    "rate_limit_markers": [
+        "服务器繁忙", "请求过于频繁", "请稍后再试", "too many requests", "rate limit", "you've reached"
+    ],
+    "state_file": "data/session_pool.json"
+}
+
+# 浏览器监控与自动恢复配置
+SUPERVISOR_CONFIG = {
+    "probe_timeout": 10,  # 页面无响应判定时间（秒）
+    "close_timeout": 15,  # 关闭崩溃浏览器的最长等待时间（秒）
+    "max_retries": 1,  # 浏览器/页面崩溃时同一任务最多重新执行的次数
+    "restart_window": 3600,  # 重启频率统计窗口（秒）
+    "max_restarts_per_window": 10,  # 超过后每次重启前退避等待
+    "backoff": 30,  # 退避等待的初始时间（秒），连续超限时翻倍
+    "max_backoff": 600
+}
+
+# 页面内存回收配置（通过 CDP Performance.getMetrics 采样，超过阈值后替换页面）
+PAGE_RECYCLE_CONFIG = {
+    "enabled": True,
+    "max_jobs": 20,  # 单个页面最多执行的任务数
+    "max_js_heap_mb": 300,  # JSHeapUsedSize 上限（MB）
+    "max_nodes": 150000,  # DOM 节点数上限
+    "max_layout_count": 50000,  # 累计布局次数上限
+    "recycle_url": "https://chat.deepseek.com"  # 替换后新页面打开的地址，None 表示保持空白页
+}
+
+# 多提供方并发查询配置（同一关键词同时询问所有启用的提供方）
+PROVIDERS_CONFIG = {
+    "enabled": ["DeepSeek", "Kimi", "ChatGPT"],
+    "storage_state": "login_state.json",
+    "job_budget": 180,  # 单个关键词所有提供方共享的时间预算（秒）
+    "min_wait": 8,  # 发送后至少等待的时间（秒）
+    "stable_time": 6,  # 回复文本保持不变多久视为生成完成（秒）
+    "poll_interval": 2,
+    "prompt": "请搜索并回答关于以下关键词的信息：{query}",
+    "providers": {
+        "DeepSeek": {
+            "url": "https://chat.deepseek.com",
+            "input_selectors": ["textarea[placeholder*='Message']", "textarea", "[contenteditable='true']"],
+            "response_selectors": [".ds-markdown.ds-markdown--block", ".markdown", "[class*='message']"]
+        },
+        "Kimi": {
+            "url": "https://kimi.moonshot.cn",
+            "input_selectors": ["[data-testid='chat-input']", ".chat-input-editor", "textarea", "[contenteditable='true']"],
+            "response_selectors": [".segment-content-box", ".markdown", ".message-content"]
+        },
+        "ChatGPT": {
+            "url": "https://chat.openai.com",
+            "input_selectors": ["#prompt-textarea", "textarea[data-id='root']", "textarea"],
+            "response_selectors": ["[data-message-author-role='assistant']", ".markdown", ".prose"]
+        }
+    }
+}
+
+# 网页源提取流水线配置（各提取技巧作为策略插件，按历史命中率和耗时排序执行）
+SOURCE_PIPELINE_CONFIG = {
+    "strategies": ["dom_links", "right_panel", "iframe", "network", "js_data", "click_titles"],
+    "min_references": 5,  # 达到该数量的有效链接即停止尝试后续策略
+    "prior_latency": 5,  # 没有历史数据的策略假定耗时（秒）
+    "max_clicks": 8,  # click_titles 策略最多点击的条目数
+    "grace_period": 5,  # 任务预算耗尽后仍用于提取的宽限时间（秒）
+    "stats_file": "data/source_strategy_stats.json",
+    "sources_selectors": [
+        "text=已搜索到",
+        "[class*='source']",
+        "text=/已搜索到\\d+个网页/",
+        "text=/搜索到\\d+/",
+        "text=/\\d+个网页/"
+    ],
+    # 不属于参考来源的链接
+    "exclude_patterns": [
+        "deepseek.com", ".css", ".js", ".png", ".jpg", ".svg", ".ico", ".woff", ".ttf",
+        "/static/", "/assets/", "fonts.googleapis", "googleapis.com", "intercom", "analytics", "tracking"
+    ]
+}
+
+# 来源文章抓取配置（先用连接池 HTTP 请求，被拦截或需要 JS 渲染时改用浏览器标签页）
+ARTICLE_FETCH_CONFIG = {
+    "max_concurrency": 20,  # 全局并发上限
+    "per_domain": 2,  # 单个域名的并发上限（同时也是每个主机的连接池大小）
+    "max_tabs": 4,  # 浏览器回退最多同时使用的标签页
+    "http_timeout": 10,  # HTTP 请求超时（秒）
+    "http_retries": 1,
+    "browser_timeout": 15,  # 浏览器加载超时（秒）
+    "load_wait": 5,  # domcontentloaded 之后等待 load 的最长时间（秒）
+    "min_text_length": 200,  # 正文短于该长度视为需要 JS 渲染
+    "blocked_status": [403, 429, 503],  # 这些状态码通常是反爬拦截，改用浏览器重试
+    "js_required_markers": ["enable javascript", "请开启javascript", "请启用javascript"],
+    "headers": {
+        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8"
+    }
+}
+
+# 正文提取配置（按文本密度和链接密度给 DOM 块打分）
+CONTENT_EXTRACTOR_CONFIG = {
+    "max_content_length": 5000,
+    "min_paragraph_length": 25,  # 短于该长度的段落不参与打分
+    "density_norm": 20,  # 每个标签平均文字数达到该值时不再降权
+    "max_link_density": 0.5,  # 链接文字占比超过该值的段落不计入正文
+    "sibling_ratio": 0.2,  # 同级块得分达到最高分的该比例时一并计入正文
+    "sibling_min_score": 10,
+    "meta_search_length": 3000,  # 在正文前多少字中查找发布时间和作者
+    "paragraph_tags": ["p", "pre", "td", "blockquote", "div"],
+    "block_tags": ["div", "p", "section", "article", "table", "ul", "ol", "pre", "blockquote", "h1", "h2", "h3", "h4", "h5", "h6"],
+    "strip_tags": ["script", "style", "noscript", "nav", "header", "footer", "aside", "form", "iframe", "svg", "button"],
+    "tag_weights": {"article": 10, "main": 10, "section": 5, "div": 5, "pre": 3, "td": 3, "blockquote": 3, "ul": -3, "ol": -3, "li": -3, "form": -3, "th": -5},
+    "positive_patterns": ["article", "content", "post", "entry", "main", "body", "text", "detail", "story", "zhengwen", "正文"],
+    "negative_patterns": ["nav", "footer", "header", "sidebar", "comment", "menu", "share", "related", "recommend",
+                          "advert", "\\bad\\b", "banner", "breadcrumb", "copyright", "login", "popup"],
+    "date_meta": [
+        {"property": "article:published_time"},
+        {"name": "pubdate"},
+        {"name": "publishdate"},
+        {"itemprop": "datePublished"},
+        {"name": "date"}
+    ],
+    "author_meta": [
+        {"name": "author"},
+        {"property": "article:author"},
+        {"itemprop": "author"}
+    ],
+    "author_selector": "[rel='author'], [itemprop='author'], .author, .byline"
+}
+
+# 来源 URL 规范化配置（去除跟踪参数、解析跳转链接，映射缓存到本地）
+URL_CANONICAL_CONFIG = {
+    "cache_file": "data/url_cache.json",
+    "ttl": 7 * 24 * 3600,  # 跳转映射缓存有效期（秒）
+    "timeout": 8,  # HEAD 请求超时（秒）
+    "max_concurrency": 10,
+    "strip_www": True,
+    # 单页应用的路由片段（#/article/1、#!/post/2）决定页面内容，保留；其余 #片段去掉
+    "route_fragment_prefixes": ["/", "!"],
+    # 这些主机的 #片段一律保留（主机+路径片段，与 redirect_patterns 格式相同）
+    "keep_fragment_hosts": [],
+    # 只去掉已知的跟踪参数；from、source、ref 等通用名称可能是页面参数（如日期范围），保留
+    "tracking_params": [
+        "spm", "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "igshid", "twclid",
+        "mc_cid", "mc_eid", "_hsenc", "_hsmi", "sharer_sharetime", "sharer_shareid", "isappinstalled"
+    ],
+    "tracking_prefixes": ["utm_", "hmsr", "hmpl", "hmcu", "hmkw", "hmci", "pk_", "mtm_"],
+    # 目标地址直接放在参数中的跳转链接（主机+路径片段: 参数名）
+    "wrapper_params": {
+        "google.com/url": "q",
+        "bing.com/ck/a": "u",
+        "link.zhihu.com/": "target",
+        "link.juejin.cn/": "target",
+        "weibo.cn/sinaurl": "u",
+        "l.facebook.com/l.php": "u"
+    },
+    # 需要请求后才能得到目标地址的跳转链接（主机+路径片段）
+    "redirect_patterns": [
+        "baidu.com/link", "so.com/link", "sogou.com/link", "t.co/", "bit.ly/", "t.cn/", "dwz.cn/",
+        "url.cn/", "tinyurl.com/", "goo.gl/", "ow.ly/", "lnkd.in/", "news.google.com/rss/articles"
+    ],
+    "user_agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+}
+
+# jieba 分词缓存配置（按文本内容哈希缓存分词结果）
+SEGMENTATION_CACHE_CONFIG = {
+    "cache_dir": ".segment_cache",  # 磁盘缓存目录，设为 None 时只使用内存缓存
+    "max_entries": 20000,  # 内存中最多缓存的文本数
+    "version": 1  # 修改 jieba 词典或分词方式后递增，使旧缓存失效
+}
+
+# 多进程文本分析配置（分词、词频和情绪分析按分块交给进程池）
+PARALLEL_ANALYSIS_CONFIG = {
+    "enabled": True,
+    "min_texts": 200,  # 文本数达到该值才使用进程池，少量文本时进程启动开销大于收益
+    "workers": None,  # 进程数，None 表示使用 CPU 核数
+    "chunk_size": None  # 每个分块的文本数，None 表示按进程数自动划分
+}
+
+# 情感分析配置（中文使用情感词典，英文使用 TextBlob）
+SENTIMENT_CONFIG = {
+    "cjk_ratio": 0.2,  # 中文字符占比达到该值时使用中文情感词典
+    "window": 3,  # 情感词前多少个词内的否定词、程度副词生效（不跨分句）
+    "negation_weight": -0.8,  # 否定后的分数倍数（"不好"比"坏"语气弱）
+    "smoothing": 4.0,  # 极性 = (正 - 负) / (正 + 负 + smoothing)，单个普通情感词只得到约 ±0.2
+    "subjectivity_scale": 3.0,  # 主观性 = 情感词占比 × 该系数（约三分之一的词是情感词时为 1）
+    "lexicon_file": None  # 额外的情感词典 JSON 文件
+}
+
+# BM25 相关性索引配置（所有回答和来源文章的磁盘倒排索引）
+RELEVANCE_INDEX_CONFIG = {
+    "enabled": True,
+    "db_path": "data/relevance_index.sqlite3",
+    "k1": 1.5,  # 词频饱和参数
+    "b": 0.75,  # 文档长度归一化参数
+    "top_k": 10  # 报告中列出的历史最相关文档数
+}
+
+# 近似重复检测配置（MinHash 签名 + LSH 分桶）
+NEAR_DUPLICATE_CONFIG = {
+    "enabled": True,
+    "num_perm": 128,  # 签名长度
+    "bands": 16,  # LSH 分段数（每段 8 个哈希值），相似度 0.8 的文本约 95% 的概率成为候选
+    "threshold": 0.8,  # 估计的 Jaccard 相似度达到该值视为重复
+    "shingle_size": 5,  # 字符 n-gram 长度
+    "seed": 1  # 哈希函数种子，修改后已保存的签名失效
+}
+
+# 流式词频统计配置（大批量文本时以固定内存统计高频词和基数）
+STREAMING_COUNT_CONFIG = {
+    "enabled": True,
+    "min_texts": 5000,  # 文本数达到该值时改用流式统计（不保留完整词频表）
+    "capacity": 2000,  # Space-Saving 记录的高频词个数
+    "cms_width": 65536,  # Count-Min Sketch 每行宽度
+    "cms_depth": 4,  # Count-Min Sketch 行数
+    "hll_precision": 14,  # HyperLogLog 精度，2^14 个寄存器，标准误差约 0.8%
+    "sentiment_chunk": 500  # 流式模式下情绪分析每批的文本数
+}
+
+# 增量分析配置（按关键词保存可合并的统计状态）
+AGGREGATE_CONFIG = {
+    "enabled": True,
+    "directory": "data/aggregates",
+    "histogram_bins": 20,  # 情绪极性直方图的区间数（-1 到 1）
+    "top_results": 50,  # 排名状态中保留的综合评分最高的结果数
+    "history_limit": 100,  # 保留的合并历史条数
+    "seen_capacity": 200000,  # 每个关键词预计统计的结果数（Bloom 过滤器容量，约 360KB）
+    "seen_error_rate": 0.001  # 达到容量时新结果被误判为已统计的概率
+}
+
+# AIAnalyzer 综合评分配置（特征: relevance 相关性、sentiment 情绪（极性 + 1）、authority 权威性）
+SCORING_CONFIG = {
+    "default_profile": "balanced",
+    "profiles": {
+        "balanced": {"relevance": 0.4, "sentiment": 0.2, "authority": 0.4},  # 原固定权重
+        "relevance": {"relevance": 0.7, "sentiment": 0.1, "authority": 0.2},
+        "authority": {"relevance": 0.3, "sentiment": 0.1, "authority": 0.6}
+    }
+}
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+正文提取 - 按文本密度和链接密度给 DOM 块打分，提取文章正文、发布时间和作者
+
+同一套算法有两种实现：extract_article 解析原始 HTML（HTTP 抓取结果、保存的页面），
+extract_in_page 在浏览器内执行，只把提取后的结果传回 Python。
+
+打分方式参考 Readability：每个段落按长度和逗号数得分，分数累加到父节点和祖父节点；
+候选节点的分数再乘以 (1 - 链接密度) 和文本密度系数，导航、页脚等链接多、文本少的块会被压低。
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+from config import CONTENT_EXTRACTOR_CONFIG
+
+DATE_PATTERN = re.compile(r'(20\d{2}|19\d{2})\s*[-/.年]\s*(\d{1,2})\s*[-/.月]\s*(\d{1,2})\s*日?')
+AUTHOR_PATTERN = re.compile(r'(?:作者|文\s*[/|]|记者|编辑|来源)\s*[:：]?\s*([^\s|，,。<>]{2,20})')
+
+_POSITIVE = re.compile('|'.join(CONTENT_EXTRACTOR_CONFIG['positive_patterns']), re.I)
+_NEGATIVE = re.compile('|'.join(CONTENT_EXTRACTOR_CONFIG['negative_patterns']), re.I)
+
+
+def normalize_date(text: str) -> str:
+    """把 2025年6月21日、2025/6/21 等格式统一为 2025-06-21，无法识别时返回空字符串"""
+    match = DATE_PATTERN.search(text or '')
+    if not match:
+        return ''
+    year, month, day = (int(part) for part in match.groups())
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return ''
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def _class_weight(tag) -> int:
+    """按 class/id 判断块是否像正文"""
+    names = ' '.join(tag.get('class') or []) + ' ' + (tag.get('id') or '')
+    weight = 0
+    if _POSITIVE.search(names):
+        weight += 25
+    if _NEGATIVE.search(names):
+        weight -= 25
+    return weight
+
+
+def _tag_weight(tag) -> int:
+    return CONTENT_EXTRACTOR_CONFIG['tag_weights'].get(tag.name, 0)
+
+
+def _text(tag) -> str:
+    return re.sub(r'\s+', ' ', tag.get_text(' ', strip=True))
+
+
+def _link_density(tag, text_length: int) -> float:
+    if text_length == 0:
+        return 1.0
+    link_length = sum(len(_text(a)) for a in tag.find_all('a'))
+    return min(1.0, link_length / text_length)
+
+
+def _text_density_factor(tag, text_length: int) -> float:
+    """每个标签平均承载的文字越少越像导航、列表等样板块"""
+    tags = len(tag.find_all(True)) + 1
+    return min(1.0, text_length / tags / CONTENT_EXTRACTOR_CONFIG['density_norm'])
+
+
+def _paragraph_score(text: str) -> float:
+    return 1 + text.count(',') + text.count('，') + text.count('。') + min(len(text) / 100, 3)
+
+
+def _is_paragraph(tag) -> bool:
+    """段落：p/pre/td/blockquote，以及不含块级子元素、直接承载文字的 div"""
+    if tag.name in ('p', 'pre', 'td', 'blockquote'):
+        return True
+    return tag.name == 'div' and tag.find(CONTENT_EXTRACTOR_CONFIG['block_tags'], recursive=False) is None
+
+
+def _find_tagged_date(soup) -> str:
+    """meta 和 <time> 标签中的发布时间（需在移除 header 等标签之前查找）"""
+    for attrs in CONTENT_EXTRACTOR_CONFIG['date_meta']:
+        tag = soup.find('meta', attrs=attrs)
+        if tag and normalize_date(tag.get('content', '')):
+            return normalize_date(tag['content'])
+    for tag in soup.find_all('time'):
+        date = normalize_date(tag.get('datetime', '') or _text(tag))
+        if date:
+            return date
+    return ''
+
+
+def _find_text_date(texts: List[str]) -> str:
+    """按顺序在各段文本的开头查找日期，返回第一个找到的"""
+    for text in texts:
+        date = normalize_date(text[:CONTENT_EXTRACTOR_CONFIG['meta_search_length']])
+        if date:
+            return date
+    return ''
+
+
+def _find_author(soup, text: str) -> str:
+    for attrs in CONTENT_EXTRACTOR_CONFIG['author_meta']:
+        tag = soup.find('meta', attrs=attrs)
+        if tag and tag.get('content', '').strip():
+            return tag['content'].strip()
+    tag = soup.select_one(CONTENT_EXTRACTOR_CONFIG['author_selector'])
+    if tag and _text(tag):
+        return _text(tag)[:50]
+    match = AUTHOR_PATTERN.search(text[:CONTENT_EXTRACTOR_CONFIG['meta_search_length']])
+    return match.group(1) if match else ''
+
+
+def _score_candidates(body) -> List[Any]:
+    """给所有候选块打分，返回按分数降序的 [(score, tag), ...]"""
+    scores: Dict[int, List[Any]] = {}
+    min_length = CONTENT_EXTRACTOR_CONFIG['min_paragraph_length']
+
+    for paragraph in body.find_all(CONTENT_EXTRACTOR_CONFIG['paragraph_tags']):
+        if not _is_paragraph(paragraph):
+            continue
+        text = _text(paragraph)
+        if len(text) < min_length:
+            continue
+        score = _paragraph_score(text)
+        for depth, ancestor in enumerate((paragraph.parent, paragraph.parent.parent if paragraph.parent else None)):
+            if ancestor is None or ancestor.name in (None, '[document]', 'html'):
+                break
+            entry = scores.get(id(ancestor))
+            if entry is None:
+                entry = scores[id(ancestor)] = [_tag_weight(ancestor) + _class_weight(ancestor), ancestor]
+            entry[0] += score if depth == 0 else score / 2
+
+    ranked = []
+    for score, tag in scores.values():
+        text_length = len(_text(tag))
+        score *= (1 - _link_density(tag, text_length)) * _text_density_factor(tag, text_length)
+        ranked.append((score, tag))
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    return ranked
+
+
+def _collect_text(container, scored: Dict[int, float], threshold: float) -> str:
+    """拼接正文：最高分块及其同级中分数足够高的块，逐段过滤链接过多的段落"""
+    blocks = [container]
+    if container.parent is not None:
+        blocks = [sibling for sibling in container.parent.find_all(True, recursive=False)
+                  if sibling is container or scored.get(id(sibling), 0) >= threshold]
+
+    lines = []
+    max_link_density = CONTENT_EXTRACTOR_CONFIG['max_link_density']
+    for block in blocks:
+        paragraphs = [p for p in block.find_all(CONTENT_EXTRACTOR_CONFIG['paragraph_tags']) if _is_paragraph(p)]
+        if not paragraphs:
+            paragraphs = [block]
+        for paragraph in paragraphs:
+            if _class_weight(paragraph) < 0:
+                continue
+            text = _text(paragraph)
+            if text and _link_density(paragraph, len(text)) <= max_link_density:
+                lines.append(text)
+    return '\n'.join(dict.fromkeys(lines))
+
+
+def extract_main_content(soup) -> Dict[str, Any]:
+    """
+    在已解析的文档上提取正文（会移除 script/style/nav 等标签）
+
+    Returns:
+        {'content': 正文, 'score': 最高分, 'container': 正文块的标签名}
+    """
+    for tag in soup(CONTENT_EXTRACTOR_CONFIG['strip_tags']):
+        tag.decompose()
+    body = soup.body or soup
+
+    ranked = _score_candidates(body)
+    if not ranked or ranked[0][0] <= 0:
+        return {'content': _text(body), 'score': 0.0, 'container': 'body'}
+
+    top_score, container = ranked[0]
+    threshold = max(CONTENT_EXTRACTOR_CONFIG['sibling_min_score'], top_score * CONTENT_EXTRACTOR_CONFIG['sibling_ratio'])
+    scored = {id(tag): score for score, tag in ranked}
+    content = _collect_text(container, scored, threshold) or _text(container)
+    return {'content': content, 'score': round(top_score, 2), 'container': container.name}
+
+
+def extract_article(html: str, url: str = "", max_length: Optional[int] = None) -> Dict[str, Any]:
+    """
+    从原始 HTML 中提取标题、描述、各级标题、正文、发布时间和作者
+
+    Returns:
+        与 comprehensive_sources_extractor.extract_page_info 相同格式的字典
+    """
+    soup = BeautifulSoup(html, 'lxml')
+    max_length = max_length or CONTENT_EXTRACTOR_CONFIG['max_content_length']
+
+    def meta(name: str) -> str:
+        tag = soup.find('meta', attrs={'name': name}) or soup.find('meta', attrs={'property': f'og:{name}'})
+        return (tag.get('content') or '').strip() if tag else ''
+
+    title = soup.title.get_text(strip=True) if soup.title else ''
+    headings = {level: [_text(h) for h in soup.find_all(level) if h.get_text(strip=True)]
+                for level in ('h1', 'h2', 'h3')}
+    links_count = len(soup.find_all('a'))
+    images_count = len(soup.find_all('img'))
+    page_text = _text(soup.body) if soup.body else ''
+    tagged_date = _find_tagged_date(soup)
+    author = _find_author(soup, page_text)
+    description = meta('description')
+    keywords = meta('keywords')
+
+    main = extract_main_content(soup)
+    # 没有标注发布时间时先在正文中查找，再查找移除导航和页脚后的页面文字，最后才用整页文字，
+    # 避免把页脚的版权年份（© 2015–2024）当作发布时间
+    stripped_text = _text(soup.body) if soup.body else ''
+    publish_date = tagged_date or _find_text_date([main['content'], stripped_text, page_text])
+    return {
+        "url": url,
+        "title": title,
+        "description": description,
+        "keywords": keywords,
+        "h1_texts": headings['h1'],
+        "h2_texts": headings['h2'],
+        "h3_texts": headings['h3'],
+        "article_content": main['content'][:max_length],
+        "publish_date": publish_date,
+        "author": author,
+        "content_score": main['score'],
+        "links_count": links_count,
+        "images_count": images_count,
+        "domain": urlparse(url).netloc
+    }
+
+
+# 浏览器内执行的同一算法，只返回提取结果，避免把整页 HTML 或多个容器的全文传回 Python
+EXTRACT_IN_PAGE_JS = """
+(config) => {
+    const positive = new RegExp(config.positive_patterns.join('|'), 'i');
+    const negative = new RegExp(config.negative_patterns.join('|'), 'i');
+    const blockTags = new Set(config.block_tags.map(t => t.toUpperCase()));
+    const paragraphSelector = config.paragraph_tags.join(',');
+    const clean = s => (s || '').replace(/\\s+/g, ' ').trim();
+    const datePattern = /(20\\d{2}|19\\d{2})\\s*[-\\/.年]\\s*(\\d{1,2})\\s*[-\\/.月]\\s*(\\d{1,2})/;
+    const authorPattern = /(?:作者|文\\s*[\\/|]|记者|编辑|来源)\\s*[:：]?\\s*([^\\s|，,。<>]{2,20})/;
+
+    const normalizeDate = text => {
+        const m = datePattern.exec(text || '');
+        if (!m) return '';
+        const [y, mo, d] = [m[1], m[2], m[3]].map(Number);
+        if (mo < 1 || mo > 12 || d < 1 || d > 31) return '';
+        return `${y}-${String(mo).padStart(2, '0')}-${String(d).padStart(2, '0')}`;
+    };
+    const meta = name => {
+        const el = document.querySelector(`meta[name="${name}"]`) || document.querySelector(`meta[property="og:${name}"]`);
+        return el ? clean(el.content) : '';
+    };
+    const findMeta = list => {
+        for (const attrs of list) {
+            const [key, value] = Object.entries(attrs)[0];
+            const el = document.querySelector(`meta[${key}="${value}"]`);
+            if (el && clean(el.content)) return clean(el.content);
+        }
+        return '';
+    };
+
+    const headings = level => Array.from(document.querySelectorAll(level)).map(h => clean(h.innerText)).filter(Boolean);
+    const result = {
+        url: location.href,
+        title: document.title || '',
+        description: meta('description'),
+        keywords: meta('keywords'),
+        h1_texts: headings('h1'),
+        h2_texts: headings('h2'),
+        h3_texts: headings('h3'),
+        links_count: document.querySelectorAll('a').length,
+        images_count: document.querySelectorAll('img').length,
+        domain: location.host
+    };
+
+    const body = document.body;
+    if (!body) return Object.assign(result, {article_content: '', publish_date: '', author: '', content_score: 0});
+    const pageText = clean(body.textContent).slice(0, config.meta_search_length);
+
+    let publishDate = normalizeDate(findMeta(config.date_meta));
+    if (!publishDate) {
+        for (const t of document.querySelectorAll('time')) {
+            publishDate = normalizeDate(t.getAttribute('datetime') || t.textContent);
+            if (publishDate) break;
+        }
+    }
+    // 没有标注发布时间时，提取正文后先在正文中查找（页脚的版权年份不会被当作发布时间）
+    const withDate = () => {
+        result.publish_date = publishDate
+            || normalizeDate(result.article_content.slice(0, config.meta_search_length))
+            || normalizeDate(clean(root.textContent).slice(0, config.meta_search_length))
+            || normalizeDate(pageText);
+        return result;
+    };
+
+    let author = findMeta(config.author_meta);
+    if (!author) {
+        const el = document.querySelector(config.author_selector);
+        author = el ? clean(el.textContent).slice(0, 50) : '';
+    }
+    if (!author) {
+        const m = authorPattern.exec(pageText);
+        author = m ? m[1] : '';
+    }
+    result.author = author;
+
+    // 在克隆的文档上移除样板标签，不影响页面本身
+    const root = body.cloneNode(true);
+    root.querySelectorAll(config.strip_tags.join(',')).forEach(el => el.remove());
+
+    const classWeight = el => {
+        const names = `${el.className && el.className.baseVal === undefined ? el.className : ''} ${el.id || ''}`;
+        return (positive.test(names) ? 25 : 0) - (negative.test(names) ? 25 : 0);
+    };
+    const isParagraph = el => {
+        const tag = el.tagName.toLowerCase();
+        if (['p', 'pre', 'td', 'blockquote'].includes(tag)) return true;
+        return tag === 'div' && !Array.from(el.children).some(c => blockTags.has(c.tagName));
+    };
+    const linkDensity = (el, length) => {
+        if (!length) return 1;
+        let links = 0;
+        el.querySelectorAll('a').forEach(a => { links += clean(a.textContent).length; });
+        return Math.min(1, links / length);
+    };
+
+    const scores = new Map();
+    for (const p of root.querySelectorAll(paragraphSelector)) {
+        if (!isParagraph(p)) continue;
+        const text = clean(p.textContent);
+        if (text.length < config.min_paragraph_length) continue;
+        const commas = (text.match(/[,，。]/g) || []).length;
+        const score = 1 + commas + Math.min(text.length / 100, 3);
+        [p.parentElement, p.parentElement && p.parentElement.parentElement].forEach((ancestor, depth) => {
+            if (!ancestor) return;
+            if (!scores.has(ancestor)) {
+                scores.set(ancestor, (config.tag_weights[ancestor.tagName.toLowerCase()] || 0) + classWeight(ancestor));
+            }
+            scores.set(ancestor, scores.get(ancestor) + (depth === 0 ? score : score / 2));
+        });
+    }
+
+    let best = null, bestScore = 0;
+    const finalScores = new Map();
+    for (const [el, raw] of scores) {
+        const length = clean(el.textContent).length;
+        const density = Math.min(1, length / (el.getElementsByTagName('*').length + 1) / config.density_norm);
+        const score = raw * (1 - linkDensity(el, length)) * density;
+        finalScores.set(el, score);
+        if (score > bestScore) { best = el; bestScore = score; }
+    }
+
+    if (!best) {
+        result.article_content = clean(root.textContent).slice(0, config.max_content_length);
+        result.content_score = 0;
+        return withDate();
+    }
+
+    const threshold = Math.max(config.sibling_min_score, bestScore * config.sibling_ratio);
+    const blocks = best.parentElement
+        ? Array.from(best.parentElement.children).filter(s => s === best || (finalScores.get(s) || 0) >= threshold)
+        : [best];
+    const lines = [];
+    for (const block of blocks) {
+        let paragraphs = Array.from(block.querySelectorAll(paragraphSelector)).filter(isParagraph);
+        if (!paragraphs.length) paragraphs = [block];
+        for (const p of paragraphs) {
+            if (classWeight(p) < 0) continue;
+            const text = clean(p.textContent);
+            if (text && linkDensity(p, text.length) <= config.max_link_density && !lines.includes(text)) lines.push(text);
+        }
+    }
+    result.article_content = (lines.join('\\n') || clean(best.textContent)).slice(0, config.max_content_length);
+    result.content_score = Math.round(bestScore * 100) / 100;
+    return withDate();
+}
+"""
+
+
+async def extract_in_page(page) -> Dict[str, Any]:
+    """
+    在浏览器内提取当前页面的正文（结果格式与 extract_article 相同）
+    """
+    return await page.evaluate(EXTRACT_IN_PAGE_JS, CONTENT_EXTRACTOR_CONFIG)
+
@@ -5,36 +5,65 @@
 """
 
 import json
+import logging
 import os
-import re
 from collections import Counter, defaultdict
 from datetime import datetime
-from typing import Dict, List, Tuple, Any
+from typing import Dict, Iterable, List, Tuple, Any
 
-import jieba
 import pandas as pd
 import numpy as np
-from textblob import TextBlob
 from wordcloud import WordCloud
 import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
 
+from config import (NEAR_DUPLICATE_CONFIG, PARALLEL_ANALYSIS_CONFIG, RELEVANCE_INDEX_CONFIG,
+                    STREAMING_COUNT_CONFIG)
+from multi_pattern import MultiPatternMatcher
+from near_duplicates import NearDuplicateIndex
+from parallel_analysis import ParallelAnalyzer
+from relevance_index import RelevanceIndex
+from segmentation_cache import SegmentationCache
+from sentiment_lexicon import SentimentAnalyzer, polarity_label
+from streaming_counts import StreamingWordCounter, domain_of
+
+logger = logging.getLogger(__name__)
+
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'PingFang SC']
 plt.rcParams['axes.unicode_minus'] = False
 
+# 词云最多显示的词数
+WORDCLOUD_MAX_WORDS = 100
+
 class DataAnalyzer:
     """数据分析器"""
     
-    def __init__(self, results_dir: str = "results"):
+    def __init__(self, results_dir: str = "results", segmenter: SegmentationCache = None,
+                 parallel: bool = None, relevance_index: RelevanceIndex = None):
         """
         初始化数据分析器
         
         Args:
             results_dir: 结果文件目录
+            segmenter: 分词缓存（多个分析器共用时传入同一个实例）
+            parallel: 文本数量较多时是否使用多进程分析，默认使用 PARALLEL_ANALYSIS_CONFIG['enabled']
+            relevance_index: BM25 相关性索引，默认按 RELEVANCE_INDEX_CONFIG 打开
         """
         self.results_dir = results_dir
         self.stop_words = self._load_stop_words()
+        self.segmenter = segmenter or SegmentationCache(self.stop_words)
+        self.sentiment = SentimentAnalyzer(self.segmenter)
+        self.parallel = PARALLEL_ANALYSIS_CONFIG['enabled'] if parallel is None else parallel
+        self.parallel_engine: ParallelAnalyzer = None
+        # (关键词, 相关词汇...) -> 编译好的多模式匹配器
+        self.matchers: Dict[Tuple[str, ...], MultiPatternMatcher] = {}
+        self.deduplicator = NearDuplicateIndex() if NEAR_DUPLICATE_CONFIG['enabled'] else None
+        # 自己打开的索引在 close() 时关闭，传入的索引由调用方负责
+        self.owns_relevance_index = relevance_index is None and RELEVANCE_INDEX_CONFIG['enabled']
+        if self.owns_relevance_index:
+            relevance_index = RelevanceIndex(segmenter=self.segmenter)
+        self.relevance_index = relevance_index
         
     def _load_stop_words(self) -> set:
         """加载停用词"""
@@ -55,25 +84,17 @@ class DataAnalyzer:
         Returns:
             分析结果字典
         """
-        # 合并所有文本
-        combined_text = ' '.join(texts)
-        
-        # 使用jieba进行中文分词
-        words = list(jieba.cut(combined_text))
-        
-        # 过滤停用词和标点符号
-        filtered_words = [
-            word.strip() for word in words 
-            if word.strip() and word.strip() not in self.stop_words
-            and len(word.strip()) > 1 and not re.match(r'^[^\w\s]+$', word.strip())
-        ]
+        # 使用jieba进行中文分词，过滤停用词和标点符号（每段文本只分词一次，结果缓存）
+        filtered_words = self.segmenter.filtered_many(texts)
         
         # 统计词频
-        word_counts = Counter(filtered_words)
-        
+        return self.summarize_keyword_frequency(Counter(filtered_words), len(filtered_words), keyword, len(texts))
+    
+    def summarize_keyword_frequency(self, word_counts: Counter, total_words: int, keyword: str,
+                                    total_texts: int) -> Dict[str, Any]:
+        """由词频统计生成关键词频度分析结果（串行和并行分析共用）"""
         # 计算关键词频度
         keyword_count = word_counts.get(keyword, 0)
-        total_words = len(filtered_words)
         keyword_frequency = keyword_count / total_words if total_words > 0 else 0
         
         # 找出相关词汇（包含关键词的词汇）
@@ -90,7 +111,50 @@ class DataAnalyzer:
             'keyword_percentage': keyword_frequency * 100,
             'related_words': related_words,
             'top_words': dict(word_counts.most_common(20)),
-            'total_texts': len(texts)
+            'total_texts': total_texts
+        }
+    
+    def analyze_keyword_frequency_streaming(self, texts: Iterable[str], keyword: str,
+                                            domains: Iterable[str] = ()) -> Dict[str, Any]:
+        """
+        以固定内存分析关键词频度（texts 可以是生成器）
+        
+        关键词和相关词汇、总词数精确统计；高频词及其计数由 Space-Saving 和 Count-Min Sketch 估计，
+        不同词和不同域名的个数由 HyperLogLog 估计
+        
+        Args:
+            texts: 文本序列
+            keyword: 目标关键词
+            domains: 来源域名（用于估计不同域名数）
+            
+        Returns:
+            分析结果字典（字段与 analyze_keyword_frequency 相同，另有估计值和误差）
+        """
+        counter = StreamingWordCounter(keyword)
+        for words in self.segmenter.iter_filtered(texts):
+            counter.add_words(words)
+        counter.add_domains(domains)
+        counter.log_stats()
+        
+        stats = counter.get_stats()
+        keyword_count = counter.related_words.get(keyword, 0)
+        keyword_frequency = keyword_count / stats['total_words'] if stats['total_words'] > 0 else 0
+        
+        return {
+            'keyword': keyword,
+            'keyword_count': keyword_count,
+            'total_words': stats['total_words'],
+            'keyword_frequency': keyword_frequency,
+            'keyword_percentage': keyword_frequency * 100,
+            'related_words': dict(counter.related_words),
+            'top_words': dict(counter.most_common(20)),
+            'total_texts': stats['total_texts'],
+            'counting_mode': 'streaming',
+            'top_words_max_error': stats['max_error'],
+            'distinct_terms_estimate': stats['distinct_terms_estimate'],
+            'distinct_domains_estimate': stats['distinct_domains_estimate'],
+            # 词云直接使用估计的高频词，不再重新分词拼接全部文本（生成报告时取出，不写入报告）
+            'wordcloud_frequencies': dict(counter.most_common(WORDCLOUD_MAX_WORDS))
         }
     
     def analyze_sentiment(self, texts: List[str]) -> Dict[str, Any]:
@@ -103,14 +167,14 @@ class DataAnalyzer:
         Returns:
             情绪分析结果
         """
+        # 中文文本使用情感词典批量打分，英文文本使用TextBlob
+        return self.summarize_sentiment(self.sentiment.score_batch(texts))
+    
+    def summarize_sentiment(self, scores: List[Tuple[float, float]]) -> Dict[str, Any]:
+        """由每段文本的 (极性, 主观性) 生成情绪分析结果（串行和并行分析共用）"""
         sentiments = []
         
-        for text in texts:
-            # 使用TextBlob进行情绪分析
-            blob = TextBlob(text)
-            polarity = blob.sentiment.polarity  # -1 到 1，负数表示负面，正数表示正面
-            subjectivity = blob.sentiment.subjectivity  # 0 到 1，0表示客观，1表示主观
-            
+        for polarity, subjectivity in scores:
             sentiments.append({
                 'polarity': polarity,
                 'subjectivity': subjectivity,
@@ -130,17 +194,67 @@ class DataAnalyzer:
             'average_subjectivity': avg_subjectivity,
             'overall_sentiment': self._get_sentiment_label(avg_polarity),
             'sentiment_distribution': dict(sentiment_distribution),
-            'total_texts': len(texts)
+            'total_texts': len(scores)
         }
     
+    def analyze_texts(self, texts: List[str], keyword: str,
+                      domains: List[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        关键词频度和情绪分析（文本数量达到阈值时分块交给进程池，结果与串行分析相同；
+        文本数量很大时改用固定内存的流式统计）
+        
+        Args:
+            texts: 文本列表
+            keyword: 目标关键词
+            domains: 来源域名（流式统计时估计不同域名数）
+        
+        Returns:
+            (关键词频度分析结果, 情绪分析结果)
+        """
+        if STREAMING_COUNT_CONFIG['enabled'] and len(texts) >= STREAMING_COUNT_CONFIG['min_texts']:
+            frequency_analysis = self.analyze_keyword_frequency_streaming(texts, keyword, domains or ())
+            # 每段文本的情绪分数与批次无关，分批打分避免一次构造整个语料的数组
+            chunk = STREAMING_COUNT_CONFIG['sentiment_chunk']
+            scores = []
+            for start in range(0, len(texts), chunk):
+                scores.extend(self.sentiment.score_batch(texts[start:start + chunk]))
+            return frequency_analysis, self.summarize_sentiment(scores)
+        
+        if self.parallel and len(texts) >= PARALLEL_ANALYSIS_CONFIG['min_texts']:
+            if self.parallel_engine is None:
+                self.parallel_engine = ParallelAnalyzer(self.stop_words)
+            try:
+                word_counts, total_words, scores = self.parallel_engine.analyze(texts)
+                return (self.summarize_keyword_frequency(word_counts, total_words, keyword, len(texts)),
+                        self.summarize_sentiment(scores))
+            except Exception as e:
+                logger.warning(f"并行分析失败，改用串行分析: {e}")
+                self._close_parallel()
+        
+        return self.analyze_keyword_frequency(texts, keyword), self.analyze_sentiment(texts)
+    
+    def _close_parallel(self):
+        """关闭并行分析的进程池（下次分析时按需重新创建）"""
+        if self.parallel_engine is not None:
+            self.parallel_engine.close()
+            self.parallel_engine = None
+    
+    def close(self):
+        """关闭并行分析的进程池和自己打开的相关性索引"""
+        self._close_parallel()
+        if self.relevance_index is not None and self.owns_relevance_index:
+            self.relevance_index.close()
+            self.relevance_index = None
+    
+    def __enter__(self) -> 'DataAnalyzer':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
     def _get_sentiment_label(self, polarity: float) -> str:
         """根据极性值返回情绪标签"""
-        if polarity > 0.1:
-            return '积极'
-        elif polarity < -0.1:
-            return '消极'
-        else:
-            return '中性'
+        return polarity_label(polarity)
     
     def analyze_authority(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
@@ -216,22 +330,29 @@ class DataAnalyzer:
         else:
             return '一般权威性'
     
-    def analyze_relevance(self, texts: List[str], keyword: str) -> Dict[str, Any]:
+    def analyze_relevance(self, texts: List[str], keyword: str, keys: List[str] = None) -> Dict[str, Any]:
         """
         分析相关性
         
         Args:
             texts: 文本列表
             keyword: 目标关键词
+            keys: 各文本在相关性索引中的去重键，已收录的文本不重复计入 BM25 统计量
             
         Returns:
             相关性分析结果
         """
         relevance_scores = []
         
+        # 关键词和相关词汇在每段文本中只扫描一遍
+        related_words = self._get_related_words(keyword)
+        matcher = self._get_matcher(keyword, related_words)
+        
         for i, text in enumerate(texts):
-            # 计算关键词在文本中的出现次数
-            keyword_count = text.lower().count(keyword.lower())
+            # 计算关键词和相关词汇在文本中的出现次数
+            counts = matcher.count(text)
+            keyword_count = counts[0]
+            related_count = sum(counts[1:])
             
             # 计算文本长度
             text_length = len(text)
@@ -239,10 +360,6 @@ class DataAnalyzer:
             # 计算关键词密度
             keyword_density = keyword_count / text_length if text_length > 0 else 0
             
-            # 计算相关词汇出现次数
-            related_words = self._get_related_words(keyword)
-            related_count = sum(text.lower().count(word.lower()) for word in related_words)
-            
             # 计算相关性得分
             relevance_score = (keyword_count * 2 + related_count) / max(text_length / 100, 1)
             
@@ -258,12 +375,31 @@ class DataAnalyzer:
         # 计算平均相关性
         avg_relevance = np.mean([s['relevance_score'] for s in relevance_scores])
         
-        return {
+        relevance_analysis = {
             'individual_relevance': relevance_scores,
             'average_relevance': avg_relevance,
             'relevance_level': self._get_relevance_level(avg_relevance),
             'total_texts': len(texts)
         }
+        
+        # BM25 分数使用整个历史索引的统计量，不同批次之间可以比较
+        if self.relevance_index is not None:
+            bm25_scores = self.relevance_index.score_texts(texts, keyword, keys)
+            for item, bm25_score in zip(relevance_scores, bm25_scores.tolist()):
+                item['bm25_score'] = bm25_score
+            relevance_analysis['average_bm25'] = float(bm25_scores.mean()) if len(texts) else 0.0
+            relevance_analysis['top_documents'] = self.relevance_index.search(
+                keyword, RELEVANCE_INDEX_CONFIG['top_k'])
+        
+        return relevance_analysis
+    
+    def _get_matcher(self, keyword: str, related_words: List[str]) -> MultiPatternMatcher:
+        """获取（必要时编译）关键词加相关词汇的多模式匹配器"""
+        key = (keyword, *related_words)
+        matcher = self.matchers.get(key)
+        if matcher is None:
+            matcher = self.matchers[key] = MultiPatternMatcher(key)
+        return matcher
     
     def _get_related_words(self, keyword: str) -> List[str]:
         """获取与关键词相关的词汇"""
@@ -282,7 +418,8 @@ class DataAnalyzer:
         else:
             return '低相关性'
     
-    def generate_word_cloud(self, texts: List[str], keyword: str, output_path: str = None) -> str:
+    def generate_word_cloud(self, texts: List[str], keyword: str, output_path: str = None,
+                            frequencies: Dict[str, int] = None) -> str:
         """
         生成词云图
         
@@ -290,26 +427,11 @@ class DataAnalyzer:
             texts: 文本列表
             keyword: 关键词
             output_path: 输出路径
+            frequencies: 已统计好的高频词计数（流式统计时传入，不再使用 texts）
             
         Returns:
             词云图文件路径
         """
-        # 合并所有文本
-        combined_text = ' '.join(texts)
-        
-        # 使用jieba进行中文分词
-        words = list(jieba.cut(combined_text))
-        
-        # 过滤停用词
-        filtered_words = [
-            word for word in words 
-            if word.strip() and word.strip() not in self.stop_words
-            and len(word.strip()) > 1
-        ]
-        
-        # 合并词汇
-        text_for_cloud = ' '.join(filtered_words)
-        
         if not output_path:
             output_path = f"wordcloud_{keyword}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
         
@@ -318,10 +440,15 @@ class DataAnalyzer:
             width=800,
             height=600,
             background_color='white',
-            max_words=100,
+            max_words=WORDCLOUD_MAX_WORDS,
             font_path=None,  # 如果有中文字体文件，可以指定路径
             colormap='viridis'
-        ).generate(text_for_cloud)
+        )
+        if frequencies:
+            wordcloud.generate_from_frequencies(frequencies)
+        else:
+            # 与关键词频度分析共用分词缓存
+            wordcloud.generate(' '.join(self.segmenter.filtered_many(texts)))
         
         # 保存词云图
         plt.figure(figsize=(10, 8))
@@ -334,6 +461,28 @@ class DataAnalyzer:
         
         return output_path
     
+    def collapse_near_duplicates(self, texts: List[str]) -> Dict[str, Any]:
+        """
+        合并近似重复的文本
+        
+        Args:
+            texts: 文本列表
+            
+        Returns:
+            {'unique_indices': 保留的文本下标, 'duplicates': {重复文本下标: 代表文本下标}}
+        """
+        if self.deduplicator is None:
+            return {'unique_indices': list(range(len(texts))), 'duplicates': {}}
+        
+        representatives = self.deduplicator.cluster(texts)
+        duplicates = {i: rep for i, rep in enumerate(representatives) if rep != i}
+        if duplicates:
+            logger.info(f"{len(texts)} 段文本中有 {len(duplicates)} 段近似重复，已合并")
+        return {
+            'unique_indices': [i for i, rep in enumerate(representatives) if rep == i],
+            'duplicates': duplicates
+        }
+    
     def generate_comprehensive_report(self, results: List[Dict[str, Any]], keyword: str) -> Dict[str, Any]:
         """
         生成综合分析报告
@@ -346,23 +495,37 @@ class DataAnalyzer:
             综合分析报告
         """
         # 提取所有文本内容
-        texts = [result.get('content', '') for result in results if result.get('content')]
+        sources = [result for result in results if result.get('content')]
+        all_texts = [result['content'] for result in sources]
+        
+        # 近似重复的文本（转载、重复的回答）只分析一次，避免词频偏向被多次收录的内容
+        deduplication = self.collapse_near_duplicates(all_texts)
+        texts = [all_texts[i] for i in deduplication['unique_indices']]
+        keys = [RelevanceIndex.document_key(RelevanceIndex.answer_document(sources[i], keyword))
+                for i in deduplication['unique_indices']]
         
         # 进行各项分析
-        frequency_analysis = self.analyze_keyword_frequency(texts, keyword)
-        sentiment_analysis = self.analyze_sentiment(texts)
+        frequency_analysis, sentiment_analysis = self.analyze_texts(texts, keyword,
+                                                                    [domain_of(result) for result in results])
         authority_analysis = self.analyze_authority(results)
-        relevance_analysis = self.analyze_relevance(texts, keyword)
+        relevance_analysis = self.analyze_relevance(texts, keyword, keys)
+        
+        # 打分之后再写入索引，本批结果不会被重复计入统计量
+        if self.relevance_index is not None:
+            self.relevance_index.add_answers(results, keyword)
         
         # 生成词云图
-        wordcloud_path = self.generate_word_cloud(texts, keyword)
+        wordcloud_path = self.generate_word_cloud(
+            texts, keyword, frequencies=frequency_analysis.pop('wordcloud_frequencies', None))
         
         # 生成综合报告
         report = {
             'analysis_time': datetime.now().isoformat(),
             'keyword': keyword,
             'total_sources': len(results),
-            'total_texts': len(texts),
+            'total_texts': len(all_texts),
+            'unique_texts': len(texts),
+            'deduplication': deduplication,
             'frequency_analysis': frequency_analysis,
             'sentiment_analysis': sentiment_analysis,
             'authority_analysis': authority_analysis,
@@ -441,7 +604,8 @@ def main():
     ]
     
     # 生成综合分析报告
-    report = analyzer.generate_comprehensive_report(sample_results, '小鸡科技')
+    with analyzer:
+        report = analyzer.generate_comprehensive_report(sample_results, '小鸡科技')
     
     # 打印摘要
     analyzer.print_summary(report)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务时间预算 - 每个任务拥有总时间预算，所有等待从剩余预算中取超时
+"""
+
+import time
+from typing import Optional
+
+from config import DEADLINE_CONFIG
+
+
+class DeadlineExceeded(Exception):
+    """任务时间预算耗尽"""
+    pass
+
+
+class Deadline:
+    """任务截止时间"""
+
+    def __init__(self, budget: Optional[float] = None):
+        """
+        初始化截止时间
+
+        Args:
+            budget: 总时间预算（秒），None 表示不限制
+        """
+        self.budget = budget
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget if budget is not None else None
+        self.min_timeout = DEADLINE_CONFIG['min_timeout']
+
+    def remaining(self) -> float:
+        """剩余时间（秒）"""
+        if self.expires_at is None:
+            return float('inf')
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def elapsed(self) -> float:
+        """已用时间（秒）"""
+        return time.monotonic() - self.started_at
+
+    def expired(self) -> bool:
+        return self.remaining() < self.min_timeout
+
+    def check(self):
+        """预算耗尽时抛出 DeadlineExceeded"""
+        if self.expired():
+            raise DeadlineExceeded(f"超出任务时间预算 {self.budget} 秒")
+
+    def timeout_ms(self, default_ms: float) -> int:
+        """
+        计算本次等待可用的超时（毫秒）
+
+        Args:
+            default_ms: 原本的超时时间（毫秒）
+
+        Returns:
+            原超时与剩余预算中的较小值
+        """
+        self.check()
+        return int(min(default_ms, self.remaining() * 1000))
+
+    async def sleep(self, page, default_ms: float):
+        """在剩余预算内执行 page.wait_for_timeout"""
+        await page.wait_for_timeout(self.timeout_ms(default_ms))
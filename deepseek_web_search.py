@@ -4,11 +4,23 @@
 import asyncio
 import json
 import os
+import time
+import weakref
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 import logging
 
-from playwright.async_api import async_playwright, Browser, Page
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+
+from asset_cache import AssetCache
+from browser_supervisor import BrowserSupervisor
+from config import STANDBY_CONFIG, DEADLINE_CONFIG, HEDGE_CONFIG
+from deadline import Deadline, DeadlineExceeded
+from resource_policy import ResourcePolicy
+from standby_tabs import StandbyTabPool
+from hedged_requests import HedgedExecutor
+from page_recycler import PageRecycler
+from session_pool import PooledClients, SessionPool, detect_rate_limit
 
 # 设置日志
 logging.basicConfig(
@@ -21,10 +33,25 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class DeepSeekWebSearch:
-    def __init__(self):
+    def __init__(self, state_file: Optional[str] = "login_state.json", user_data_dir: Optional[str] = None):
+        """
+        Args:
+            state_file: 登录状态文件（storage state）
+            user_data_dir: 持久化用户数据目录，指定后使用该目录的登录状态，忽略 state_file
+        """
         self.browser: Optional[Browser] = None
+        self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
-        self.state_file = "login_state.json"
+        self.state_file = state_file
+        self.user_data_dir = user_data_dir
+        # 页面 -> 最近一次收到 429 的时间，限流只记在发出请求的页面上
+        self.throttled_pages = weakref.WeakKeyDictionary()
+        self.resource_policy = ResourcePolicy("DeepSeek")
+        self.asset_cache = AssetCache()
+        self.standby_pool: Optional[StandbyTabPool] = None
+        self.hedger = HedgedExecutor('DeepSeek')
+        self.supervisor = BrowserSupervisor(self, page_setup=self.asset_cache.apply)
+        self.page_recycler = PageRecycler()
         
     async def init_browser(self):
         """初始化浏览器，使用登录状态"""
@@ -36,30 +63,62 @@ class DeepSeekWebSearch:
                 '--disable-dev-shm-usage',
             ]
             
-            self.browser = await self.playwright.chromium.launch(
-                headless=False,  # 有头模式，可以看到浏览器窗口
-                args=browser_args,
-                timeout=60000,
-            )
+            user_agent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
             
-            # 检查是否有登录状态文件
-            if os.path.exists(self.state_file):
-                logger.info(f"使用登录状态文件: {self.state_file}")
-                context = await self.browser.new_context(
-                    storage_state=self.state_file,
-                    user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+            if self.user_data_dir:
+                # 持久化用户数据目录自带登录状态，上下文即浏览器（没有单独的 Browser 对象）
+                logger.info(f"使用用户数据目录: {self.user_data_dir}")
+                context = await self.playwright.chromium.launch_persistent_context(
+                    user_data_dir=self.user_data_dir,
+                    headless=False,
+                    args=browser_args,
+                    timeout=60000,
+                    user_agent=user_agent,
                     viewport={'width': 1280, 'height': 720},
                 )
             else:
-                logger.warning("未找到登录状态文件，将使用无登录状态")
-                context = await self.browser.new_context(
-                    user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                    viewport={'width': 1280, 'height': 720},
+                self.browser = await self.playwright.chromium.launch(
+                    headless=False,  # 有头模式，可以看到浏览器窗口
+                    args=browser_args,
+                    timeout=60000,
                 )
+                
+                # 检查是否有登录状态文件
+                if self.state_file and os.path.exists(self.state_file):
+                    logger.info(f"使用登录状态文件: {self.state_file}")
+                    context = await self.browser.new_context(
+                        storage_state=self.state_file,
+                        user_agent=user_agent,
+                        viewport={'width': 1280, 'height': 720},
+                    )
+                else:
+                    logger.warning("未找到登录状态文件，将使用无登录状态")
+                    context = await self.browser.new_context(
+                        user_agent=user_agent,
+                        viewport={'width': 1280, 'height': 720},
+                    )
+            self.context = context
             
-            self.page = await context.new_page()
+            # 拦截图片、字体和追踪请求
+            await self.resource_policy.apply(context)
+            # 记录接口返回的 429，用于会话池判断账号是否被限流
+            context.on("response", self._on_response)
+            
+            # 持久化上下文启动时自带一个空白页，直接使用
+            self.page = context.pages[0] if context.pages else await context.new_page()
             self.page.set_default_timeout(30000)
             
+            # 新上下文没有HTTP缓存，从本地缓存提供带哈希的JS/CSS包
+            await self.asset_cache.apply(self.page)
+            
+            # 后台预热聊天标签页，查询时直接取用
+            if STANDBY_CONFIG['enabled']:
+                self.standby_pool = StandbyTabPool(context, page_setup=self.asset_cache.apply)
+                self.standby_pool.start()
+            
+            # 监听浏览器断开和页面崩溃
+            self.supervisor.attach()
+            
             logger.info("浏览器初始化成功")
             return True
             
@@ -72,18 +131,44 @@ class DeepSeekWebSearch:
     async def close_browser(self):
         """关闭浏览器"""
         try:
+            if self.standby_pool:
+                await self.standby_pool.close()
             if self.page:
                 await self.page.close()
             if self.browser:
                 await self.browser.close()
+            elif self.context:
+                # 持久化上下文没有 Browser 对象，关闭上下文即关闭浏览器
+                await self.context.close()
+            self.context = None
             if hasattr(self, 'playwright'):
                 await self.playwright.stop()
+            self.resource_policy.log_stats()
+            self.asset_cache.log_stats()
+            self.page_recycler.log_stats()
             logger.info("浏览器已关闭")
         except Exception as e:
             logger.error(f"关闭浏览器时出错: {e}")
     
-    async def chat_with_web_search(self, query: str) -> Dict:
-        """与DeepSeek聊天并启用联网搜索"""
+    def _on_response(self, response):
+        if response.status == 429 and "deepseek.com" in response.url:
+            try:
+                self.throttled_pages[response.frame.page] = time.time()
+            except Exception:
+                # Service Worker 发出的请求没有所属页面
+                pass
+    
+    async def chat_with_web_search(self, query: str, page: Optional[Page] = None,
+                                   deadline: Optional[Deadline] = None) -> Dict:
+        """
+        与DeepSeek聊天并启用联网搜索
+        
+        Args:
+            query: 搜索关键词
+            page: 指定使用的页面（对冲请求使用独立页面），默认使用热备标签页或主页面
+            deadline: 任务时间预算，默认使用 DEADLINE_CONFIG['deepseek_job_budget']；
+                      超时后返回已获取的部分内容
+        """
         result = {
             'website': 'DeepSeek',
             'website_url': 'https://chat.deepseek.com',
@@ -103,59 +188,78 @@ class DeepSeekWebSearch:
             result['error'] = "浏览器页面未初始化"
             return result
         
+        use_standby = page is None
+        page = page or self.page
+        standby_page = None
+        chat_input = None
+        deadline = deadline or Deadline(DEADLINE_CONFIG['deepseek_job_budget'])
+        start_time = time.time()
+        
         try:
-            logger.info(f"正在访问 DeepSeek...")
-            await self.page.goto("https://chat.deepseek.com", timeout=30000)
-            await self.page.wait_for_timeout(3000)
-            
-            # 检查页面标题
-            title = await self.page.title()
-            logger.info(f"页面标题: {title}")
+            # 优先使用已就绪的热备标签页，省去导航和输入框查找
+            if use_standby and self.standby_pool:
+                standby = await self.standby_pool.acquire(timeout=min(60, deadline.remaining()))
+                if standby:
+                    standby_page, chat_input = standby
+                    page = standby_page
+                    logger.info("使用热备标签页")
             
-            # 检查是否在聊天页面
-            if "login" in title.lower() or "sign in" in title.lower():
-                result['error'] = "需要登录，请先运行 login_manager.py 进行手动登录"
-                logger.error("需要登录")
-                return result
+            # 热备标签页和对冲页面同样纳入浏览器监控
+            self.supervisor.use_page(page)
             
-            # 查找聊天输入框
-            chat_input = None
-            selectors = [
-                "textarea[placeholder*='Message']",
-                "textarea[placeholder*='Send a message']",
-                "textarea",
-                ".chat-input",
-                "[contenteditable='true']",
-                "div[contenteditable='true']"
-            ]
+            if not chat_input:
+                logger.info(f"正在访问 DeepSeek...")
+                await page.goto("https://chat.deepseek.com", timeout=deadline.timeout_ms(30000))
+                await deadline.sleep(page, 3000)
+                
+                # 检查页面标题
+                title = await page.title()
+                logger.info(f"页面标题: {title}")
+                
+                # 检查是否在聊天页面
+                if "login" in title.lower() or "sign in" in title.lower():
+                    result['error'] = "需要登录，请先运行 login_manager.py 进行手动登录"
+                    logger.error("需要登录")
+                    return result
+                
+                # 查找聊天输入框
+                selectors = [
+                    "textarea[placeholder*='Message']",
+                    "textarea[placeholder*='Send a message']",
+                    "textarea",
+                    ".chat-input",
+                    "[contenteditable='true']",
+                    "div[contenteditable='true']"
+                ]
             
-            for selector in selectors:
-                try:
-                    chat_input = await self.page.wait_for_selector(selector, timeout=5000)
-                    if chat_input:
-                        logger.info(f"找到聊天输入框: {selector}")
-                        break
-                except:
-                    continue
+                for selector in selectors:
+                    deadline.check()
+                    try:
+                        chat_input = await page.wait_for_selector(selector, timeout=deadline.timeout_ms(5000))
+                        if chat_input:
+                            logger.info(f"找到聊天输入框: {selector}")
+                            break
+                    except:
+                        continue
             
-            if not chat_input:
-                result['error'] = "未找到聊天输入框"
-                logger.error("未找到聊天输入框")
-                return result
+                if not chat_input:
+                    result['error'] = "未找到聊天输入框"
+                    logger.error("未找到聊天输入框")
+                    return result
             
             # 构造聊天提示
             chat_prompt = f"请搜索并回答关于以下关键词的信息：{query}"
             
             # 输入聊天内容
             await chat_input.fill(chat_prompt)
-            await self.page.wait_for_timeout(1000)
+            await deadline.sleep(page, 1000)
             
             # 发送消息
             await chat_input.press('Enter')
             logger.info("已发送消息，等待回复...")
             
             # 等待回复 - 增加等待时间
-            await self.page.wait_for_timeout(25000)  # 等待25秒
+            await deadline.sleep(page, 25000)  # 等待25秒
             
             # 尝试获取回复 - 更多选择器
             response_selectors = [
@@ -179,13 +283,19 @@ class DeepSeekWebSearch:
             for attempt in range(5):  # 增加尝试次数
                 for selector in response_selectors:
                     try:
-                        response_elements = await self.page.query_selector_all(selector)
+                        response_elements = await page.query_selector_all(selector)
                         if response_elements:
                             # 获取最后一个回复（最新的）
                             latest_element = response_elements[-1]
                             response_text = await latest_element.inner_text()
                             
                             if response_text and len(response_text.strip()) > 10:
+                                # 简短的"服务器繁忙"类回复是限流提示，不是回答
+                                if len(response_text) < 200 and detect_rate_limit(response_text):
+                                    result['error'] = response_text.strip()
+                                    result['rate_limited'] = True
+                                    logger.warning(f"DeepSeek 限流: {result['error']}")
+                                    return result
                                 result['content'] = response_text.strip()
                                 result['success'] = True
                                 logger.info(f"获取到回复: {response_text[:50]}...")
@@ -196,18 +306,97 @@ class DeepSeekWebSearch:
                 
                 if not result['success']:
                     logger.info(f"第 {attempt + 1} 次尝试未找到回复，继续等待...")
-                    await self.page.wait_for_timeout(5000)
+                    await deadline.sleep(page, 5000)
             
             if not result['success']:
                 result['error'] = "未能获取到回复，可能需要更长时间等待"
                 logger.warning("未能获取到回复")
             
+        except DeadlineExceeded as e:
+            result['error'] = str(e)
+            result['deadline_exceeded'] = True
+            logger.warning(f"{e}，返回已获取的部分内容")
+            # 不再等待，直接读取当前已生成的回复
+            try:
+                elements = await page.query_selector_all(".ds-markdown.ds-markdown--block")
+                if elements:
+                    result['content'] = (await elements[-1].inner_text()).strip()
+                    result['partial'] = bool(result['content'])
+            except Exception:
+                pass
         except Exception as e:
             result['error'] = str(e)
             logger.error(f"聊天过程中出错: {e}")
+        finally:
+            if standby_page and self.standby_pool:
+                self.standby_pool.release(standby_page)
+            elif page is self.page:
+                # 长期复用的主页面内存超限后替换为新页面
+                self.page = await self.page_recycler.maybe_recycle(self.page, self.asset_cache.apply, deadline,
+                                                                   self.supervisor)
+            if self.throttled_pages.get(page, 0) >= start_time:
+                result['rate_limited'] = True
+        
+        return result
+    
+    async def chat_with_web_search_hedged(self, query: str) -> Dict:
+        """
+        带对冲的联网搜索：回答超过历史 p90 延迟后在独立标签页重发，取先完成者
+        
+        Args:
+            query: 搜索关键词
+        """
+        if not self.page:
+            return await self.chat_with_web_search(query)
+        
+        # 主请求和对冲请求共享同一个任务时间预算
+        deadline = Deadline(DEADLINE_CONFIG['deepseek_job_budget'])
+        
+        async def attempt(index: int) -> Dict:
+            if index == 0:
+                return await self.chat_with_web_search(query, deadline=deadline)
+            
+            hedge_page = await self.page.context.new_page()
+            try:
+                await self.asset_cache.apply(hedge_page)
+                return await self.chat_with_web_search(query, page=hedge_page, deadline=deadline)
+            finally:
+                try:
+                    await hedge_page.close()
+                except Exception:
+                    pass
         
+        result = await self.hedger.run(attempt)
+        stats = self.hedger.get_stats()
+        logger.info(f"对冲统计: 对冲 {stats['hedged_requests']}/{stats['total_requests']}，对冲胜出 {stats['hedge_wins']}")
         return result
 
+async def ask_deepseek(client: 'DeepSeekWebSearch', query: str, page: Optional[Page] = None) -> Dict:
+    """会话池中的单次查询：独立页面直接查询，否则按配置使用对冲请求"""
+    if page is None and HEDGE_CONFIG['enabled']:
+        return await client.chat_with_web_search_hedged(query)
+    return await client.chat_with_web_search(query, page=page)
+
+def pooled_searchers(pool: Optional[SessionPool] = None) -> PooledClients:
+    """按 SESSION_POOL_CONFIG 注册的 DeepSeek 账号，每个账号一个浏览器客户端"""
+    return PooledClients(pool or SessionPool.from_config('DeepSeek'),
+                         lambda session: DeepSeekWebSearch(state_file=session.storage_state,
+                                                           user_data_dir=session.user_data_dir))
+
+async def chat_with_session_pool(queries: List[str], pool: Optional[SessionPool] = None) -> List[Dict]:
+    """
+    使用多账号会话池并发执行多个查询，每个账号一个浏览器客户端
+    
+    Args:
+        queries: 搜索关键词列表
+        pool: 会话池，默认按 SESSION_POOL_CONFIG 注册 DeepSeek 账号
+    """
+    searchers = pooled_searchers(pool)
+    try:
+        return await searchers.map(queries, ask_deepseek)
+    finally:
+        await searchers.close_browser()
+
 async def main():
     """主函数"""
     print("=== DeepSeek 联网搜索 ===")
@@ -219,44 +408,37 @@ async def main():
         print("选择选项1进行手动登录")
         print()
     
-    query = input("请输入要搜索的关键词: ").strip()
-    if not query:
+    text = input("请输入要搜索的关键词（多个关键词用逗号分隔）: ").strip()
+    queries = [query.strip() for query in text.replace('，', ',').split(',') if query.strip()]
+    if not queries:
         print("关键词不能为空！")
         return
     
-    chat = DeepSeekWebSearch()
-    
     try:
-        # 初始化浏览器
-        if not await chat.init_browser():
-            print("浏览器初始化失败")
-            return
-        
-        # 执行聊天搜索
-        print(f"正在使用 DeepSeek 联网搜索关键词: {query}")
-        result = await chat.chat_with_web_search(query)
+        # 按 SESSION_POOL_CONFIG 中的账号分配查询，多个账号时并发执行
+        print(f"正在使用 DeepSeek 联网搜索 {len(queries)} 个关键词")
+        results = await chat_with_session_pool(queries)
         
-        # 显示结果
-        if result['success']:
-            print(f"\n=== DeepSeek 回复 ===")
-            print(result['content'])
-            
-            # 保存结果
-            os.makedirs("data", exist_ok=True)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"data/deepseek_web_search_{query}_{timestamp}.json"
-            
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
-            
-            print(f"\n结果已保存到: {filename}")
-        else:
-            print(f"\n✗ 搜索失败: {result['error']}")
+        for query, result in zip(queries, results):
+            # 显示结果
+            if result['success']:
+                print(f"\n=== DeepSeek 回复: {query}（账号 {result.get('session', '-')}）===")
+                print(result['content'])
+                
+                # 保存结果
+                os.makedirs("data", exist_ok=True)
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                filename = f"data/deepseek_web_search_{query}_{timestamp}.json"
+                
+                with open(filename, 'w', encoding='utf-8') as f:
+                    json.dump(result, f, ensure_ascii=False, indent=2)
+                
+                print(f"\n结果已保存到: {filename}")
+            else:
+                print(f"\n✗ {query} 搜索失败: {result['error']}")
             
     except Exception as e:
         print(f"程序执行出错: {e}")
-    finally:
-        await chat.close_browser()
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
@@ -2,18 +2,28 @@
 # -*- coding: utf-8 -*-
 """
 DeepSeek网页源提取器 - 获取搜索到的网页URL列表
+
+提问、等待回复由本模块完成（可使用热备标签页），打开"已搜索到N个网页"面板和
+提取参考链接交给 SourceExtractionPipeline，按各策略的历史表现选择提取技巧。
 """
 
 import asyncio
 import json
 import os
-import re
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, Optional, Any
 import logging
 
 from playwright.async_api import async_playwright, Browser, Page
 
+from asset_cache import AssetCache
+from config import STANDBY_CONFIG, DEADLINE_CONFIG
+from deadline import Deadline, DeadlineExceeded
+from page_recycler import PageRecycler
+from resource_policy import ResourcePolicy
+from sources_pipeline import SourceExtractionPipeline
+from standby_tabs import StandbyTabPool
+
 # 设置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -31,6 +41,12 @@ class DeepSeekWebSourcesExtractor:
         self.browser: Optional[Browser] = None
         self.page: Optional[Page] = None
         self.state_file = "login_state.json"
+        self.resource_policy = ResourcePolicy("DeepSeek")
+        self.asset_cache = AssetCache()
+        self.standby_pool: Optional[StandbyTabPool] = None
+        self.deadline = Deadline()
+        self.page_recycler = PageRecycler()
+        self.sources_pipeline = SourceExtractionPipeline()
         
     async def init_browser(self):
         """初始化浏览器，使用登录状态"""
@@ -63,9 +79,20 @@ class DeepSeekWebSourcesExtractor:
                     viewport={'width': 1280, 'height': 720},
                 )
             
+            # 拦截图片、字体和追踪请求
+            await self.resource_policy.apply(context)
+            
             self.page = await context.new_page()
             self.page.set_default_timeout(30000)
             
+            # 新上下文没有HTTP缓存，从本地缓存提供带哈希的JS/CSS包
+            await self.asset_cache.apply(self.page)
+            
+            # 后台预热聊天标签页，查询时直接取用
+            if STANDBY_CONFIG['enabled']:
+                self.standby_pool = StandbyTabPool(context, page_setup=self.asset_cache.apply)
+                self.standby_pool.start()
+            
             logger.info("浏览器初始化成功")
             return True
             
@@ -78,22 +105,29 @@ class DeepSeekWebSourcesExtractor:
     async def close_browser(self):
         """关闭浏览器"""
         try:
+            if self.standby_pool:
+                await self.standby_pool.close()
             if self.page:
                 await self.page.close()
             if self.browser:
                 await self.browser.close()
             if hasattr(self, 'playwright'):
                 await self.playwright.stop()
+            self.resource_policy.log_stats()
+            self.asset_cache.log_stats()
+            self.page_recycler.log_stats()
             logger.info("浏览器已关闭")
         except Exception as e:
             logger.error(f"关闭浏览器时出错: {e}")
     
-    async def search_and_extract_sources(self, query: str) -> Dict[str, Any]:
+    async def search_and_extract_sources(self, query: str, budget: Optional[float] = None) -> Dict[str, Any]:
         """
         执行搜索并提取网页源
         
         Args:
             query: 搜索查询
+            budget: 任务时间预算（秒），默认使用 DEADLINE_CONFIG['sources_job_budget']；
+                    超时后返回已获取的部分结果
             
         Returns:
             包含搜索结果和网页源的字典
@@ -112,36 +146,55 @@ class DeepSeekWebSourcesExtractor:
             result['error'] = "浏览器页面未初始化"
             return result
         
+        cold_page = self.page
+        standby_page = None
+        chat_input = None
+        asked = False
+        self.deadline = Deadline(budget if budget is not None else DEADLINE_CONFIG['sources_job_budget'])
+        
         try:
-            # 1. 访问DeepSeek
-            logger.info("正在访问 DeepSeek...")
-            await self.page.goto("https://chat.deepseek.com", timeout=30000)
-            await self.page.wait_for_timeout(3000)
-            
-            # 检查页面标题
-            title = await self.page.title()
-            logger.info(f"页面标题: {title}")
+            # 优先使用已就绪的热备标签页，省去导航和输入框查找
+            if self.standby_pool:
+                standby = await self.standby_pool.acquire(timeout=min(60, self.deadline.remaining()))
+                if standby:
+                    standby_page, chat_input = standby
+                    self.page = standby_page
+                    logger.info("使用热备标签页")
             
-            if "login" in title.lower() or "sign in" in title.lower():
-                result['error'] = "需要登录，请先运行 login_manager.py 进行手动登录"
-                return result
-            
-            # 2. 找到聊天输入框并发送消息
-            chat_input = await self._find_chat_input()
             if not chat_input:
-                result['error'] = "未找到聊天输入框"
-                return result
+                # 1. 访问DeepSeek
+                logger.info("正在访问 DeepSeek...")
+                await self.page.goto("https://chat.deepseek.com", timeout=self.deadline.timeout_ms(30000))
+                await self.deadline.sleep(self.page, 3000)
+                
+                # 检查页面标题
+                title = await self.page.title()
+                logger.info(f"页面标题: {title}")
+                
+                if "login" in title.lower() or "sign in" in title.lower():
+                    result['error'] = "需要登录，请先运行 login_manager.py 进行手动登录"
+                    return result
+                
+                # 2. 找到聊天输入框并发送消息
+                chat_input = await self._find_chat_input()
+                if not chat_input:
+                    result['error'] = "未找到聊天输入框"
+                    return result
+            
+            # 需要监听接口响应的提取策略在发送前开始记录
+            await self.sources_pipeline.prepare(self.page)
             
             # 输入查询内容
             await chat_input.fill(query)
-            await self.page.wait_for_timeout(1000)
+            await self.deadline.sleep(self.page, 1000)
             
             # 发送消息
             await chat_input.press('Enter')
+            asked = True
             logger.info("已发送消息，等待回复...")
             
             # 3. 等待回复完成
-            await self.page.wait_for_timeout(25000)  # 等待25秒
+            await self.deadline.sleep(self.page, 25000)  # 等待25秒
             
             # 4. 获取回复内容
             content = await self._get_response_content()
@@ -150,21 +203,35 @@ class DeepSeekWebSourcesExtractor:
                 result['success'] = True
                 logger.info(f"获取到回复: {content[:100]}...")
             
-            # 5. 查找并点击"已搜索到XX个网页"链接
-            sources_info = await self._find_and_click_sources_link()
-            if sources_info:
-                result['sources_count'] = sources_info['count']
-                result['sources_urls'] = sources_info['urls']
-                logger.info(f"成功获取 {len(sources_info['urls'])} 个网页源")
-            else:
+            # 5. 查找并点击"已搜索到XX个网页"，打开参考来源面板
+            sources_info = await self.sources_pipeline.open_sources(self.page, self.deadline)
+            result['sources_count'] = sources_info['count']
+            if not sources_info['text']:
                 logger.warning("未找到网页源信息")
             
+            # 6. 按策略提取参考链接
+            await self._harvest_sources(result)
             return result
             
+        except DeadlineExceeded as e:
+            logger.warning(f"{e}，返回已获取的部分结果")
+            result['error'] = str(e)
+            result['deadline_exceeded'] = True
+            # 预算耗尽时流水线仍给最优策略一次短暂的宽限，从当前页面取回部分链接
+            if asked:
+                await self._harvest_sources(result)
+            return result
         except Exception as e:
             logger.error(f"搜索和提取过程出错: {e}")
             result['error'] = str(e)
             return result
+        finally:
+            if standby_page and self.standby_pool:
+                self.page = cold_page
+                self.standby_pool.release(standby_page)
+            else:
+                # 长期复用的主页面内存超限后替换为新页面
+                self.page = await self.page_recycler.maybe_recycle(self.page, self.asset_cache.apply, self.deadline)
     
     async def _find_chat_input(self):
         """查找聊天输入框"""
@@ -178,8 +245,9 @@ class DeepSeekWebSourcesExtractor:
         ]
         
         for selector in selectors:
+            self.deadline.check()
             try:
-                chat_input = await self.page.wait_for_selector(selector, timeout=5000)
+                chat_input = await self.page.wait_for_selector(selector, timeout=self.deadline.timeout_ms(5000))
                 if chat_input:
                     logger.info(f"找到聊天输入框: {selector}")
                     return chat_input
@@ -224,186 +292,25 @@ class DeepSeekWebSourcesExtractor:
             
             if attempt < 4:
                 logger.info(f"第 {attempt + 1} 次尝试未找到回复，继续等待...")
-                await self.page.wait_for_timeout(5000)
+                await self.deadline.sleep(self.page, 5000)
         
         return ""
     
-    async def _find_and_click_sources_link(self) -> Optional[Dict[str, Any]]:
-        """查找并点击"已搜索到XX个网页"链接"""
+    async def _harvest_sources(self, result: Dict[str, Any]):
+        """通过提取流水线获取参考链接（已按规范化地址去重），写入 result"""
         try:
-            # 保存点击前的截图
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            await self.page.screenshot(path=f"sources_before_click_{timestamp}.png")
-            
-            # 查找包含"已搜索到"或"搜索到"文本的元素
-            sources_selectors = [
-                "text=已搜索到",
-                "text=搜索到", 
-                "[class*='source']",
-                "[class*='reference']",
-                "a[href*='source']",
-                "button[class*='source']",
-                "div[class*='source']"
-            ]
-            
-            sources_element = None
-            sources_text = ""
-            
-            # 尝试不同的选择器
-            for selector in sources_selectors:
-                try:
-                    elements = await self.page.query_selector_all(selector)
-                    for element in elements:
-                        text = await element.inner_text()
-                        if "搜索到" in text and "网页" in text:
-                            sources_element = element
-                            sources_text = text
-                            logger.info(f"找到源链接: {text}")
-                            break
-                    if sources_element:
-                        break
-                except Exception as e:
-                    logger.debug(f"选择器 {selector} 失败: {e}")
-                    continue
-            
-            if not sources_element:
-                # 尝试通过文本内容查找
-                logger.info("尝试通过页面内容查找源信息...")
-                page_content = await self.page.content()
-                
-                # 使用正则表达式查找"已搜索到XX个网页"
-                pattern = r'已?搜索到\s*(\d+)\s*个?网页'
-                match = re.search(pattern, page_content)
-                if match:
-                    count = int(match.group(1))
-                    logger.info(f"从页面内容中找到源数量: {count}")
-                    
-                    # 尝试通过XPath查找可点击元素
-                    xpath_selectors = [
-                        f"//text()[contains(., '搜索到')]/parent::*",
-                        f"//text()[contains(., '{count}')]/parent::*",
-                        "//button[contains(text(), '搜索')]",
-                        "//a[contains(text(), '搜索')]"
-                    ]
-                    
-                    for xpath in xpath_selectors:
-                        try:
-                            elements = await self.page.query_selector_all(f"xpath={xpath}")
-                            for element in elements:
-                                text = await element.inner_text()
-                                if "搜索到" in text:
-                                    sources_element = element
-                                    sources_text = text
-                                    break
-                            if sources_element:
-                                break
-                        except Exception as e:
-                            logger.debug(f"XPath {xpath} 失败: {e}")
-                            continue
-                
-                if not sources_element:
-                    logger.warning("未找到可点击的源链接元素")
-                    # 从页面内容中提取数量信息
-                    if match:
-                        return {
-                            'count': int(match.group(1)),
-                            'urls': [],
-                            'note': '找到源数量但无法获取具体URL'
-                        }
-                    return None
-            
-            # 提取源数量
-            count_match = re.search(r'(\d+)', sources_text)
-            sources_count = int(count_match.group(1)) if count_match else 0
-            
-            # 点击源链接
-            logger.info(f"正在点击源链接: {sources_text}")
-            await sources_element.click()
-            await self.page.wait_for_timeout(3000)
-            
-            # 保存点击后的截图
-            await self.page.screenshot(path=f"sources_after_click_{timestamp}.png")
-            
-            # 尝试获取源URL列表
-            urls = await self._extract_source_urls()
-            
-            return {
-                'count': sources_count,
-                'urls': urls,
-                'clicked_text': sources_text
-            }
-            
-        except Exception as e:
-            logger.error(f"查找和点击源链接失败: {e}")
-            return None
-    
-    async def _extract_source_urls(self) -> List[str]:
-        """提取源URL列表"""
-        urls = []
-        
-        try:
-            # 等待源列表加载
-            await self.page.wait_for_timeout(2000)
-            
-            # 尝试不同的URL选择器
-            url_selectors = [
-                "a[href^='http']",
-                "a[href^='https']", 
-                "[class*='url']",
-                "[class*='link']",
-                "[class*='source'] a",
-                "[class*='reference'] a",
-                "div[class*='source'] a[href]",
-                "li a[href^='http']"
-            ]
-            
-            for selector in url_selectors:
-                try:
-                    link_elements = await self.page.query_selector_all(selector)
-                    for link in link_elements:
-                        href = await link.get_attribute('href')
-                        if href and href.startswith('http'):
-                            # 获取链接文本作为标题
-                            link_text = await link.inner_text()
-                            urls.append({
-                                'url': href,
-                                'title': link_text.strip() if link_text else href,
-                                'selector': selector
-                            })
-                    
-                    if urls:
-                        logger.info(f"通过选择器 {selector} 找到 {len(urls)} 个URL")
-                        break
-                        
-                except Exception as e:
-                    logger.debug(f"URL选择器 {selector} 失败: {e}")
-                    continue
-            
-            # 如果还没找到URL，尝试从页面源码中提取
-            if not urls:
-                logger.info("尝试从页面源码中提取URL...")
-                page_content = await self.page.content()
-                
-                # 使用正则表达式查找URL
-                url_pattern = r'https?://[^\s<>"\']+[^\s<>"\',.]'
-                found_urls = re.findall(url_pattern, page_content)
-                
-                # 过滤和去重
-                unique_urls = list(set(found_urls))
-                for url in unique_urls[:20]:  # 限制数量
-                    if not any(skip in url for skip in ['javascript:', 'data:', 'blob:', 'chrome-extension:']):
-                        urls.append({
-                            'url': url,
-                            'title': url,
-                            'selector': 'regex'
-                        })
-            
-            logger.info(f"总共提取到 {len(urls)} 个URL")
-            return urls
-            
+            harvest = await self.sources_pipeline.harvest(self.page, self.deadline, result['sources_count'])
         except Exception as e:
             logger.error(f"提取源URL失败: {e}")
-            return []
+            return
+        
+        result['sources_urls'] = [
+            {'url': ref['url'], 'title': ref['title'] or ref['text'] or ref['url'], 'strategy': ref['strategy']}
+            for ref in harvest['references']
+        ]
+        result['strategy'] = harvest['strategy']
+        result['attempts'] = harvest['attempts']
+        logger.info(f"提取策略: {harvest['strategy'] or '未达到阈值'}，获取 {len(result['sources_urls'])} 个网页源")
     
     def save_sources_result(self, result: Dict[str, Any], filename: str = None) -> str:
         """保存源提取结果"""
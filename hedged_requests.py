@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对冲请求 - 回答延迟超过历史 p90 时发出第二个相同请求，取先完成者
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import HEDGE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """按提供方记录回答延迟和对冲次数，持久化到本地文件"""
+
+    def __init__(self, stats_file: Optional[str] = None, max_samples: Optional[int] = None):
+        self.stats_file = stats_file or HEDGE_CONFIG['stats_file']
+        self.max_samples = max_samples or HEDGE_CONFIG['max_samples']
+        data = self._load()
+        self.samples: Dict[str, List[float]] = data.get('latencies', {})
+        self.requests: Dict[str, Dict[str, int]] = data.get('requests', {})
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self.stats_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """保存延迟样本和对冲计数"""
+        try:
+            directory = os.path.dirname(self.stats_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.stats_file, 'w', encoding='utf-8') as f:
+                json.dump({'latencies': self.samples, 'requests': self.requests}, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.warning(f"保存延迟统计失败: {e}")
+
+    def record(self, provider: str, latency: float):
+        """记录一次成功回答的延迟（秒）"""
+        samples = self.samples.setdefault(provider, [])
+        samples.append(round(latency, 3))
+        if len(samples) > self.max_samples:
+            del samples[:len(samples) - self.max_samples]
+
+    def count_request(self, provider: str, hedged: bool = False):
+        """累计请求数和对冲数（跨进程用于对冲预算）"""
+        counts = self.requests.setdefault(provider, {'total': 0, 'hedged': 0})
+        if hedged:
+            counts['hedged'] += 1
+        else:
+            counts['total'] += 1
+
+    def hedge_rate_allows(self, provider: str, budget: float) -> bool:
+        """对冲比例是否仍在预算内（允许一次突发，便于首次运行也能对冲）"""
+        counts = self.requests.get(provider, {'total': 0, 'hedged': 0})
+        return counts['hedged'] < budget * counts['total'] + 1
+
+    def percentile(self, provider: str, q: float) -> Optional[float]:
+        """返回指定分位数的延迟，样本为空时返回 None"""
+        samples = sorted(self.samples.get(provider, []))
+        if not samples:
+            return None
+        index = min(int(q * len(samples)), len(samples) - 1)
+        return samples[index]
+
+    def count(self, provider: str) -> int:
+        return len(self.samples.get(provider, []))
+
+
+class HedgedExecutor:
+    """对冲执行器：主请求超过 p90 延迟后发出备份请求，取先成功者并取消另一个"""
+
+    def __init__(self, provider: str, tracker: Optional[LatencyTracker] = None,
+                 budget: Optional[float] = None):
+        """
+        初始化对冲执行器
+
+        Args:
+            provider: 提供方名称，用于区分延迟统计
+            tracker: 延迟统计（多个执行器可共享）
+            budget: 最多对冲的请求比例
+        """
+        self.provider = provider
+        self.tracker = tracker or LatencyTracker()
+        self.budget = budget if budget is not None else HEDGE_CONFIG['budget']
+        self.percentile = HEDGE_CONFIG['percentile']
+        self.min_samples = HEDGE_CONFIG['min_samples']
+        self.default_delay = HEDGE_CONFIG['default_delay']
+
+        # 统计信息
+        self.total_requests = 0
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self) -> float:
+        """触发对冲的等待时间（秒）"""
+        if self.tracker.count(self.provider) < self.min_samples:
+            return self.default_delay
+        return self.tracker.percentile(self.provider, self.percentile) or self.default_delay
+
+    def _within_budget(self) -> bool:
+        return self.tracker.hedge_rate_allows(self.provider, self.budget)
+
+    @staticmethod
+    async def _cancel(task: asyncio.Task):
+        if not task.done():
+            task.cancel()
+        try:
+            await task
+        except BaseException:
+            pass
+
+    async def run(self, attempt_factory: Callable[[int], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        执行带对冲的请求
+
+        Args:
+            attempt_factory: 接收尝试序号（0 为主请求，1 为对冲请求）并返回结果字典的协程函数，
+                             结果字典中 'success' 为真表示成功
+
+        Returns:
+            先成功的结果，附加 'hedged' 和 'latency' 字段
+        """
+        self.total_requests += 1
+        self.tracker.count_request(self.provider)
+        start_time = time.time()
+        delay = self.hedge_delay()
+
+        primary = asyncio.ensure_future(attempt_factory(0))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+
+        if done or not self._within_budget():
+            result = await primary
+            return self._finish(result, start_time, hedged=False, winner=0)
+
+        self.hedged_requests += 1
+        self.tracker.count_request(self.provider, hedged=True)
+        logger.info(f"{self.provider} 回答超过 {delay:.1f} 秒，发出对冲请求")
+        hedge = asyncio.ensure_future(attempt_factory(1))
+        tasks = {primary: 0, hedge: 1}
+        pending = set(tasks)
+        result = None
+        winner = 0
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task_result = task.result() if not task.exception() else None
+                    if task_result and task_result.get('success'):
+                        result, winner = task_result, tasks[task]
+                        break
+                    # 先完成但失败的结果作为兜底
+                    if result is None and task_result is not None:
+                        result, winner = task_result, tasks[task]
+                if result and result.get('success'):
+                    break
+        finally:
+            for task in pending:
+                await self._cancel(task)
+
+        if result is None:
+            result = {'success': False, 'error': '主请求和对冲请求均失败'}
+        if winner == 1 and result.get('success'):
+            self.hedge_wins += 1
+        return self._finish(result, start_time, hedged=True, winner=winner)
+
+    def _finish(self, result: Dict[str, Any], start_time: float, hedged: bool, winner: int) -> Dict[str, Any]:
+        latency = time.time() - start_time
+        if result.get('success'):
+            self.tracker.record(self.provider, latency)
+        self.tracker.save()
+        result['hedged'] = hedged
+        result['hedge_winner'] = 'hedge' if winner == 1 else 'primary'
+        result['latency'] = round(latency, 3)
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取对冲统计"""
+        return {
+            'provider': self.provider,
+            'total_requests': self.total_requests,
+            'hedged_requests': self.hedged_requests,
+            'hedge_rate': self.hedged_requests / self.total_requests if self.total_requests else 0.0,
+            'hedge_wins': self.hedge_wins,
+            'hedge_delay': self.hedge_delay()
+        }
@@ -10,34 +10,46 @@ import asyncio
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 
+from aggregate_state import AggregateStore
+from config import AGGREGATE_CONFIG
 from data_analyzer import DataAnalyzer
-from deepseek_web_search import DeepSeekWebSearch
+from deepseek_web_search import ask_deepseek, pooled_searchers
+from providers import ProviderFanOut
 
 
 class IntegratedAnalyzer:
     """集成分析器 - 搜索 + 分析"""
     
-    def __init__(self, results_dir: str = "analysis_results"):
+    def __init__(self, results_dir: str = "analysis_results", providers: Optional[List[str]] = None):
         """
         初始化集成分析器
         
         Args:
             results_dir: 结果保存目录
+            providers: 同时查询的提供方（如 ['DeepSeek', 'Kimi', 'ChatGPT']），默认只使用 DeepSeek
         """
         self.results_dir = results_dir
-        self.searcher = DeepSeekWebSearch()
+        self.fanout = ProviderFanOut(providers) if providers else None
+        # 只查询 DeepSeek 时按 SESSION_POOL_CONFIG 中的账号分配查询，每个账号一个浏览器
+        self.searchers = None if self.fanout else pooled_searchers()
+        # 负责浏览器生命周期的对象
+        self.client = self.fanout or self.searchers
         self.analyzer = DataAnalyzer(results_dir=results_dir)
+        # 按关键词累计的统计状态
+        self.aggregates = AggregateStore() if AGGREGATE_CONFIG['enabled'] else None
         
         # 创建结果目录
         os.makedirs(results_dir, exist_ok=True)
     
-    async def search_and_analyze(self, keyword: str, detailed_query: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    async def search_and_analyze(self, keyword: str, detailed_query: Optional[str] = None,
+                                 manage_browser: bool = True) -> Optional[Dict[str, Any]]:
         """
         搜索并分析关键词
         
         Args:
             keyword: 关键词
             detailed_query: 详细查询（可选）
+            manage_browser: 是否在本次调用中初始化和关闭浏览器（批量分析时由调用方统一管理）
             
         Returns:
             分析结果
@@ -50,14 +62,18 @@ class IntegratedAnalyzer:
         
         try:
             # 1. 初始化浏览器
-            print("正在初始化浏览器...")
-            if not await self.searcher.init_browser():
-                print("浏览器初始化失败")
-                return None
+            if manage_browser:
+                print("正在初始化浏览器...")
+                if not await self.client.init_browser():
+                    print("浏览器初始化失败")
+                    return None
             
             # 2. 执行搜索
             print("正在执行网页搜索...")
-            search_results = await self.searcher.chat_with_web_search(detailed_query)
+            if self.fanout:
+                search_results, analysis_data = await self._search_all_providers(detailed_query)
+            else:
+                search_results, analysis_data = await self._search_deepseek(detailed_query)
             
             if not search_results or not search_results.get('success'):
                 print(f"搜索失败: {search_results.get('error', '未知错误')}")
@@ -69,28 +85,23 @@ class IntegratedAnalyzer:
                 json.dump(search_results, f, ensure_ascii=False, indent=2)
             print(f"搜索结果已保存: {search_file}")
             
-            # 4. 准备分析数据
-            analysis_data = [{
-                'website': 'DeepSeek',
-                'content': search_results.get('content', ''),
-                'references': [],  # DeepSeek搜索结果中没有单独的引用信息
-                'query': detailed_query,
-                'search_time': search_results.get('timestamp', datetime.now().isoformat())
-            }]
-            
-            # 5. 执行数据分析
+            # 4. 执行数据分析
             print("正在执行数据分析...")
             analysis_report = self.analyzer.generate_comprehensive_report(analysis_data, keyword)
             
-            # 6. 保存分析报告
+            # 新结果合并进关键词的累计状态，报告附带全部历史的统计
+            if self.aggregates:
+                analysis_report['cumulative'] = self.fold_results(keyword, analysis_data)
+            
+            # 5. 保存分析报告
             report_file = os.path.join(self.results_dir, f"analysis_{keyword}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
             self.analyzer.save_report(analysis_report, report_file)
             print(f"分析报告已保存: {report_file}")
             
-            # 7. 打印摘要
+            # 6. 打印摘要
             self.analyzer.print_summary(analysis_report)
             
-            # 8. 返回完整结果
+            # 7. 返回完整结果
             return {
                 'search_results': search_results,
                 'analysis_report': analysis_report,
@@ -106,7 +117,62 @@ class IntegratedAnalyzer:
             return None
         finally:
             # 关闭浏览器
-            await self.searcher.close_browser()
+            if manage_browser:
+                await self.client.close_browser()
+    
+    def fold_results(self, keyword: str, analysis_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        把新结果合并进关键词的累计状态（已统计过的结果跳过，近似重复的文本只统计一次）
+        
+        Returns:
+            由累计状态生成的报告
+        """
+        aggregate = self.aggregates.load(keyword, 'report')
+        added = aggregate.fold_texts(analysis_data, self.analyzer.segmenter, self.analyzer.sentiment,
+                                     collapse=self.analyzer.collapse_near_duplicates)
+        if added:
+            self.aggregates.save(aggregate)
+        print(f"累计统计: 新增 {added} 条结果，共 {aggregate.total_results} 条（版本 {aggregate.version}）")
+        return aggregate.report()
+    
+    def close(self):
+        """释放分析器的进程池和相关性索引（浏览器由 search_and_analyze / batch_analyze 关闭）"""
+        self.analyzer.close()
+    
+    def cumulative_report(self, keyword: str) -> Optional[Dict[str, Any]]:
+        """不搜索，直接由已保存的累计状态生成关键词报告"""
+        if not self.aggregates:
+            return None
+        return self.aggregates.load(keyword, 'report').report()
+    
+    async def _search_deepseek(self, detailed_query: str):
+        """只查询 DeepSeek，返回 (搜索结果, 分析数据)"""
+        # 在负载最低的账号上执行；浏览器崩溃或页面卡死时自动恢复并重试一次
+        search_results = await self.searchers.run(detailed_query, ask_deepseek)
+        
+        analysis_data = [{
+            'website': 'DeepSeek',
+            'content': search_results.get('content', ''),
+            'references': [],  # DeepSeek搜索结果中没有单独的引用信息
+            'query': detailed_query,
+            'search_time': search_results.get('timestamp', datetime.now().isoformat())
+        }]
+        return search_results, analysis_data
+    
+    async def _search_all_providers(self, detailed_query: str):
+        """同时查询所有提供方，返回 (搜索结果, 分析数据)"""
+        provider_results = await self.fanout.query_all(detailed_query)
+        analysis_data = ProviderFanOut.to_analysis_data(provider_results)
+        
+        search_results = {
+            'query': detailed_query,
+            'timestamp': datetime.now().isoformat(),
+            'providers': [r['website'] for r in provider_results],
+            'results': provider_results,
+            'success': bool(analysis_data),
+            'error': '; '.join(f"{r['website']}: {r['error']}" for r in provider_results if r.get('error'))
+        }
+        return search_results, analysis_data
     
     async def batch_analyze(self, keywords: List[str], queries: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
         """
@@ -123,7 +189,13 @@ class IntegratedAnalyzer:
         
         batch_results = {}
         
-        for i, keyword in enumerate(keywords, 1):
+        # 整个批次共用浏览器，崩溃时由 supervisor 重启，不影响剩余关键词
+        print("正在初始化浏览器...")
+        if not await self.client.init_browser():
+            print("浏览器初始化失败")
+            return batch_results
+        
+        async def analyze(i: int, keyword: str):
             print(f"\n{'='*60}")
             print(f"处理第 {i}/{len(keywords)} 个关键词: {keyword}")
             print(f"{'='*60}")
@@ -132,18 +204,23 @@ class IntegratedAnalyzer:
             detailed_query = queries.get(keyword) if queries else None
             
             # 执行搜索和分析
-            result = await self.search_and_analyze(keyword, detailed_query)
+            result = await self.search_and_analyze(keyword, detailed_query, manage_browser=False)
             
             if result:
                 batch_results[keyword] = result
                 print(f"✅ {keyword} 分析完成")
             else:
                 print(f"❌ {keyword} 分析失败")
-            
-            # 短暂延迟，避免请求过于频繁
-            if i < len(keywords):
-                print("等待 3 秒后处理下一个关键词...")
-                await asyncio.sleep(3)
+        
+        try:
+            # 关键词按会话池分配到各账号并发执行，并发数由账号数和各账号的并发上限决定；
+            # 被限流的账号由会话池冷却，不再固定间隔等待
+            await asyncio.gather(*(analyze(i, keyword) for i, keyword in enumerate(keywords, 1)))
+        finally:
+            await self.client.close_browser()
+        
+        # 按输入顺序保存
+        batch_results = {keyword: batch_results[keyword] for keyword in keywords if keyword in batch_results}
         
         # 保存批量分析结果
         batch_file = os.path.join(self.results_dir, f"batch_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
@@ -273,14 +350,17 @@ async def main():
     # 创建集成分析器
     analyzer = IntegratedAnalyzer()
     
-    # 单个关键词分析
-    print("1. 单个关键词分析演示")
-    result = await analyzer.search_and_analyze("小鸡科技")
-    
-    if result:
-        print("✅ 单个关键词分析完成")
-    else:
-        print("❌ 单个关键词分析失败")
+    try:
+        # 单个关键词分析
+        print("1. 单个关键词分析演示")
+        result = await analyzer.search_and_analyze("小鸡科技")
+        
+        if result:
+            print("✅ 单个关键词分析完成")
+        else:
+            print("❌ 单个关键词分析失败")
+    finally:
+        analyzer.close()
     
     # 批量关键词分析（示例）
     # keywords = ["小鸡科技", "游戏外设", "手柄"]
@@ -7,9 +7,16 @@ import os
 from datetime import datetime
 from playwright.async_api import async_playwright
 
+from login_validator import LoginValidator
+
 class LoginManager:
-    def __init__(self):
-        self.state_file = "login_state.json"
+    def __init__(self, state_file: str = "login_state.json"):
+        """
+        Args:
+            state_file: 登录状态文件，为多个账号分别保存时使用不同文件（见 SESSION_POOL_CONFIG）
+        """
+        self.state_file = state_file
+        self.validator = LoginValidator(self.state_file)
         
     async def manual_login(self, website_name: str, url: str):
         """手动登录并保存登录状态"""
@@ -80,14 +87,28 @@ class LoginManager:
             if 'playwright' in locals():
                 await playwright.stop()
     
-    async def test_login_state(self, website_name: str, url: str):
-        """测试登录状态是否有效"""
+    async def test_login_state(self, website_name: str, url: str, force_browser: bool = False):
+        """
+        测试登录状态是否有效
+        
+        先离线检查 Cookie/Token 并在必要时做一次轻量 API 探测，
+        无法得出结论（或 force_browser=True）时才启动浏览器检查。
+        """
         print(f"=== 测试 {website_name} 登录状态 ===")
         
         if not os.path.exists(self.state_file):
             print(f"✗ 登录状态文件 {self.state_file} 不存在")
             return False
         
+        if not force_browser:
+            verdict = await self.validator.validate(website_name)
+            if verdict['logged_in'] is not None:
+                status = "有效" if verdict['logged_in'] else "无效"
+                print(f"{'✓' if verdict['logged_in'] else '✗'} 登录状态{status}"
+                      f"（来源: {verdict['source']}，耗时 {verdict['elapsed'] * 1000:.0f} ms）")
+                return verdict['logged_in']
+            print("⚠ 快速验证无法确定登录状态，使用浏览器检查")
+        
         try:
             playwright = await async_playwright().start()
             
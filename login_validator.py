@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+登录状态快速验证 - 无需启动浏览器
+
+验证顺序：
+1. 缓存的结论（TTL 内且登录状态文件未变化）
+2. 离线检查 storage state / 用户数据目录中的 Cookie 过期时间和登录 Token
+3. 通过 Playwright 的 APIRequestContext 发送轻量的已认证 API 请求
+三者都无法得出结论时返回 None，由调用方回退到浏览器检查。
+"""
+
+import glob
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from config import LOGIN_VALIDATION_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Chromium Cookie 时间戳从 1601-01-01 起算（微秒）
+CHROME_EPOCH_OFFSET = 11644473600
+
+# Cookie 数据库相对用户数据目录的位置：新版 Chromium 放在 Network 子目录，旧版在 Default 下
+COOKIE_DB_PATHS = [
+    os.path.join('Default', 'Network', 'Cookies'),
+    os.path.join('Default', 'Cookies')
+]
+
+
+class LoginValidator:
+    """登录状态验证器"""
+
+    def __init__(self, state_file: Optional[str] = "login_state.json",
+                 user_data_dir: Optional[str] = None, cache_file: Optional[str] = None,
+                 ttl: Optional[int] = None):
+        """
+        初始化登录状态验证器
+
+        Args:
+            state_file: storage state 文件（login_state.json）
+            user_data_dir: 持久化用户数据目录（与 state_file 二选一）
+            cache_file: 结论缓存文件
+            ttl: 结论缓存时间（秒）
+        """
+        self.state_file = state_file if not user_data_dir else None
+        self.user_data_dir = user_data_dir
+        self.cache_file = cache_file or LOGIN_VALIDATION_CONFIG['cache_file']
+        self.ttl = ttl if ttl is not None else LOGIN_VALIDATION_CONFIG['ttl']
+        self.probe_timeout = LOGIN_VALIDATION_CONFIG['probe_timeout'] * 1000
+
+    # ---------- 缓存 ----------
+
+    def _source_path(self) -> str:
+        return self.user_data_dir or self.state_file or ''
+
+    def _cookies_db(self) -> Optional[str]:
+        """用户数据目录中实际存在的 Cookie 数据库"""
+        for rel_path in COOKIE_DB_PATHS:
+            path = os.path.join(self.user_data_dir, rel_path)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _source_fingerprint(self) -> str:
+        """登录数据的指纹，文件变化后缓存自动失效"""
+        if self.user_data_dir:
+            path = self._cookies_db()
+        else:
+            path = self.state_file
+        try:
+            return str(os.path.getmtime(path))
+        except (OSError, TypeError):
+            return 'missing'
+
+    def _cache_key(self, provider: str) -> str:
+        return f"{provider}|{os.path.abspath(self._source_path())}"
+
+    def _load_cache(self) -> Dict[str, Any]:
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _get_cached(self, provider: str) -> Optional[Dict[str, Any]]:
+        entry = self._load_cache().get(self._cache_key(provider))
+        if not entry:
+            return None
+        if time.time() - entry.get('checked_at', 0) > self.ttl:
+            return None
+        if entry.get('fingerprint') != self._source_fingerprint():
+            return None
+        return entry
+
+    def _save_cached(self, provider: str, logged_in: bool, source: str):
+        cache = self._load_cache()
+        cache[self._cache_key(provider)] = {
+            'logged_in': logged_in,
+            'source': source,
+            'checked_at': time.time(),
+            'fingerprint': self._source_fingerprint()
+        }
+        try:
+            directory = os.path.dirname(self.cache_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.warning(f"保存登录验证缓存失败: {e}")
+
+    def invalidate(self, provider: str):
+        """清除某个提供方的缓存结论（如重新登录后）"""
+        cache = self._load_cache()
+        if cache.pop(self._cache_key(provider), None) is not None:
+            try:
+                with open(self.cache_file, 'w', encoding='utf-8') as f:
+                    json.dump(cache, f, ensure_ascii=False, indent=2)
+            except Exception as e:
+                logger.warning(f"清除登录验证缓存失败: {e}")
+
+    # ---------- 离线检查 ----------
+
+    @staticmethod
+    def _domain_matches(domain: str, domains) -> bool:
+        domain = domain.lstrip('.')
+        return any(domain == d or domain.endswith('.' + d) for d in domains)
+
+    def _check_cookie_expiry(self, cookies, config: Dict[str, Any]) -> Optional[bool]:
+        """
+        检查登录 Cookie 的过期时间
+
+        Args:
+            cookies: [(domain, name, expires_unix)]，会话 Cookie 的 expires 为 -1
+
+        Returns:
+            True/False，无法判断时返回 None
+        """
+        auth_cookies = config.get('auth_cookies') or []
+        if not auth_cookies:
+            return None
+
+        now = time.time()
+        found = [c for c in cookies
+                 if c[1] in auth_cookies and self._domain_matches(c[0], config['domains'])]
+        if not found:
+            return False
+        if any(expires > now for _, _, expires in found):
+            return True
+        if all(0 < expires <= now for _, _, expires in found):
+            return False
+        # 只有会话 Cookie，无法离线判断
+        return None
+
+    def _read_state_file(self, config: Dict[str, Any]) -> Tuple[Optional[bool], Optional[str]]:
+        """从 storage state 文件离线检查，返回 (结论, 登录 Token)"""
+        if not self.state_file or not os.path.exists(self.state_file):
+            return False, None
+
+        with open(self.state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+
+        cookies = [(c.get('domain', ''), c.get('name'), c.get('expires', -1)) for c in state.get('cookies', [])]
+        verdict = self._check_cookie_expiry(cookies, config)
+
+        token = None
+        token_key = config.get('token_key')
+        if token_key:
+            for origin in state.get('origins', []):
+                if origin.get('origin') != config.get('origin'):
+                    continue
+                for item in origin.get('localStorage', []):
+                    if item.get('name') == token_key:
+                        token = self._parse_token(item.get('value'))
+            if not token:
+                # 没有登录 Token 即未登录
+                return False, None
+
+        return verdict, token
+
+    @staticmethod
+    def _parse_token(raw: Optional[str]) -> Optional[str]:
+        """localStorage 中的 Token 可能是 JSON 包装的 {"value": "..."}"""
+        if not raw:
+            return None
+        try:
+            data = json.loads(raw)
+            if isinstance(data, dict):
+                return data.get('value') or None
+        except ValueError:
+            pass
+        return raw
+
+    def _read_profile(self, config: Dict[str, Any]) -> Tuple[Optional[bool], Optional[str]]:
+        """从持久化用户数据目录离线检查，返回 (结论, 登录 Token)"""
+        profile_dir = os.path.join(self.user_data_dir, 'Default')
+        cookies_db = self._cookies_db()
+        if not cookies_db:
+            # 找不到 Cookie 数据库（路径或版本不同）不代表未登录，交给 API 探测或浏览器检查
+            return None, self._read_profile_token(profile_dir, config)
+
+        # 浏览器运行时数据库可能被锁定，复制一份再读
+        cookies = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_db = os.path.join(tmp_dir, 'Cookies')
+            shutil.copyfile(cookies_db, tmp_db)
+            conn = sqlite3.connect(tmp_db)
+            try:
+                rows = conn.execute("SELECT host_key, name, expires_utc, has_expires FROM cookies").fetchall()
+            finally:
+                conn.close()
+        for host, name, expires_utc, has_expires in rows:
+            expires = expires_utc / 1000000 - CHROME_EPOCH_OFFSET if has_expires else -1
+            cookies.append((host, name, expires))
+
+        verdict = self._check_cookie_expiry(cookies, config)
+        token = self._read_profile_token(profile_dir, config)
+        return verdict, token
+
+    @staticmethod
+    def _read_profile_token(profile_dir: str, config: Dict[str, Any]) -> Optional[str]:
+        """从 Local Storage 的 leveldb 日志中查找最近写入的登录 Token（尽力而为）"""
+        token_key = config.get('token_key')
+        if not token_key:
+            return None
+
+        pattern = re.compile(re.escape(token_key.encode('utf-8')) + rb'.{0,8}?\{"value":"([^"]+)"', re.DOTALL)
+        token = None
+        files = sorted(glob.glob(os.path.join(profile_dir, 'Local Storage', 'leveldb', '*.log')),
+                       key=os.path.getmtime)
+        for path in files:
+            try:
+                with open(path, 'rb') as f:
+                    matches = pattern.findall(f.read())
+            except OSError:
+                continue
+            if matches:
+                token = matches[-1].decode('utf-8', errors='ignore')
+        return token
+
+    # ---------- API 探测 ----------
+
+    async def _probe_api(self, provider: str, config: Dict[str, Any], token: Optional[str],
+                         playwright=None) -> Optional[bool]:
+        """通过 APIRequestContext 发送一次已认证请求"""
+        probe_url = config.get('probe_url')
+        if not probe_url:
+            return None
+
+        headers = {}
+        if token and config.get('token_header'):
+            headers[config['token_header']] = config.get('token_prefix', '') + token
+
+        own_playwright = playwright is None
+        try:
+            if own_playwright:
+                from playwright.async_api import async_playwright
+                playwright = await async_playwright().start()
+
+            kwargs = {'extra_http_headers': headers}
+            if self.state_file and os.path.exists(self.state_file):
+                kwargs['storage_state'] = self.state_file
+            request_context = await playwright.request.new_context(**kwargs)
+            try:
+                response = await request_context.get(probe_url, timeout=self.probe_timeout)
+                if response.status in (401, 403):
+                    return False
+                if response.status != 200:
+                    return None
+                try:
+                    data = await response.json()
+                except Exception:
+                    return None
+                return self._interpret_probe(provider, data)
+            finally:
+                await request_context.dispose()
+        except Exception as e:
+            logger.warning(f"{provider} 登录状态 API 探测失败: {e}")
+            return None
+        finally:
+            if own_playwright and playwright:
+                await playwright.stop()
+
+    @staticmethod
+    def _interpret_probe(provider: str, data: Any) -> Optional[bool]:
+        if not isinstance(data, dict):
+            return None
+        if provider == "ChatGPT":
+            return bool(data.get('accessToken'))
+        if 'code' in data:
+            return data.get('code') == 0
+        return None
+
+    # ---------- 对外接口 ----------
+
+    async def validate(self, provider: str, playwright=None) -> Dict[str, Any]:
+        """
+        验证登录状态
+
+        Args:
+            provider: 提供方名称（DeepSeek、ChatGPT）
+            playwright: 已启动的 Playwright 实例（可选，用于 API 探测）
+
+        Returns:
+            {'logged_in': True/False/None, 'source': 'cache'/'offline'/'api'/'unknown', 'elapsed': 秒}
+        """
+        start_time = time.time()
+        config = LOGIN_VALIDATION_CONFIG['providers'].get(provider)
+        if not config:
+            return {'logged_in': None, 'source': 'unknown', 'elapsed': 0.0}
+
+        def finish(logged_in: Optional[bool], source: str) -> Dict[str, Any]:
+            if logged_in is not None and source != 'cache':
+                self._save_cached(provider, logged_in, source)
+            elapsed = time.time() - start_time
+            logger.info(f"{provider} 登录状态: {logged_in}（来源: {source}，耗时 {elapsed * 1000:.0f} ms）")
+            return {'logged_in': logged_in, 'source': source, 'elapsed': elapsed}
+
+        cached = self._get_cached(provider)
+        if cached:
+            return finish(cached['logged_in'], 'cache')
+
+        try:
+            if self.user_data_dir:
+                verdict, token = self._read_profile(config)
+            else:
+                verdict, token = self._read_state_file(config)
+        except Exception as e:
+            logger.warning(f"离线检查登录状态失败: {e}")
+            verdict, token = None, None
+
+        if verdict is False and not token:
+            return finish(False, 'offline')
+        if config.get('token_key') and not token:
+            # 用户数据目录中未能读到 Token，无法离线判断也无法探测
+            return finish(None, 'unknown')
+        if verdict is True and not config.get('token_key'):
+            return finish(True, 'offline')
+
+        verdict = await self._probe_api(provider, config, token, playwright)
+        return finish(verdict, 'api' if verdict is not None else 'unknown')
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多模式字符串匹配 - Aho-Corasick 自动机，一次线性扫描统计所有模式的出现次数
+
+关键词和相关词汇编译成一个自动机（按查询和相关词集合缓存），每段文本只扫描一遍，
+代价与模式个数无关。每个模式的计数规则与 str.count 相同：从左到右、互不重叠，
+不同模式之间可以重叠（例如“科技术”中的“科技”和“技术”各计一次）。
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+# 模式较少时逐个调用 str.count（C 实现）比在 Python 中扫描自动机更快
+DIRECT_COUNT_THRESHOLD = 64
+
+
+class MultiPatternMatcher:
+    """Aho-Corasick 多模式计数器"""
+
+    def __init__(self, patterns: Iterable[str], ignore_case: bool = True):
+        """
+        编译模式集合
+
+        Args:
+            patterns: 模式列表（空串被忽略，重复的模式计数相同）
+            ignore_case: 是否忽略大小写（模式和文本都转小写）
+        """
+        self.ignore_case = ignore_case
+        self.patterns: List[str] = list(patterns)
+
+        # 相同的模式只编译一次，计数时再映射回原始位置
+        self.unique: Dict[str, int] = {}
+        self.pattern_ids: List[int] = []
+        for pattern in self.patterns:
+            key = pattern.lower() if ignore_case else pattern
+            self.pattern_ids.append(self.unique.setdefault(key, len(self.unique)) if key else -1)
+
+        self._build()
+
+    def _build(self):
+        # 字典树
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for pattern, pattern_id in self.unique.items():
+            state = 0
+            for ch in pattern:
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    next_state = goto[state][ch] = len(goto)
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(pattern_id)
+
+        # 按层计算失败指针，并把转移补全为确定自动机：
+        # 每个状态只保存通向非根状态的转移，不在字典中的字符回到根状态
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in range(len(goto) - 1)]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            inherited = delta[fail[state]]
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            transitions = dict(inherited)
+            for ch, next_state in goto[state].items():
+                fail[next_state] = inherited.get(ch, 0)
+                transitions[ch] = next_state
+                queue.append(next_state)
+            delta[state] = transitions
+
+        # 每个状态匹配到的 (模式编号, 模式长度)，没有匹配时为 None
+        lengths = {pattern_id: len(pattern) for pattern, pattern_id in self.unique.items()}
+        self.delta = delta
+        self.outputs = [tuple((pattern_id, lengths[pattern_id]) for pattern_id in ids) or None
+                        for ids in outputs]
+
+    def _count_unique(self, text: str) -> List[int]:
+        counts = [0] * len(self.unique)
+        # 每个模式下一次允许匹配的起始位置，保证同一模式的匹配互不重叠
+        next_start = [0] * len(self.unique)
+        delta = self.delta
+        outputs = self.outputs
+        state = 0
+        for position, ch in enumerate(text):
+            state = delta[state].get(ch, 0)
+            matched = outputs[state]
+            if matched is None:
+                continue
+            for pattern_id, length in matched:
+                start = position - length + 1
+                if start >= next_start[pattern_id]:
+                    counts[pattern_id] += 1
+                    next_start[pattern_id] = position + 1
+        return counts
+
+    def count(self, text: str) -> List[int]:
+        """返回每个模式（按传入顺序）在文本中的出现次数"""
+        if not self.unique or not text:
+            return [0] * len(self.patterns)
+        if self.ignore_case:
+            text = text.lower()
+        if len(self.unique) < DIRECT_COUNT_THRESHOLD:
+            counts = [text.count(pattern) for pattern in self.unique]
+        else:
+            counts = self._count_unique(text)
+        return [counts[pattern_id] if pattern_id >= 0 else 0 for pattern_id in self.pattern_ids]
+
+    def count_many(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        统计多段文本
+
+        Returns:
+            形状 (文本数, 模式数) 的计数数组
+        """
+        counts = np.zeros((len(texts), len(self.patterns)), dtype=np.int64)
+        for index, text in enumerate(texts):
+            counts[index] = self.count(text)
+        return counts
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近似重复检测 - MinHash 签名 + LSH 分桶
+
+转载的新闻、重复运行得到的几乎相同的 DeepSeek 回答，在分词、情绪分析和词云中都会被
+重复处理，还会让词频统计偏向被多次收录的内容。每段文本规范化后切成字符 n-gram，
+用 NumPy 一次算出 MinHash 签名（不需要分词）；签名按 LSH 分段放入哈希桶，
+查询时只和落在同一个桶里的候选比较，不需要和全部历史文本逐一比较。
+"""
+
+import logging
+import re
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import NEAR_DUPLICATE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+NORMALIZE_PATTERN = re.compile(r'[\W_]+')
+
+# 梅森素数 2^31 - 1：哈希值和系数都小于它，乘积不会超出 uint64
+MERSENNE_PRIME = (1 << 31) - 1
+SHINGLE_BASE = 1000003
+# 每次参与计算的 n-gram 数，限制 (签名长度 × n-gram 数) 临时矩阵的大小
+BLOCK_SIZE = 4096
+
+
+class NearDuplicateIndex:
+    """MinHash LSH 近似重复索引"""
+
+    def __init__(self, num_perm: Optional[int] = None, bands: Optional[int] = None,
+                 threshold: Optional[float] = None, shingle_size: Optional[int] = None,
+                 seed: Optional[int] = None):
+        """
+        初始化近似重复索引
+
+        Args:
+            num_perm: 签名长度（哈希函数个数）
+            bands: LSH 分段数，签名长度必须能被其整除
+            threshold: 估计的 Jaccard 相似度达到该值才视为重复
+            shingle_size: 字符 n-gram 的长度
+            seed: 哈希函数的随机种子（持久化的签名必须使用相同的种子）
+        """
+        self.num_perm = num_perm or NEAR_DUPLICATE_CONFIG['num_perm']
+        self.bands = bands or NEAR_DUPLICATE_CONFIG['bands']
+        self.threshold = threshold if threshold is not None else NEAR_DUPLICATE_CONFIG['threshold']
+        self.shingle_size = shingle_size or NEAR_DUPLICATE_CONFIG['shingle_size']
+        if self.num_perm % self.bands:
+            raise ValueError(f"签名长度 {self.num_perm} 不能被分段数 {self.bands} 整除")
+        self.rows = self.num_perm // self.bands
+
+        rng = np.random.RandomState(seed if seed is not None else NEAR_DUPLICATE_CONFIG['seed'])
+        self.a = rng.randint(1, MERSENNE_PRIME, size=self.num_perm).astype(np.uint64)
+        self.b = rng.randint(0, MERSENNE_PRIME, size=self.num_perm).astype(np.uint64)
+
+        self.keys: List[Hashable] = []
+        self.signatures: List[np.ndarray] = []
+        self.buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+
+        # 统计信息
+        self.queries = 0
+        self.candidates_checked = 0
+        self.duplicates_found = 0
+
+    def _shingles(self, text: str) -> np.ndarray:
+        """规范化文本（小写、去掉空白和标点）后的字符 n-gram 哈希（去重）"""
+        normalized = NORMALIZE_PATTERN.sub('', (text or '').lower())
+        if not normalized:
+            return np.empty(0, dtype=np.uint64)
+        codes = np.frombuffer(normalized.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        size = min(self.shingle_size, len(codes))
+        count = len(codes) - size + 1
+        hashes = np.zeros(count, dtype=np.uint64)
+        for k in range(size):
+            hashes = (hashes * np.uint64(SHINGLE_BASE) + codes[k:k + count]) % np.uint64(MERSENNE_PRIME)
+        return np.unique(hashes)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """文本的 MinHash 签名（uint32 数组）；没有可比较内容的文本返回 None"""
+        shingles = self._shingles(text)
+        if len(shingles) == 0:
+            return None
+        signature = np.full(self.num_perm, MERSENNE_PRIME, dtype=np.uint64)
+        for start in range(0, len(shingles), BLOCK_SIZE):
+            block = shingles[start:start + BLOCK_SIZE]
+            hashed = (self.a[:, None] * block[None, :] + self.b[:, None]) % np.uint64(MERSENNE_PRIME)
+            np.minimum(signature, hashed.min(axis=1), out=signature)
+        return signature.astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    @staticmethod
+    def similarity(first: np.ndarray, second: np.ndarray) -> float:
+        """两个签名估计的 Jaccard 相似度"""
+        return float(np.mean(first == second))
+
+    def add(self, key: Hashable, signature: np.ndarray):
+        """把签名加入索引"""
+        position = len(self.keys)
+        self.keys.append(key)
+        self.signatures.append(signature)
+        for buckets, band_key in zip(self.buckets, self._band_keys(signature)):
+            buckets.setdefault(band_key, []).append(position)
+
+    def query(self, signature: Optional[np.ndarray]) -> List[Tuple[Hashable, float]]:
+        """
+        查找近似重复
+
+        Returns:
+            [(key, 估计相似度), ...]，按相似度从高到低排列
+        """
+        if signature is None:
+            return []
+        self.queries += 1
+        candidates = set()
+        for buckets, band_key in zip(self.buckets, self._band_keys(signature)):
+            candidates.update(buckets.get(band_key, ()))
+        if not candidates:
+            return []
+
+        positions = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        self.candidates_checked += len(positions)
+        similarities = (np.stack([self.signatures[position] for position in positions]) == signature).mean(axis=1)
+        matched = similarities >= self.threshold
+        order = np.argsort(-similarities[matched], kind='stable')
+        return [(self.keys[position], float(similarity)) for position, similarity in
+                zip(positions[matched][order].tolist(), similarities[matched][order].tolist())]
+
+    def find(self, signature: Optional[np.ndarray]) -> Optional[Hashable]:
+        """返回最相似的已收录文本的 key，没有近似重复时返回 None"""
+        matches = self.query(signature)
+        if not matches:
+            return None
+        self.duplicates_found += 1
+        return matches[0][0]
+
+    def empty_copy(self) -> 'NearDuplicateIndex':
+        """参数和哈希函数相同的空索引（签名可以互相比较）"""
+        batch = NearDuplicateIndex(self.num_perm, self.bands, self.threshold, self.shingle_size)
+        batch.a, batch.b = self.a, self.b
+        return batch
+
+    def cluster(self, texts: Sequence[str]) -> List[int]:
+        """
+        对一批文本分组（不写入本索引）
+
+        Returns:
+            每段文本所属组的代表文本下标（每组第一次出现的文本代表自己）
+        """
+        batch = self.empty_copy()
+        representatives = []
+        for index, text in enumerate(texts):
+            signature = self.signature(text)
+            duplicate_of = batch.find(signature)
+            if duplicate_of is None:
+                representatives.append(index)
+                if signature is not None:
+                    batch.add(index, signature)
+            else:
+                representatives.append(duplicate_of)
+        self.queries += batch.queries
+        self.candidates_checked += batch.candidates_checked
+        self.duplicates_found += batch.duplicates_found
+        return representatives
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取近似重复检测统计"""
+        return {
+            'signatures': len(self.keys),
+            'queries': self.queries,
+            'candidates_checked': self.candidates_checked,
+            'duplicates_found': self.duplicates_found
+        }
+
+    def log_stats(self):
+        """输出近似重复检测统计"""
+        stats = self.get_stats()
+        logger.info(
+            f"近似重复检测统计: 索引 {stats['signatures']} 个签名，查询 {stats['queries']} 次，"
+            f"比较候选 {stats['candidates_checked']} 个，发现重复 {stats['duplicates_found']} 个"
+        )
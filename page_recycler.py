@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+页面内存回收 - 长期复用的聊天页面会不断累积 DOM 节点和 JS 堆
+
+每次任务结束后通过 CDP Performance.getMetrics 采样 JSHeapUsedSize、Nodes、
+LayoutCount，超过阈值或任务数上限时在同一上下文中打开新页面替换旧页面。
+回收在调用方的 finally 中执行，新页面的导航受任务剩余时间预算限制，预算耗尽时
+保持空白页（下一次任务会重新导航）；新页面交给浏览器监控器注册崩溃事件。
+"""
+
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import PAGE_RECYCLE_CONFIG
+from deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+# 新页面打开 recycle_url 的默认超时（毫秒）
+NAVIGATION_TIMEOUT = 30000
+
+
+class PageRecycler:
+    """按内存指标和任务数回收页面"""
+
+    def __init__(self, max_jobs: Optional[int] = None, recycle_url: Optional[str] = None):
+        """
+        初始化页面回收器
+
+        Args:
+            max_jobs: 单个页面最多执行的任务数
+            recycle_url: 替换后新页面打开的地址
+        """
+        self.enabled = PAGE_RECYCLE_CONFIG.get('enabled', True)
+        self.max_jobs = max_jobs or PAGE_RECYCLE_CONFIG['max_jobs']
+        self.recycle_url = recycle_url or PAGE_RECYCLE_CONFIG.get('recycle_url')
+        self.max_js_heap = PAGE_RECYCLE_CONFIG['max_js_heap_mb'] * 1024 * 1024
+        self.max_nodes = PAGE_RECYCLE_CONFIG['max_nodes']
+        self.max_layout_count = PAGE_RECYCLE_CONFIG['max_layout_count']
+
+        self.job_counts: Dict[Any, int] = {}
+        self.cdp_sessions: Dict[Any, Any] = {}
+
+        # 统计信息
+        self.recycled_pages = 0
+        self.recycle_reasons: Dict[str, int] = {}
+        self.peak_js_heap = 0
+
+    async def _get_cdp_session(self, page):
+        session = self.cdp_sessions.get(page)
+        if session is None:
+            session = await page.context.new_cdp_session(page)
+            await session.send("Performance.enable")
+            self.cdp_sessions[page] = session
+        return session
+
+    async def sample(self, page) -> Dict[str, float]:
+        """
+        采样页面性能指标
+
+        Returns:
+            {'JSHeapUsedSize': ..., 'Nodes': ..., 'LayoutCount': ...}，非 Chromium 或采样失败时为空
+        """
+        try:
+            session = await self._get_cdp_session(page)
+            response = await session.send("Performance.getMetrics")
+        except Exception as e:
+            logger.debug(f"采样页面指标失败: {e}")
+            return {}
+
+        metrics = {item['name']: item['value'] for item in response.get('metrics', [])}
+        self.peak_js_heap = max(self.peak_js_heap, metrics.get('JSHeapUsedSize', 0))
+        return metrics
+
+    def record_job(self, page):
+        """记录页面完成一次任务"""
+        self.job_counts[page] = self.job_counts.get(page, 0) + 1
+
+    async def check(self, page) -> Optional[str]:
+        """
+        判断页面是否需要回收
+
+        Returns:
+            回收原因，不需要回收时返回 None
+        """
+        jobs = self.job_counts.get(page, 0)
+        if jobs >= self.max_jobs:
+            return f"任务数: {jobs}"
+
+        metrics = await self.sample(page)
+        js_heap = metrics.get('JSHeapUsedSize', 0)
+        if js_heap > self.max_js_heap:
+            return f"JS 堆: {js_heap / 1024 / 1024:.0f} MB"
+        nodes = metrics.get('Nodes', 0)
+        if nodes > self.max_nodes:
+            return f"DOM 节点: {nodes:.0f}"
+        layout_count = metrics.get('LayoutCount', 0)
+        if layout_count > self.max_layout_count:
+            return f"布局次数: {layout_count:.0f}"
+        return None
+
+    def forget(self, page):
+        """丢弃页面的计数和 CDP 会话（会话随页面关闭自动断开）"""
+        self.job_counts.pop(page, None)
+        self.cdp_sessions.pop(page, None)
+
+    async def _navigate(self, page, deadline: Optional[Deadline]):
+        """新页面打开 recycle_url，超时不超过任务剩余预算"""
+        if not self.recycle_url:
+            return
+        if deadline is not None and deadline.expired():
+            logger.debug("任务时间预算已耗尽，新页面保持空白")
+            return
+        timeout = deadline.timeout_ms(NAVIGATION_TIMEOUT) if deadline is not None else NAVIGATION_TIMEOUT
+        try:
+            await page.goto(self.recycle_url, wait_until='domcontentloaded', timeout=timeout)
+        except Exception as e:
+            # 新页面已可用，导航失败不影响替换，下一次任务会重新导航
+            logger.debug(f"新页面打开 {self.recycle_url} 失败: {e}")
+
+    async def recycle(self, page, page_setup: Optional[Callable[[Any], Awaitable[Any]]] = None,
+                      deadline: Optional[Deadline] = None):
+        """
+        在同一上下文中打开新页面并关闭旧页面
+
+        Args:
+            page: 旧页面
+            page_setup: 新页面导航前执行的初始化（如安装静态资源缓存路由）
+            deadline: 任务时间预算，限制新页面导航的等待时间
+
+        Returns:
+            新页面，失败时返回旧页面
+        """
+        try:
+            new_page = await page.context.new_page()
+            if page_setup:
+                await page_setup(new_page)
+        except Exception as e:
+            logger.warning(f"替换页面失败，继续使用旧页面: {e}")
+            return page
+
+        await self._navigate(new_page, deadline)
+
+        self.forget(page)
+        try:
+            await page.close()
+        except Exception:
+            pass
+        self.recycled_pages += 1
+        return new_page
+
+    async def maybe_recycle(self, page, page_setup: Optional[Callable[[Any], Awaitable[Any]]] = None,
+                            deadline: Optional[Deadline] = None, supervisor=None):
+        """
+        记录一次任务并在需要时回收页面（任务结束后调用）
+
+        Args:
+            page: 当前页面
+            page_setup: 新页面导航前执行的初始化
+            deadline: 任务时间预算，限制新页面导航的等待时间
+            supervisor: 浏览器监控器（BrowserSupervisor），替换后在新页面上注册崩溃事件
+
+        Returns:
+            继续使用的页面（可能是新页面）
+        """
+        if not self.enabled or page is None or page.is_closed():
+            return page
+
+        self.record_job(page)
+        reason = await self.check(page)
+        if reason is None:
+            return page
+
+        logger.info(f"页面达到回收条件（{reason}），替换为新页面")
+        key = reason.split(':')[0]
+        self.recycle_reasons[key] = self.recycle_reasons.get(key, 0) + 1
+        new_page = await self.recycle(page, page_setup, deadline)
+        if supervisor is not None and new_page is not page:
+            supervisor.watch_page(new_page)
+        return new_page
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取回收统计"""
+        return {
+            'recycled_pages': self.recycled_pages,
+            'recycle_reasons': dict(self.recycle_reasons),
+            'peak_js_heap_mb': round(self.peak_js_heap / 1024 / 1024, 1)
+        }
+
+    def log_stats(self):
+        """输出回收统计"""
+        stats = self.get_stats()
+        logger.info(
+            f"页面回收统计: 回收 {stats['recycled_pages']} 个页面，原因 {stats['recycle_reasons']}，"
+            f"JS 堆峰值 {stats['peak_js_heap_mb']} MB"
+        )
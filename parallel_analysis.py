@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程文本分析 - 把分词、词频统计和情绪分析分块交给进程池
+
+工作进程启动时预先加载 jieba 词典和停用词；每个分块返回局部的词频 Counter、
+过滤后的词数和情绪分数列表，主进程按分块顺序归并。归并顺序与串行处理的文本顺序一致，
+所以词频（包括 most_common 的并列排序）和情绪均值与串行结果完全相同。
+"""
+
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import PARALLEL_ANALYSIS_CONFIG
+from segmentation_cache import SegmentationCache
+from sentiment_lexicon import SentimentAnalyzer
+
+logger = logging.getLogger(__name__)
+
+# 工作进程内的全局状态（由 _init_worker 初始化）
+_worker_segmenter: Optional[SegmentationCache] = None
+_worker_sentiment: Optional[SentimentAnalyzer] = None
+
+
+def _init_worker(stop_words: Iterable[str]):
+    """工作进程初始化：加载 jieba 词典、停用词和情感词典"""
+    global _worker_segmenter, _worker_sentiment
+    import jieba
+    jieba.setLogLevel(logging.WARNING)
+    jieba.initialize()
+
+    # 与主进程使用同一个磁盘缓存目录，主进程生成词云时可以直接读取分词结果
+    _worker_segmenter = SegmentationCache(stop_words)
+    _worker_sentiment = SentimentAnalyzer(_worker_segmenter)
+
+
+def _analyze_chunk(texts: List[str], with_sentiment: bool) -> Tuple[Counter, int, List[Tuple[float, float]]]:
+    """分析一个分块，返回 (词频, 过滤后的词数, [(极性, 主观性), ...])"""
+    word_counts: Counter = Counter()
+    total_words = 0
+    for text in texts:
+        words = _worker_segmenter.filtered(text)
+        word_counts.update(words)
+        total_words += len(words)
+    # 每段文本的分数与所在批次无关，分块打分与串行整批打分结果相同
+    scores = _worker_sentiment.score_batch(texts) if with_sentiment else []
+    return word_counts, total_words, scores
+
+
+class ParallelAnalyzer:
+    """进程池文本分析引擎"""
+
+    def __init__(self, stop_words: Iterable[str], workers: Optional[int] = None,
+                 chunk_size: Optional[int] = None):
+        """
+        初始化并行分析引擎
+
+        Args:
+            stop_words: 停用词（传给每个工作进程）
+            workers: 进程数，默认使用 CPU 核数
+            chunk_size: 每个分块的文本数，默认按进程数自动划分
+        """
+        self.stop_words = set(stop_words)
+        self.workers = workers or PARALLEL_ANALYSIS_CONFIG.get('workers') or os.cpu_count() or 1
+        self.chunk_size = chunk_size or PARALLEL_ANALYSIS_CONFIG.get('chunk_size')
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+        # 统计信息
+        self.texts_processed = 0
+        self.chunks_processed = 0
+        self.total_time = 0.0
+
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        # 进程池在多次分析之间复用，只在第一次使用时付出启动和加载词典的开销
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                initargs=(self.stop_words,))
+        return self.executor
+
+    def _chunks(self, texts: List[str]) -> List[List[str]]:
+        # 每个进程分到多个分块，文本长短不一时负载更均衡
+        size = self.chunk_size or max(1, -(-len(texts) // (self.workers * 4)))
+        return [texts[i:i + size] for i in range(0, len(texts), size)]
+
+    def analyze(self, texts: List[str], with_sentiment: bool = True) -> Tuple[Counter, int, List[Tuple[float, float]]]:
+        """
+        并行分词、统计词频和分析情绪
+
+        Returns:
+            (词频 Counter, 过滤后的总词数, 每段文本的 (极性, 主观性))
+        """
+        start_time = time.time()
+        chunks = self._chunks(texts)
+        partials = self._ensure_pool().map(_analyze_chunk, chunks, [with_sentiment] * len(chunks))
+
+        # 按分块顺序归并，保证与串行结果一致
+        word_counts: Counter = Counter()
+        total_words = 0
+        scores: List[Tuple[float, float]] = []
+        for chunk_counts, chunk_total, chunk_scores in partials:
+            word_counts.update(chunk_counts)
+            total_words += chunk_total
+            scores.extend(chunk_scores)
+
+        elapsed = time.time() - start_time
+        self.texts_processed += len(texts)
+        self.chunks_processed += len(chunks)
+        self.total_time += elapsed
+        logger.info(f"并行分析 {len(texts)} 段文本（{len(chunks)} 个分块，{self.workers} 个进程），耗时 {elapsed:.2f} 秒")
+        return word_counts, total_words, scores
+
+    def close(self):
+        """关闭进程池"""
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取并行分析统计"""
+        return {
+            'workers': self.workers,
+            'texts_processed': self.texts_processed,
+            'chunks_processed': self.chunks_processed,
+            'texts_per_second': round(self.texts_processed / self.total_time, 1) if self.total_time else None
+        }
+
+    def log_stats(self):
+        """输出并行分析统计"""
+        stats = self.get_stats()
+        logger.info(
+            f"并行分析统计: {stats['workers']} 个进程，处理 {stats['texts_processed']} 段文本 / "
+            f"{stats['chunks_processed']} 个分块，{stats['texts_per_second']} 段/秒"
+        )
@@ -11,8 +11,18 @@ import time
 from datetime import datetime
 from playwright.async_api import async_playwright
 import re
+import sys
 from urllib.parse import urlparse
 
+from config import STANDBY_CONFIG, DEADLINE_CONFIG, PROFILE_TEMPLATE_CONFIG
+from deadline import Deadline, DeadlineExceeded
+from login_validator import LoginValidator
+from page_recycler import PageRecycler
+from profile_manager import ProfileTemplateManager
+from sources_pipeline import SourceExtractionPipeline
+from resource_policy import ResourcePolicy
+from standby_tabs import StandbyTabPool
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -20,12 +30,29 @@ logger = logging.getLogger(__name__)
 class PersistentLoginExtractor:
     """持久登录状态的源提取器"""
     
-    def __init__(self):
+    def __init__(self, profile_manager=None, worker_id=None):
+        """
+        Args:
+            profile_manager: ProfileTemplateManager，提供时从模板克隆独立的用户数据目录，
+                             可以同时运行多个实例
+            worker_id: 工作进程标识（与 profile_manager 一起使用）
+        """
         self.browser = None
         self.page = None
         self.playwright = None
         self.login_state_file = "login_state.json"
-        self.user_data_dir = "./deepseek_user_data"  # 用户数据目录
+        self.profile_manager = profile_manager
+        self.worker_id = worker_id
+        if profile_manager and worker_id is not None:
+            self.user_data_dir = profile_manager.clone(worker_id)
+        else:
+            self.user_data_dir = "./deepseek_user_data"  # 用户数据目录
+        self.resource_policy = ResourcePolicy("DeepSeek")
+        self.standby_pool = None
+        self.deadline = Deadline()
+        self.login_validator = LoginValidator(user_data_dir=self.user_data_dir)
+        self.page_recycler = PageRecycler()
+        self.sources_pipeline = SourceExtractionPipeline()
 
     async def init_browser_with_persistent_login(self):
         """初始化浏览器并保持登录状态"""
@@ -43,12 +70,20 @@ class PersistentLoginExtractor:
                 ]
             )
             
+            # 拦截图片、字体和追踪请求
+            await self.resource_policy.apply(context)
+            
             # 获取第一个页面或创建新页面
             if context.pages:
                 self.page = context.pages[0]
             else:
                 self.page = await context.new_page()
             
+            # 后台预热聊天标签页，查询时直接取用
+            if STANDBY_CONFIG['enabled']:
+                self.standby_pool = StandbyTabPool(context)
+                self.standby_pool.start()
+            
             logger.info("浏览器初始化成功（使用持久化用户数据）")
             return True
             
@@ -59,13 +94,21 @@ class PersistentLoginExtractor:
     async def check_login_status(self):
         """检查登录状态"""
         try:
+            # 离线/API 快速验证通过时只需导航，不再等待和查找登录元素
+            verdict = await self.login_validator.validate("DeepSeek", playwright=self.playwright)
+            if verdict['logged_in']:
+                await self.page.goto("https://chat.deepseek.com", timeout=self.deadline.timeout_ms(30000),
+                                     wait_until='domcontentloaded')
+                logger.info("✅ 已登录状态（快速验证）")
+                return True
+            
             # 访问DeepSeek
-            await self.page.goto("https://chat.deepseek.com", timeout=30000)
-            await self.page.wait_for_timeout(3000)
+            await self.page.goto("https://chat.deepseek.com", timeout=self.deadline.timeout_ms(30000))
+            await self.deadline.sleep(self.page, 3000)
             
             # 检查是否已登录（查找聊天输入框）
             try:
-                chat_input = await self.page.wait_for_selector("textarea", timeout=5000)
+                chat_input = await self.page.wait_for_selector("textarea", timeout=self.deadline.timeout_ms(5000))
                 if chat_input:
                     logger.info("✅ 已登录状态")
                     return True
@@ -93,6 +136,8 @@ class PersistentLoginExtractor:
             logger.info("✅ 可能已登录")
             return True
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"检查登录状态失败: {e}")
             return False
@@ -113,6 +158,10 @@ class PersistentLoginExtractor:
         # 等待用户确认
         input("按回车键继续（确保已完成登录）...")
         
+        # 人工登录耗时不计入任务时间预算
+        self.deadline = Deadline(self.deadline.budget)
+        self.login_validator.invalidate("DeepSeek")
+        
         # 再次检查登录状态
         if await self.check_login_status():
             logger.info("✅ 登录确认成功")
@@ -124,13 +173,21 @@ class PersistentLoginExtractor:
     async def close_browser(self):
         """关闭浏览器"""
         try:
+            if self.standby_pool:
+                await self.standby_pool.close()
             if self.page and self.page.context:
                 await self.page.context.close()
             if self.playwright:
                 await self.playwright.stop()
+            self.page_recycler.log_stats()
+            self.resource_policy.log_stats()
             logger.info("浏览器已关闭")
         except Exception as e:
             logger.error(f"关闭浏览器失败: {e}")
+        finally:
+            # 浏览器关闭后把刷新过的登录数据同步回模板，并清理克隆目录
+            if self.profile_manager and self.worker_id is not None:
+                await asyncio.to_thread(self.profile_manager.release, self.worker_id)
 
     def is_valuable_article_url(self, url):
         """判断是否为有价值的文章页面URL"""
@@ -222,7 +279,7 @@ class PersistentLoginExtractor:
         stable_count = 0
         last_content = ""
         
-        while time.time() - start_time < 45:  # 增加等待时间
+        while time.time() - start_time < 45 and not self.deadline.expired():  # 增加等待时间
             try:
                 elements = await self.page.query_selector_all(".ds-markdown.ds-markdown--block")
                 if elements:
@@ -236,11 +293,12 @@ class PersistentLoginExtractor:
                         stable_count = 0
                         last_content = current_content
                 
-                await self.page.wait_for_timeout(2000)
+                await self.deadline.sleep(self.page, 2000)
             except:
                 break
         
-        await self.page.wait_for_timeout(5000)
+        if not self.deadline.expired():
+            await self.deadline.sleep(self.page, 5000)
 
     async def find_sources_info(self):
         """查找源信息"""
@@ -272,78 +330,46 @@ class PersistentLoginExtractor:
             logger.error(f"查找源信息失败: {e}")
             return {'count': 0, 'element': None, 'text': ''}
 
-    async def extract_article_links(self):
-        """提取文章链接"""
-        references = []
+    async def extract_article_links(self, expected=0):
+        """
+        提取文章链接（由 SourceExtractionPipeline 按历史表现选择提取策略）
         
+        Args:
+            expected: 页面显示的搜索网页数
+        """
         try:
             logger.info("开始提取文章链接...")
+            harvest = await self.sources_pipeline.harvest(self.page, self.deadline, expected)
+            logger.info(f"提取策略: {harvest['strategy'] or '未达到阈值'}，"
+                        f"尝试 {[a['strategy'] for a in harvest['attempts']]}")
             
-            # 等待页面完全加载
-            await self.page.wait_for_timeout(8000)
-            
-            # 多次滚动加载内容
-            for i in range(6):
-                await self.page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                await self.page.wait_for_timeout(1500)
-            
-            # 查找所有链接
-            all_links = await self.page.query_selector_all("a[href]")
-            logger.info(f"找到 {len(all_links)} 个链接")
-            
-            # 分析链接
-            for i, link in enumerate(all_links):
-                try:
-                    href = await link.get_attribute('href')
-                    if not href:
-                        continue
-                    
-                    # 处理相对链接
-                    if href.startswith('/'):
-                        href = 'https://chat.deepseek.com' + href
-                    elif not href.startswith('http'):
-                        continue
-                    
-                    text = await link.inner_text()
-                    title = await link.get_attribute('title') or ''
-                    
-                    # 检查是否为有价值的文章URL
-                    if self.is_valuable_article_url(href):
-                        score = self.calculate_article_score(href, text, title)
-                        
-                        if score > 5.0:
-                            references.append({
-                                'url': href,
-                                'text': text.strip()[:120],
-                                'title': title.strip()[:120],
-                                'score': score,
-                                'domain': urlparse(href).netloc
-                            })
-                            
-                            logger.info(f"发现文章链接: {href[:60]}... (得分: {score:.1f})")
-                    
-                except Exception as e:
+            references = []
+            for ref in harvest['references']:
+                # 检查是否为有价值的文章URL
+                if not self.is_valuable_article_url(ref['url']):
                     continue
+                score = self.calculate_article_score(ref['url'], ref['text'], ref['title'])
+                if score > 5.0:
+                    references.append({**ref, 'score': score})
+                    logger.info(f"发现文章链接: {ref['url'][:60]}... (得分: {score:.1f})")
             
-            # 排序和去重
             references.sort(key=lambda x: x['score'], reverse=True)
-            
-            seen_urls = set()
-            unique_refs = []
-            for ref in references:
-                if ref['url'] not in seen_urls:
-                    seen_urls.add(ref['url'])
-                    unique_refs.append(ref)
-            
-            logger.info(f"提取到 {len(unique_refs)} 个唯一文章链接")
-            return unique_refs[:15]
+            logger.info(f"提取到 {len(references)} 个唯一文章链接")
+            return references[:15]
             
         except Exception as e:
             logger.error(f"提取文章链接失败: {e}")
             return []
 
-    async def run_extraction_with_persistent_login(self, query):
-        """运行带持久登录的提取流程"""
+    async def run_extraction_with_persistent_login(self, query, budget=None):
+        """
+        运行带持久登录的提取流程
+        
+        Args:
+            query: 查询内容
+            budget: 任务时间预算（秒），默认使用 DEADLINE_CONFIG['sources_job_budget']；
+                    超时后返回已获取的部分结果
+        """
         result = {
             'query': query,
             'timestamp': datetime.now().isoformat(),
@@ -355,19 +381,35 @@ class PersistentLoginExtractor:
             'steps': []
         }
         
+        cold_page = self.page
+        standby_page = None
+        chat_input = None
+        self.deadline = Deadline(budget if budget is not None else DEADLINE_CONFIG['sources_job_budget'])
+        
         try:
-            # 1. 检查登录状态
+            # 1. 检查登录状态（热备标签页已找到输入框，说明处于登录状态）
             logger.info("1. 检查登录状态...")
-            if not await self.check_login_status():
-                result['login_required'] = True
-                if not await self.manual_login_prompt():
-                    result['error'] = "登录失败"
-                    return result
+            if self.standby_pool:
+                standby = await self.standby_pool.acquire(timeout=min(60, self.deadline.remaining()))
+                if standby:
+                    standby_page, chat_input = standby
+                    self.page = standby_page
+                    logger.info("使用热备标签页")
+            
+            if not chat_input:
+                if not await self.check_login_status():
+                    result['login_required'] = True
+                    if not await self.manual_login_prompt():
+                        result['error'] = "登录失败"
+                        return result
             result['steps'].append('确认登录状态')
             
             # 2. 发送查询
             logger.info("2. 发送查询...")
-            chat_input = await self.page.wait_for_selector("textarea", timeout=10000)
+            if not chat_input:
+                chat_input = await self.page.wait_for_selector("textarea", timeout=self.deadline.timeout_ms(10000))
+            # 发送前开始记录接口响应（network 策略使用）
+            await self.sources_pipeline.prepare(self.page)
             await chat_input.fill(query)
             await chat_input.press('Enter')
             result['steps'].append('发送查询')
@@ -388,7 +430,7 @@ class PersistentLoginExtractor:
                 logger.info("5. 点击源链接...")
                 try:
                     await sources_info['element'].click()
-                    await self.page.wait_for_timeout(5000)
+                    await self.deadline.sleep(self.page, 5000)
                     
                     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                     await self.page.screenshot(path=f"persistent_click_{timestamp}.png")
@@ -398,16 +440,27 @@ class PersistentLoginExtractor:
             
             # 6. 提取文章链接
             logger.info("6. 提取文章链接...")
-            article_refs = await self.extract_article_links()
+            article_refs = await self.extract_article_links(sources_info['count'])
             result['article_references'] = article_refs
             result['steps'].append('提取文章链接')
             
             result['success'] = True
             logger.info(f"提取完成: {result['sources_count']} 个源，{len(article_refs)} 个文章链接")
             
+        except DeadlineExceeded as e:
+            logger.warning(f"{e}，返回已获取的部分结果")
+            result['error'] = str(e)
+            result['deadline_exceeded'] = True
         except Exception as e:
             logger.error(f"提取过程出错: {e}")
             result['error'] = str(e)
+        finally:
+            if standby_page and self.standby_pool:
+                self.page = cold_page
+                self.standby_pool.release(standby_page)
+            else:
+                # 长期复用的 context.pages[0] 内存超限后替换为新页面
+                self.page = await self.page_recycler.maybe_recycle(self.page, deadline=self.deadline)
         
         return result
 
@@ -452,12 +505,68 @@ class PersistentLoginExtractor:
         return filename
 
 
+async def run_workers(queries, workers=None, profile_manager=None):
+    """
+    多个浏览器并行提取，每个工作进程从模板克隆一份用户数据目录，结束后同步登录数据并删除
+    
+    Args:
+        queries: 查询列表
+        workers: 并行浏览器数量，默认使用 PROFILE_TEMPLATE_CONFIG['workers']
+        profile_manager: ProfileTemplateManager，默认按配置创建
+    
+    Returns:
+        与 queries 顺序一致的结果列表
+    """
+    profile_manager = profile_manager or ProfileTemplateManager()
+    # 所有工作进程克隆之前先生成模板（来源目录此时不能被浏览器占用）
+    await asyncio.to_thread(profile_manager.ensure_template)
+    
+    workers = max(1, min(workers or PROFILE_TEMPLATE_CONFIG['workers'], len(queries)))
+    pending = asyncio.Queue()
+    for index, query in enumerate(queries):
+        pending.put_nowait((index, query))
+    results = [None] * len(queries)
+    
+    async def worker(worker_id):
+        extractor = await asyncio.to_thread(PersistentLoginExtractor, profile_manager, worker_id)
+        try:
+            if not await extractor.init_browser_with_persistent_login():
+                logger.error(f"工作进程 {worker_id} 浏览器初始化失败")
+                return
+            while not pending.empty():
+                index, query = pending.get_nowait()
+                logger.info(f"工作进程 {worker_id} 执行查询: {query}")
+                results[index] = await extractor.run_extraction_with_persistent_login(query)
+        finally:
+            # close_browser 在浏览器关闭后释放克隆目录
+            await extractor.close_browser()
+    
+    outcomes = await asyncio.gather(*(worker(worker_id) for worker_id in range(workers)), return_exceptions=True)
+    for worker_id, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            logger.error(f"工作进程 {worker_id} 出错: {outcome}")
+    logger.info(f"用户数据克隆统计: {profile_manager.get_stats()}")
+    
+    # 所有工作进程都失败时未执行的查询
+    return [result or {'query': query, 'success': False, 'error': '没有可用的工作进程',
+                       'article_references': []}
+            for query, result in zip(queries, results)]
+
+
 async def main():
     """主函数"""
     print("🔐 持久登录版DeepSeek源提取器")
     print("自动保持登录状态，避免重复登录")
     print("="*80)
     
+    # 命令行传入多个查询时，按 PROFILE_TEMPLATE_CONFIG['workers'] 并行提取
+    queries = sys.argv[1:]
+    if len(queries) > 1:
+        for result in await run_workers(queries):
+            print(f"{'✅' if result['success'] else '❌'} {result['query']}: "
+                  f"{len(result['article_references'])} 个文章链接 {result.get('error', '')}")
+        return
+    
     extractor = PersistentLoginExtractor()
     
     try:
@@ -465,7 +574,7 @@ async def main():
             print("❌ 浏览器初始化失败")
             return
         
-        query = "小鸡科技的最新信息，包括公司背景、业务范围、最新动态"
+        query = queries[0] if queries else "小鸡科技的最新信息，包括公司背景、业务范围、最新动态"
         print(f"🎯 执行查询: {query}")
         
         result = await extractor.run_extraction_with_persistent_login(query)
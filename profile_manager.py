@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+浏览器用户数据模板管理 - 支持多个持久化上下文并行运行
+
+Chromium 不允许多个进程共用同一个 user_data_dir。这里从已登录的用户数据目录
+生成一个剔除了缓存的精简模板，再为每个工作进程克隆一份：
+- 支持 reflink 的文件系统（Btrfs、XFS 等）使用写时复制，不占额外空间
+- LevelDB 的 SSTable（*.ldb）写入后不再修改，直接硬链接共享
+- 其余文件普通复制
+工作进程中刷新过的登录数据会同步回模板，后续克隆直接使用。
+"""
+
+import fnmatch
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional
+
+from config import PROFILE_TEMPLATE_CONFIG
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Linux 下 FICLONE ioctl，用于写时复制克隆文件
+FICLONE = 0x40049409
+TEMPLATE_META = ".template.json"
+CLONE_META = ".clone.json"
+
+
+class ProfileTemplateManager:
+    """用户数据模板管理器"""
+
+    def __init__(self, source_dir: Optional[str] = None, template_dir: Optional[str] = None,
+                 workers_dir: Optional[str] = None):
+        """
+        初始化模板管理器
+
+        Args:
+            source_dir: 已登录的用户数据目录（生成模板的来源）
+            template_dir: 精简模板目录
+            workers_dir: 工作进程用户数据目录的父目录
+        """
+        self.source_dir = source_dir or PROFILE_TEMPLATE_CONFIG['source_dir']
+        self.template_dir = template_dir or PROFILE_TEMPLATE_CONFIG['template_dir']
+        self.workers_dir = workers_dir or PROFILE_TEMPLATE_CONFIG['workers_dir']
+        self.strip_patterns: List[str] = PROFILE_TEMPLATE_CONFIG['strip_patterns']
+        self.auth_paths: List[str] = PROFILE_TEMPLATE_CONFIG['auth_paths']
+        self.hardlink_patterns: List[str] = PROFILE_TEMPLATE_CONFIG['hardlink_patterns']
+
+        # 统计信息
+        self.reflinked_files = 0
+        self.hardlinked_files = 0
+        self.copied_files = 0
+        self.synced_back = 0
+
+    # ---------- 文件复制 ----------
+
+    def _is_stripped(self, name: str) -> bool:
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.strip_patterns)
+
+    def _ignore(self, directory: str, names: List[str]) -> List[str]:
+        return [name for name in names if self._is_stripped(name)]
+
+    @staticmethod
+    def _reflink(src: str, dst: str) -> bool:
+        """尝试写时复制克隆，文件系统不支持时返回 False"""
+        if fcntl is None:
+            return False
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            shutil.copystat(src, dst)
+            return True
+        except OSError:
+            try:
+                os.remove(dst)
+            except OSError:
+                pass
+            return False
+
+    def _clone_file(self, src: str, dst: str):
+        """copytree 的 copy_function：硬链接 > 写时复制 > 普通复制"""
+        name = os.path.basename(src)
+        if any(fnmatch.fnmatch(name, pattern) for pattern in self.hardlink_patterns):
+            try:
+                os.link(src, dst)
+                self.hardlinked_files += 1
+                return dst
+            except OSError:
+                pass
+
+        if self._reflink(src, dst):
+            self.reflinked_files += 1
+            return dst
+
+        shutil.copy2(src, dst)
+        self.copied_files += 1
+        return dst
+
+    @staticmethod
+    def _copy_path(src: str, dst: str):
+        """独立复制单个文件或目录（同步回模板时使用，不与工作目录共享 inode）"""
+        if os.path.isdir(src):
+            shutil.copytree(src, dst)
+        else:
+            shutil.copy2(src, dst)
+
+    @staticmethod
+    def _remove_path(path: str):
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.lexists(path):
+            os.remove(path)
+
+    def _replace_path(self, src: str, dst: str):
+        """先复制到临时位置再替换，避免模板处于半写入状态"""
+        tmp_path = f"{dst}.{os.getpid()}.tmp"
+        old_path = f"{dst}.{os.getpid()}.old"
+        self._remove_path(tmp_path)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        self._copy_path(src, tmp_path)
+
+        # 文件可直接原子替换，目录需先移走旧目录
+        if os.path.isdir(dst):
+            os.replace(dst, old_path)
+        os.replace(tmp_path, dst)
+        self._remove_path(old_path)
+
+    # ---------- 锁 ----------
+
+    def _lock_path(self) -> str:
+        return self.template_dir.rstrip('/\\') + '.lock'
+
+    def _acquire_lock(self, timeout: float = 60) -> bool:
+        """基于 O_EXCL 的跨进程锁，超时未释放视为残留锁"""
+        lock_path = self._lock_path()
+        os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+        start_time = time.time()
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode('utf-8'))
+                os.close(fd)
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > timeout:
+                        logger.warning("发现残留的模板锁，已移除")
+                        os.remove(lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.time() - start_time > timeout:
+                    return False
+                time.sleep(0.2)
+
+    def _release_lock(self):
+        try:
+            os.remove(self._lock_path())
+        except OSError:
+            pass
+
+    # ---------- 元数据 ----------
+
+    @staticmethod
+    def _read_meta(path: str) -> Dict[str, Any]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_meta(path: str, meta: Dict[str, Any]):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    def _worker_dir(self, worker_id: str) -> str:
+        return os.path.join(self.workers_dir, str(worker_id))
+
+    # ---------- 对外接口 ----------
+
+    def has_template(self) -> bool:
+        return os.path.exists(os.path.join(self.template_dir, TEMPLATE_META))
+
+    def snapshot(self, source_dir: Optional[str] = None) -> str:
+        """
+        从已登录的用户数据目录生成精简模板（需在该目录未被浏览器占用时调用）
+
+        Args:
+            source_dir: 来源目录，默认使用配置中的 source_dir
+
+        Returns:
+            模板目录
+        """
+        source_dir = source_dir or self.source_dir
+        if not os.path.isdir(source_dir):
+            raise FileNotFoundError(f"用户数据目录不存在: {source_dir}")
+
+        if not self._acquire_lock():
+            raise TimeoutError("等待模板锁超时")
+        try:
+            tmp_dir = f"{self.template_dir.rstrip('/')}.{os.getpid()}.tmp"
+            self._remove_path(tmp_dir)
+            # 模板与来源目录不共享 inode，统一普通复制
+            shutil.copytree(source_dir, tmp_dir, ignore=self._ignore)
+            now = time.time()
+            self._write_meta(os.path.join(tmp_dir, TEMPLATE_META),
+                             {'source': os.path.abspath(source_dir), 'created_at': now, 'updated_at': now})
+
+            old_dir = f"{self.template_dir.rstrip('/')}.{os.getpid()}.old"
+            if os.path.exists(self.template_dir):
+                os.replace(self.template_dir, old_dir)
+            os.replace(tmp_dir, self.template_dir)
+            self._remove_path(old_dir)
+        finally:
+            self._release_lock()
+
+        size = sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, files in os.walk(self.template_dir) for name in files)
+        logger.info(f"已生成用户数据模板: {self.template_dir}（{size / 1024 / 1024:.1f} MB）")
+        return self.template_dir
+
+    def ensure_template(self) -> str:
+        """模板不存在时从来源目录生成"""
+        if not self.has_template():
+            self.snapshot()
+        return self.template_dir
+
+    def clone(self, worker_id: str) -> str:
+        """
+        为工作进程克隆一份用户数据目录
+
+        Args:
+            worker_id: 工作进程标识
+
+        Returns:
+            可传给 launch_persistent_context 的 user_data_dir
+        """
+        self.ensure_template()
+        worker_dir = self._worker_dir(worker_id)
+        self._remove_path(worker_dir)
+        os.makedirs(self.workers_dir, exist_ok=True)
+
+        start_time = time.time()
+        if not self._acquire_lock():
+            raise TimeoutError("等待模板锁超时")
+        try:
+            shutil.copytree(self.template_dir, worker_dir, copy_function=self._clone_file,
+                            ignore=lambda d, names: [n for n in names if n == TEMPLATE_META])
+        finally:
+            self._release_lock()
+
+        self._write_meta(os.path.join(worker_dir, CLONE_META),
+                         {'worker_id': str(worker_id), 'cloned_at': time.time()})
+        logger.info(f"已克隆用户数据目录: {worker_dir}（{time.time() - start_time:.2f} 秒）")
+        return worker_dir
+
+    def _auth_changed_since(self, worker_dir: str, since: float) -> List[str]:
+        """返回克隆后被修改过的登录相关路径"""
+        changed = []
+        for rel_path in self.auth_paths:
+            path = os.path.join(worker_dir, rel_path)
+            if not os.path.exists(path):
+                continue
+            if os.path.isdir(path):
+                mtimes = [os.path.getmtime(os.path.join(root, name))
+                          for root, _, files in os.walk(path) for name in files]
+                latest = max(mtimes, default=os.path.getmtime(path))
+            else:
+                latest = os.path.getmtime(path)
+            if latest > since:
+                changed.append(rel_path)
+        return changed
+
+    def sync_back(self, worker_id: str) -> bool:
+        """
+        将工作进程中刷新过的登录数据同步回模板（需在浏览器关闭后调用）
+
+        Args:
+            worker_id: 工作进程标识
+
+        Returns:
+            是否有数据同步回模板
+        """
+        worker_dir = self._worker_dir(worker_id)
+        clone_meta = self._read_meta(os.path.join(worker_dir, CLONE_META))
+        if not clone_meta:
+            return False
+
+        changed = self._auth_changed_since(worker_dir, clone_meta.get('cloned_at', 0))
+        if not changed:
+            return False
+
+        if not self._acquire_lock():
+            logger.warning("等待模板锁超时，跳过登录数据同步")
+            return False
+        try:
+            meta_path = os.path.join(self.template_dir, TEMPLATE_META)
+            template_meta = self._read_meta(meta_path)
+            # 其他工作进程在本进程克隆之后已同步过更新的数据
+            if template_meta.get('updated_at', 0) > clone_meta.get('cloned_at', 0):
+                changed = self._auth_changed_since(worker_dir, template_meta['updated_at'])
+            for rel_path in changed:
+                self._replace_path(os.path.join(worker_dir, rel_path), os.path.join(self.template_dir, rel_path))
+            template_meta['updated_at'] = time.time()
+            self._write_meta(meta_path, template_meta)
+        finally:
+            self._release_lock()
+
+        if changed:
+            self.synced_back += 1
+            logger.info(f"已将工作进程 {worker_id} 的登录数据同步回模板: {', '.join(changed)}")
+        return bool(changed)
+
+    def release(self, worker_id: str, sync: bool = True):
+        """同步登录数据（可选）并删除工作进程的用户数据目录"""
+        if sync:
+            try:
+                self.sync_back(worker_id)
+            except Exception as e:
+                logger.warning(f"同步登录数据失败: {e}")
+        self._remove_path(self._worker_dir(worker_id))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取克隆统计"""
+        return {
+            'reflinked_files': self.reflinked_files,
+            'hardlinked_files': self.hardlinked_files,
+            'copied_files': self.copied_files,
+            'synced_back': self.synced_back
+        }
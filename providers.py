@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多提供方并发查询 - DeepSeek、Kimi、ChatGPT 同时回答同一个关键词
+
+所有提供方实现同一个异步查询接口，共用一个浏览器；每个提供方按 SESSION_POOL_CONFIG
+中的账号建立会话池，同一登录状态文件的账号共用一个上下文，每个会话各自打开页面。
+单个关键词的耗时取决于最慢的提供方而不是所有提供方之和。
+结果可直接转换为 DataAnalyzer 的输入格式。
+"""
+
+import asyncio
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from playwright.async_api import async_playwright
+
+from asset_cache import AssetCache
+from config import PROVIDERS_CONFIG, RESOURCE_POLICY_CONFIG
+from deadline import Deadline, DeadlineExceeded
+from resource_policy import ResourcePolicy
+from session_pool import Session, SessionPool, detect_rate_limit
+
+logger = logging.getLogger(__name__)
+
+
+class ChatProvider(ABC):
+    """聊天提供方接口"""
+
+    name = "base"
+    url = ""
+
+    @abstractmethod
+    async def start(self, context):
+        """在共享的浏览器上下文中准备页面"""
+
+    @abstractmethod
+    async def query(self, query: str, deadline: Deadline) -> Dict[str, Any]:
+        """
+        查询一次
+
+        Returns:
+            与 DeepSeekWebSearch.chat_with_web_search 相同格式的结果字典
+        """
+
+    async def close(self):
+        """释放页面"""
+
+    def _new_result(self, query: str) -> Dict[str, Any]:
+        return {
+            'website': self.name,
+            'website_url': self.url,
+            'query': query,
+            'title': f'{self.name} 回复',
+            'link': self.url,
+            'content': '',
+            'image': '',
+            'timestamp': datetime.now().isoformat(),
+            'rank': 1,
+            'type': 'chat_response',
+            'success': False,
+            'error': ''
+        }
+
+
+class BrowserChatProvider(ChatProvider):
+    """按 PROVIDERS_CONFIG 中的选择器操作网页版聊天"""
+
+    def __init__(self, name: str, asset_cache: Optional[AssetCache] = None):
+        config = PROVIDERS_CONFIG['providers'][name]
+        self.name = name
+        self.url = config['url']
+        self.input_selector = ", ".join(config['input_selectors'])
+        self.response_selectors: List[str] = config['response_selectors']
+        self.asset_cache = asset_cache
+        self.page = None
+
+    async def start(self, context):
+        self.page = await context.new_page()
+        self.page.set_default_timeout(30000)
+        if self.asset_cache:
+            await self.asset_cache.apply(self.page)
+
+    async def _latest_response(self) -> str:
+        for selector in self.response_selectors:
+            try:
+                elements = await self.page.query_selector_all(selector)
+                if elements:
+                    text = (await elements[-1].inner_text()).strip()
+                    if len(text) > 10:
+                        return text
+            except Exception:
+                continue
+        return ''
+
+    async def _wait_for_response(self, deadline: Deadline) -> str:
+        """轮询回复文本，保持不变超过 stable_time 视为生成完成"""
+        await deadline.sleep(self.page, PROVIDERS_CONFIG['min_wait'] * 1000)
+        text, stable_since = '', time.time()
+        while True:
+            current = await self._latest_response()
+            if current != text:
+                text, stable_since = current, time.time()
+            elif text and time.time() - stable_since >= PROVIDERS_CONFIG['stable_time']:
+                return text
+            await deadline.sleep(self.page, PROVIDERS_CONFIG['poll_interval'] * 1000)
+
+    async def query(self, query: str, deadline: Deadline) -> Dict[str, Any]:
+        result = self._new_result(query)
+        if not self.page:
+            result['error'] = "浏览器页面未初始化"
+            return result
+
+        start_time = time.time()
+        try:
+            await self.page.goto(self.url, timeout=deadline.timeout_ms(30000), wait_until='domcontentloaded')
+            title = await self.page.title()
+            if "login" in title.lower() or "sign in" in title.lower():
+                result['error'] = "需要登录，请先运行 login_manager.py 进行手动登录"
+                return result
+
+            chat_input = await self.page.wait_for_selector(self.input_selector, timeout=deadline.timeout_ms(15000))
+            await chat_input.fill(PROVIDERS_CONFIG['prompt'].format(query=query))
+            await chat_input.press('Enter')
+            logger.info(f"{self.name} 已发送消息，等待回复...")
+
+            text = await self._wait_for_response(deadline)
+            if len(text) < 200 and detect_rate_limit(text):
+                result['error'] = text
+                result['rate_limited'] = True
+            else:
+                result['content'] = text
+                result['success'] = True
+
+        except DeadlineExceeded as e:
+            result['error'] = str(e)
+            result['deadline_exceeded'] = True
+            result['content'] = await self._latest_response()
+            result['partial'] = bool(result['content'])
+        except Exception as e:
+            result['error'] = str(e)
+            logger.error(f"{self.name} 查询出错: {e}")
+
+        result['latency'] = round(time.time() - start_time, 3)
+        return result
+
+    async def close(self):
+        if self.page:
+            try:
+                await self.page.close()
+            except Exception:
+                pass
+            self.page = None
+
+
+def create_providers(names: Optional[List[str]] = None, asset_cache: Optional[AssetCache] = None) -> List[ChatProvider]:
+    """按名称创建提供方，默认使用 PROVIDERS_CONFIG['enabled']"""
+    names = names or PROVIDERS_CONFIG['enabled']
+    return [BrowserChatProvider(name, asset_cache) for name in names]
+
+
+class ProviderFanOut:
+    """并发查询所有启用的提供方"""
+
+    def __init__(self, providers: Optional[List[str]] = None, state_file: Optional[str] = None):
+        """
+        初始化并发查询
+
+        Args:
+            providers: 提供方名称列表，默认使用 PROVIDERS_CONFIG['enabled']
+            state_file: 登录状态文件（包含各提供方的登录信息），用于 SESSION_POOL_CONFIG 中没有配置账号的提供方
+        """
+        self.provider_names = providers or PROVIDERS_CONFIG['enabled']
+        self.state_file = state_file or PROVIDERS_CONFIG['storage_state']
+        self.asset_cache = AssetCache()
+        # 同一上下文访问多个提供方，合并各自的白名单
+        overrides: Dict[str, Any] = {}
+        for name in self.provider_names:
+            for key, value in RESOURCE_POLICY_CONFIG.get(name, {}).items():
+                overrides[key] = overrides.get(key, []) + value if isinstance(value, list) else value
+        self.resource_policy = ResourcePolicy(overrides=overrides)
+        self.pools: Dict[str, SessionPool] = {name: self._create_pool(name) for name in self.provider_names}
+        # (提供方, 会话) -> 空闲页面，数量等于会话的并发上限
+        self.providers: Dict[Tuple[str, str], asyncio.Queue] = {}
+        self.playwright = None
+        self.browser = None
+        # 登录状态文件 -> 浏览器上下文
+        self.contexts: Dict[Optional[str], Any] = {}
+        self._restart_lock: Optional[asyncio.Lock] = None
+
+    def _create_pool(self, name: str) -> SessionPool:
+        """SESSION_POOL_CONFIG 中没有配置账号的提供方使用 state_file 作为唯一会话"""
+        pool = SessionPool.from_config(name)
+        if not pool.sessions:
+            pool.register('default', storage_state=self.state_file if os.path.exists(self.state_file) else None)
+        return pool
+
+    async def _context(self, storage_state: Optional[str]):
+        """按登录状态文件复用上下文"""
+        if storage_state not in self.contexts:
+            kwargs = {
+                'user_agent': "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+                'viewport': {'width': 1280, 'height': 720},
+            }
+            if storage_state:
+                kwargs['storage_state'] = storage_state
+            else:
+                logger.warning("未找到登录状态文件，将使用无登录状态")
+            context = await self.browser.new_context(**kwargs)
+            await self.resource_policy.apply(context)
+            self.contexts[storage_state] = context
+        return self.contexts[storage_state]
+
+    async def _start_session(self, name: str, session: Session):
+        context = await self._context(session.storage_state)
+        idle: asyncio.Queue = asyncio.Queue()
+        for provider in create_providers([name] * session.max_concurrency, self.asset_cache):
+            await provider.start(context)
+            idle.put_nowait(provider)
+        self.providers[(name, session.name)] = idle
+
+    async def init_browser(self) -> bool:
+        """启动浏览器并为每个提供方的每个会话打开页面"""
+        try:
+            self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.launch(
+                headless=False,
+                args=['--no-sandbox', '--disable-dev-shm-usage'],
+                timeout=60000,
+            )
+            for name, pool in self.pools.items():
+                for session in pool.sessions:
+                    await self._start_session(name, session)
+            logger.info(f"浏览器初始化成功，提供方: {', '.join(self.provider_names)}，"
+                        f"会话数: {sum(len(pool.sessions) for pool in self.pools.values())}")
+            return True
+
+        except Exception as e:
+            logger.error(f"浏览器初始化失败: {e}")
+            if self.playwright:
+                await self.playwright.stop()
+            return False
+
+    async def close_browser(self):
+        """关闭浏览器"""
+        try:
+            for idle in self.providers.values():
+                while not idle.empty():
+                    await idle.get_nowait().close()
+            self.providers = {}
+            self.contexts = {}
+            if self.browser:
+                await self.browser.close()
+            if self.playwright:
+                await self.playwright.stop()
+            self.resource_policy.log_stats()
+            self.asset_cache.log_stats()
+            for pool in self.pools.values():
+                pool.log_stats()
+            logger.info("浏览器已关闭")
+        except Exception as e:
+            logger.error(f"关闭浏览器时出错: {e}")
+
+    async def _ensure_browser(self) -> bool:
+        """浏览器意外断开时重新启动，保证批量任务的后续关键词可以继续"""
+        if self._restart_lock is None:
+            self._restart_lock = asyncio.Lock()
+        # 批量任务并发查询时只由一个任务负责重启
+        async with self._restart_lock:
+            if self.browser and self.browser.is_connected():
+                return True
+            logger.warning("浏览器连接已断开，重新启动")
+            await self.close_browser()
+            return await self.init_browser()
+
+    async def _query(self, name: str, query: str, deadline: Deadline) -> Dict[str, Any]:
+        """在该提供方负载最低的会话上查询，被限流的会话进入冷却"""
+        async def job(session: Session) -> Dict[str, Any]:
+            idle = self.providers.get((name, session.name))
+            if idle is None:
+                return {'website': name, 'query': query, 'success': False, 'error': '浏览器页面未初始化'}
+            # 会话池保证进行中的任务数不超过并发上限，这里总能拿到空闲页面
+            provider = await idle.get()
+            try:
+                return await provider.query(query, deadline)
+            finally:
+                idle.put_nowait(provider)
+
+        remaining = deadline.remaining()
+        result = await self.pools[name].run(job, timeout=None if remaining == float('inf') else remaining)
+        result.setdefault('website', name)
+        result.setdefault('query', query)
+        return result
+
+    async def query_all(self, query: str, budget: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        同时查询所有提供方
+
+        Args:
+            query: 查询内容
+            budget: 所有提供方共享的时间预算（秒）
+
+        Returns:
+            各提供方的结果列表（顺序与提供方一致）
+        """
+        if not await self._ensure_browser():
+            return [{'website': name, 'query': query, 'success': False, 'error': '浏览器初始化失败'}
+                    for name in self.provider_names]
+
+        deadline = Deadline(budget if budget is not None else PROVIDERS_CONFIG['job_budget'])
+        start_time = time.time()
+        results = await asyncio.gather(*(self._query(name, query, deadline) for name in self.provider_names),
+                                       return_exceptions=True)
+
+        merged = []
+        for name, result in zip(self.provider_names, results):
+            if isinstance(result, BaseException):
+                result = {'website': name, 'query': query, 'success': False, 'error': str(result)}
+            merged.append(result)
+
+        succeeded = [r['website'] for r in merged if r.get('success')]
+        logger.info(f"并发查询完成，耗时 {time.time() - start_time:.1f} 秒，成功: {', '.join(succeeded) or '无'}")
+        return merged
+
+    @staticmethod
+    def to_analysis_data(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """转换为 DataAnalyzer.generate_comprehensive_report 的输入格式（只保留有内容的结果）"""
+        return [{
+            'website': result['website'],
+            'content': result.get('content', ''),
+            'references': result.get('references', []),
+            'query': result.get('query', ''),
+            'search_time': result.get('timestamp', datetime.now().isoformat())
+        } for result in results if result.get('content')]
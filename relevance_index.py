@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BM25 相关性引擎 - 所有已保存的回答和来源文章共用一个磁盘倒排索引
+
+索引保存在 SQLite 文件中（文档表、倒排表和词的文档频率表），新结果到达时在一个事务内
+增量写入，不需要重建。查询时只读取查询词的倒排列表，用 NumPy 计算 BM25 并取前 k 个；
+文档长度和文档频率在内存中缓存，多次查询之间复用，索引有写入时才失效。
+score_texts 用整个历史的统计量给新文本打分，不同批次、不同运行之间的分数可以直接比较。
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from config import NEAR_DUPLICATE_CONFIG, RELEVANCE_INDEX_CONFIG
+from near_duplicates import NearDuplicateIndex
+from segmentation_cache import PUNCTUATION_PATTERN, SegmentationCache
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    doc_key TEXT UNIQUE NOT NULL,
+    kind TEXT NOT NULL,
+    keyword TEXT,
+    website TEXT,
+    title TEXT,
+    url TEXT,
+    length INTEGER NOT NULL,
+    added_at TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_keyword ON documents(keyword);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, doc_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS signatures (
+    doc_id INTEGER PRIMARY KEY,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS indexed_files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+# 文档类型
+ANSWER = 'answer'
+ARTICLE = 'article'
+
+
+class RelevanceIndex:
+    """SQLite 倒排索引 + BM25 打分"""
+
+    def __init__(self, db_path: Optional[str] = None, segmenter: Optional[SegmentationCache] = None,
+                 k1: Optional[float] = None, b: Optional[float] = None,
+                 deduplicator: Optional[NearDuplicateIndex] = None):
+        """
+        打开（必要时创建）索引
+
+        Args:
+            db_path: 索引文件路径
+            segmenter: 分词缓存（与 DataAnalyzer 共用可避免重复分词）
+            k1: BM25 词频饱和参数
+            b: BM25 文档长度归一化参数
+            deduplicator: 近似重复索引，默认按 NEAR_DUPLICATE_CONFIG 创建；近似重复的文档不再收录
+        """
+        self.db_path = db_path or RELEVANCE_INDEX_CONFIG['db_path']
+        self.segmenter = segmenter or SegmentationCache()
+        self.k1 = k1 if k1 is not None else RELEVANCE_INDEX_CONFIG['k1']
+        self.b = b if b is not None else RELEVANCE_INDEX_CONFIG['b']
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.executescript(SCHEMA)
+
+        if deduplicator is None and NEAR_DUPLICATE_CONFIG['enabled']:
+            deduplicator = NearDuplicateIndex()
+        self.deduplicator = deduplicator
+        if self.deduplicator is not None:
+            self._load_signatures()
+
+        # 内存中的集合统计，写入索引后失效
+        self._lengths: Optional[np.ndarray] = None
+        self._total_length = 0
+        self._doc_count = 0
+        self._df: Dict[str, int] = {}
+
+        # 统计信息
+        self.documents_added = 0
+        self.documents_skipped = 0
+        self.near_duplicates = 0
+        self.queries = 0
+        self.query_time = 0.0
+
+    def _load_signatures(self):
+        for doc_id, blob in self.conn.execute("SELECT doc_id, signature FROM signatures"):
+            signature = np.frombuffer(blob, dtype=np.uint32)
+            # 修改签名长度后旧签名无法比较
+            if len(signature) == self.deduplicator.num_perm:
+                self.deduplicator.add(doc_id, signature)
+
+    # ---------- 分词 ----------
+
+    def _terms(self, text: str) -> List[str]:
+        """索引用的词：分词后转小写，去掉空白、单字和纯标点（不去停用词，由 IDF 降权）"""
+        terms = []
+        for word in self.segmenter.segment(text or ''):
+            word = word.strip().lower()
+            if len(word) > 1 and not PUNCTUATION_PATTERN.match(word):
+                terms.append(word)
+        return terms
+
+    def query_terms(self, query: str) -> List[str]:
+        """查询词（去重，保持顺序）；查询过短切不出词时使用整个查询"""
+        terms = list(dict.fromkeys(self._terms(query)))
+        if not terms and query.strip():
+            terms = [query.strip().lower()]
+        return terms
+
+    # ---------- 写入 ----------
+
+    @staticmethod
+    def _doc_key(kind: str, url: str, text: str) -> str:
+        return hashlib.sha1(f"{kind}\0{url}\0{text}".encode('utf-8')).hexdigest()
+
+    @classmethod
+    def document_key(cls, document: Dict[str, Any]) -> str:
+        """文档的去重键（类型、地址和内容相同的文档键相同）"""
+        title = document.get('title') or ''
+        content = document.get('content') or ''
+        return cls._doc_key(document.get('kind', ANSWER), document.get('url') or '', f"{title}\n{content}")
+
+    @staticmethod
+    def answer_document(result: Dict[str, Any], keyword: Optional[str] = None) -> Dict[str, Any]:
+        """AI 回答（DataAnalyzer.generate_comprehensive_report 的输入格式）对应的索引文档"""
+        return {
+            'kind': ANSWER,
+            'keyword': keyword if keyword is not None else result.get('query', ''),
+            'website': result.get('website'),
+            'title': result.get('title') or result.get('query', ''),
+            'url': result.get('link') or result.get('url', ''),
+            'content': result.get('content', '')
+        }
+
+    def existing_keys(self, keys: Iterable[str]) -> set:
+        """已收录的去重键"""
+        keys = list(dict.fromkeys(keys))
+        found = set()
+        # 分批查询，避免超过 SQLite 的参数个数上限
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            found.update(row[0] for row in self.conn.execute(
+                f"SELECT doc_key FROM documents WHERE doc_key IN ({placeholders})", chunk))
+        return found
+
+    def add_documents(self, documents: Iterable[Dict[str, Any]]) -> int:
+        """
+        增量加入文档（相同类型、地址和内容的文档只索引一次，与已收录文档近似重复的文档不再收录，
+        避免转载和重复的回答抬高文档频率）
+
+        Args:
+            documents: [{'kind', 'keyword', 'website', 'title', 'url', 'content'}, ...]
+
+        Returns:
+            新加入的文档数
+        """
+        added = 0
+        now = datetime.now().isoformat()
+        with self.conn:
+            for document in documents:
+                kind = document.get('kind', ANSWER)
+                title = document.get('title') or ''
+                content = document.get('content') or ''
+                url = document.get('url') or ''
+                if not content.strip():
+                    continue
+                key = self.document_key(document)
+                if self.conn.execute("SELECT 1 FROM documents WHERE doc_key = ?", (key,)).fetchone():
+                    self.documents_skipped += 1
+                    continue
+                signature = self.deduplicator.signature(content) if self.deduplicator is not None else None
+                if signature is not None and self.deduplicator.find(signature) is not None:
+                    self.near_duplicates += 1
+                    continue
+
+                term_counts = Counter(self._terms(f"{title}\n{content}"))
+                cursor = self.conn.execute(
+                    "INSERT INTO documents (doc_key, kind, keyword, website, title, url, length, added_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, kind, document.get('keyword'), document.get('website'), title, url,
+                     sum(term_counts.values()), now))
+                doc_id = cursor.lastrowid
+                self.conn.executemany("INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                                      [(term, doc_id, tf) for term, tf in term_counts.items()])
+                self.conn.executemany(
+                    "INSERT INTO terms (term, df) VALUES (?, 1) ON CONFLICT(term) DO UPDATE SET df = df + 1",
+                    [(term,) for term in term_counts])
+                if signature is not None:
+                    self.conn.execute("INSERT INTO signatures (doc_id, signature) VALUES (?, ?)",
+                                      (doc_id, signature.tobytes()))
+                    self.deduplicator.add(doc_id, signature)
+                added += 1
+
+        if added:
+            self.documents_added += added
+            self._invalidate()
+        return added
+
+    def add_answers(self, results: Sequence[Dict[str, Any]], keyword: Optional[str] = None) -> int:
+        """加入 AI 回答（DataAnalyzer.generate_comprehensive_report 的输入格式），关键词默认取 query 字段"""
+        return self.add_documents(self.answer_document(result, keyword) for result in results)
+
+    def add_articles(self, articles: Sequence[Dict[str, Any]], keyword: Optional[str] = None) -> int:
+        """加入来源文章（ArticleFetcher 的抓取结果）"""
+        return self.add_documents({
+            'kind': ARTICLE,
+            'keyword': keyword,
+            'website': article.get('domain'),
+            'title': article.get('title', ''),
+            'url': article.get('canonical_url') or article.get('url', ''),
+            'content': article.get('article_content', '')
+        } for article in articles if article.get('success', True))
+
+    def index_files(self, paths: Iterable[str], keyword: Optional[str] = None) -> int:
+        """
+        从已保存的 JSON 结果文件补建索引（修改时间未变的文件跳过）
+
+        文件中任意位置带 content（回答）或 article_content（文章）字段的对象都会被索引
+        """
+        added = 0
+        for path in paths:
+            mtime = os.path.getmtime(path)
+            row = self.conn.execute("SELECT mtime FROM indexed_files WHERE path = ?", (path,)).fetchone()
+            if row and row[0] >= mtime:
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"读取结果文件失败 {path}: {e}")
+                continue
+
+            answers, articles = [], []
+            self._collect_records(data, answers, articles)
+            added += self.add_answers(answers, keyword) + self.add_articles(articles, keyword)
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO indexed_files (path, mtime) VALUES (?, ?)", (path, mtime))
+        return added
+
+    def _collect_records(self, data: Any, answers: List[Dict[str, Any]], articles: List[Dict[str, Any]]):
+        if isinstance(data, list):
+            for item in data:
+                self._collect_records(item, answers, articles)
+        elif isinstance(data, dict):
+            if isinstance(data.get('article_content'), str):
+                articles.append(data)
+            elif isinstance(data.get('content'), str):
+                answers.append(data)
+            else:
+                for value in data.values():
+                    self._collect_records(value, answers, articles)
+
+    # ---------- 集合统计 ----------
+
+    def _invalidate(self):
+        self._lengths = None
+        self._df.clear()
+
+    def _collection(self):
+        if self._lengths is None:
+            rows = self.conn.execute("SELECT id, length FROM documents").fetchall()
+            max_id = max((doc_id for doc_id, _ in rows), default=0)
+            # 按文档 id 直接索引的长度数组
+            self._lengths = np.zeros(max_id + 1, dtype=np.float64)
+            for doc_id, length in rows:
+                self._lengths[doc_id] = length
+            self._doc_count = len(rows)
+            self._total_length = int(self._lengths.sum())
+        return self._lengths
+
+    def document_frequencies(self, terms: Sequence[str]) -> Dict[str, int]:
+        """查询词的文档频率（缓存，在多次查询之间复用）"""
+        missing = [term for term in terms if term not in self._df]
+        if missing:
+            placeholders = ','.join('?' * len(missing))
+            found = dict(self.conn.execute(
+                f"SELECT term, df FROM terms WHERE term IN ({placeholders})", missing).fetchall())
+            for term in missing:
+                self._df[term] = found.get(term, 0)
+        return {term: self._df[term] for term in terms}
+
+    def _idf(self, terms: Sequence[str], extra_docs: int = 0, extra_df: Optional[np.ndarray] = None) -> np.ndarray:
+        self._collection()
+        doc_count = self._doc_count + extra_docs
+        frequencies = self.document_frequencies(terms)
+        df = np.array([frequencies[term] for term in terms], dtype=np.float64)
+        if extra_df is not None:
+            df = df + extra_df
+        return np.log(1.0 + (doc_count - df + 0.5) / (df + 0.5))
+
+    def _bm25(self, tf: np.ndarray, lengths: np.ndarray, avg_length: float) -> np.ndarray:
+        norm = self.k1 * (1.0 - self.b + self.b * lengths / max(avg_length, 1.0))
+        return tf * (self.k1 + 1.0) / (tf + norm)
+
+    # ---------- 查询 ----------
+
+    def search(self, query: str, top_k: int = 10, keyword: Optional[str] = None,
+               kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        检索与查询最相关的前 k 个文档
+
+        Args:
+            query: 查询
+            top_k: 返回的文档数
+            keyword: 只检索该关键词下收录的文档
+            kind: 只检索 'answer' 或 'article'
+
+        Returns:
+            按 BM25 分数从高到低排列的文档信息
+        """
+        start_time = time.time()
+        terms = self.query_terms(query)
+        lengths = self._collection()
+        if not terms or self._doc_count == 0:
+            return []
+
+        filters, params = [], list(terms)
+        if keyword is not None:
+            filters.append("d.keyword = ?")
+            params.append(keyword)
+        if kind is not None:
+            filters.append("d.kind = ?")
+            params.append(kind)
+        join = "JOIN documents d ON d.id = p.doc_id" if filters else ""
+        where = "".join(f" AND {condition}" for condition in filters)
+        placeholders = ','.join('?' * len(terms))
+        rows = self.conn.execute(
+            f"SELECT p.term, p.doc_id, p.tf FROM postings p {join} WHERE p.term IN ({placeholders}){where}",
+            params).fetchall()
+        if not rows:
+            self._record_query(start_time)
+            return []
+
+        term_index = {term: index for index, term in enumerate(terms)}
+        postings = np.array([(term_index[term], doc_id, tf) for term, doc_id, tf in rows], dtype=np.int64)
+        idf = self._idf(terms)
+        doc_ids, inverse = np.unique(postings[:, 1], return_inverse=True)
+        weights = idf[postings[:, 0]] * self._bm25(postings[:, 2].astype(np.float64), lengths[postings[:, 1]],
+                                                   self._total_length / self._doc_count)
+        scores = np.bincount(inverse, weights=weights, minlength=len(doc_ids))
+
+        # 只对前 k 个排序
+        if len(scores) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        columns = ['doc_id', 'kind', 'keyword', 'website', 'title', 'url', 'length', 'added_at']
+        placeholders = ','.join('?' * len(top))
+        documents = {row[0]: dict(zip(columns, row)) for row in self.conn.execute(
+            f"SELECT id, kind, keyword, website, title, url, length, added_at FROM documents "
+            f"WHERE id IN ({placeholders})", doc_ids[top].tolist())}
+        hits = [{**documents[int(doc_ids[index])], 'score': float(scores[index])} for index in top.tolist()]
+        self._record_query(start_time)
+        return hits
+
+    def score_texts(self, texts: Sequence[str], query: str, keys: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        用索引的集合统计给一批文本打 BM25 分（文本不写入索引）
+
+        尚未收录的文本也计入文档数和文档频率，空索引时相当于在这批文本内部打分
+
+        Args:
+            texts: 待打分的文本
+            query: 查询
+            keys: 各文本对应文档的去重键（document_key）；已收录的文本已经计入统计量，不再重复计入
+
+        只有 add_documents 实际会收录的文本计入统计量：同一批中重复的键只计一次，
+        与已收录文档或本批前面的文本近似重复的文本不计入
+        """
+        start_time = time.time()
+        terms = self.query_terms(query)
+        scores = np.zeros(len(texts))
+        if not terms or not texts:
+            return scores
+
+        term_lists = [self._terms(text) for text in texts]
+        tf = np.array([[counts.get(term, 0) for term in terms] for counts in map(Counter, term_lists)],
+                      dtype=np.float64).reshape(len(texts), len(terms))
+        lengths = np.array([len(words) for words in term_lists], dtype=np.float64)
+        new = self._would_add(texts, keys)
+
+        self._collection()
+        extra_docs = int(new.sum())
+        idf = self._idf(terms, extra_docs=extra_docs, extra_df=(tf[new] > 0).sum(axis=0))
+        avg_length = (self._total_length + lengths[new].sum()) / max(self._doc_count + extra_docs, 1)
+        scores = (self._bm25(tf, lengths[:, None], avg_length) * idf).sum(axis=1)
+        self._record_query(start_time)
+        return scores
+
+    def _would_add(self, texts: Sequence[str], keys: Optional[Sequence[str]]) -> np.ndarray:
+        """按 add_documents 的规则判断每段文本是否会被收录（不写入索引）"""
+        new = np.array([bool(text.strip()) for text in texts], dtype=bool)
+        indexed = self.existing_keys(keys) if keys is not None else set()
+        batch_keys = set()
+        batch = self.deduplicator.empty_copy() if self.deduplicator is not None else None
+        for index, text in enumerate(texts):
+            if not new[index]:
+                continue
+            if keys is not None:
+                if keys[index] in indexed or keys[index] in batch_keys:
+                    new[index] = False
+                    continue
+                batch_keys.add(keys[index])
+            if batch is None:
+                continue
+            signature = self.deduplicator.signature(text)
+            if signature is None:
+                continue
+            if self.deduplicator.query(signature) or batch.query(signature):
+                new[index] = False
+                continue
+            batch.add(index, signature)
+        return new
+
+    def _record_query(self, start_time: float):
+        self.queries += 1
+        self.query_time += time.time() - start_time
+
+    # ---------- 其他 ----------
+
+    def close(self):
+        """关闭索引文件"""
+        self.conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计"""
+        self._collection()
+        terms = self.conn.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+        return {
+            'documents': self._doc_count,
+            'terms': terms,
+            'documents_added': self.documents_added,
+            'documents_skipped': self.documents_skipped,
+            'near_duplicates': self.near_duplicates,
+            'queries': self.queries,
+            'avg_query_ms': round(self.query_time / self.queries * 1000, 2) if self.queries else None
+        }
+
+    def log_stats(self):
+        """输出索引统计"""
+        stats = self.get_stats()
+        logger.info(
+            f"相关性索引统计: {stats['documents']} 篇文档 / {stats['terms']} 个词，"
+            f"本次新增 {stats['documents_added']} 篇、跳过重复 {stats['documents_skipped']} 篇、"
+            f"近似重复 {stats['near_duplicates']} 篇，"
+            f"查询 {stats['queries']} 次，平均 {stats['avg_query_ms']} 毫秒"
+        )
+
+
+def main():
+    """命令行：从已保存的结果补建索引，或检索关键词"""
+    parser = argparse.ArgumentParser(description="BM25 相关性索引")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    index_parser = subparsers.add_parser('index', help="索引已保存的 JSON 结果文件")
+    index_parser.add_argument('patterns', nargs='*', default=['analysis_results/*.json', 'data/*.json'],
+                              help="结果文件或通配符")
+    index_parser.add_argument('--keyword', help="为这些文件中的文档指定关键词（默认取各回答的 query 字段）")
+    search_parser = subparsers.add_parser('search', help="检索关键词")
+    search_parser.add_argument('query')
+    search_parser.add_argument('--top-k', type=int, default=10)
+    search_parser.add_argument('--kind', choices=[ANSWER, ARTICLE])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    index = RelevanceIndex()
+    try:
+        if args.command == 'index':
+            files = sorted({path for pattern in args.patterns for path in glob.glob(pattern)})
+            added = index.index_files(files, args.keyword)
+            print(f"扫描 {len(files)} 个文件，新增 {added} 篇文档")
+        else:
+            for rank, hit in enumerate(index.search(args.query, args.top_k, kind=args.kind), 1):
+                print(f"{rank:>2}. {hit['score']:.3f}  [{hit['kind']}] {hit['website'] or ''} {hit['title'][:50]}  {hit['url']}")
+        index.log_stats()
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
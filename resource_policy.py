@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求级资源拦截策略 - 基于 context.route 拦截图片、字体、视频和追踪请求
+"""
+
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Any, Tuple
+from urllib.parse import urlsplit
+
+from config import RESOURCE_POLICY_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class ResourcePolicy:
+    """按提供方配置的资源拦截策略"""
+
+    def __init__(self, provider: str = "default", overrides: Optional[Dict[str, Any]] = None):
+        """
+        初始化资源拦截策略
+
+        Args:
+            provider: 提供方名称（DeepSeek、Kimi、ChatGPT 等），用于选择配置
+            overrides: 额外覆盖的配置项
+        """
+        self.provider = provider
+        config = self._merge_config(provider, overrides or {})
+        self.enabled = RESOURCE_POLICY_CONFIG.get('enabled', True)
+        self.block_resource_types = set(config.get('block_resource_types', []))
+        self.block_url_patterns: List[Tuple[str, str]] = [self._split_pattern(p) for p in config.get('block_url_patterns', [])]
+        self.allow_url_patterns: List[str] = [p.lower() for p in config.get('allow_url_patterns', [])]
+        self.estimated_bytes: Dict[str, int] = config.get('estimated_bytes', {})
+
+        # 统计信息
+        self.total_requests = 0
+        self.blocked_requests = 0
+        self.bytes_saved = 0
+        self.blocked_by_type = Counter()
+
+    @staticmethod
+    def _merge_config(provider: str, overrides: Dict[str, Any]) -> Dict[str, Any]:
+        """合并默认配置、提供方配置和覆盖配置（列表项追加，其余项替换）"""
+        merged = dict(RESOURCE_POLICY_CONFIG.get('default', {}))
+        for layer in (RESOURCE_POLICY_CONFIG.get(provider, {}), overrides):
+            for key, value in layer.items():
+                if isinstance(value, list) and isinstance(merged.get(key), list):
+                    merged[key] = merged[key] + value
+                elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+                    merged[key] = {**merged[key], **value}
+                else:
+                    merged[key] = value
+        return merged
+
+    @staticmethod
+    def _split_pattern(pattern: str) -> Tuple[str, str]:
+        """把拦截条目拆成 (域名, 路径前缀)"""
+        host, slash, path = pattern.lower().partition('/')
+        return host, slash + path
+
+    def _is_tracker(self, url: str) -> bool:
+        """请求是否发往追踪域名（域名本身或其子域名，条目带路径时还要求路径位于该路径下）"""
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+        path = parts.path.lower()
+        for pattern_host, pattern_path in self.block_url_patterns:
+            if host != pattern_host and not host.endswith('.' + pattern_host):
+                continue
+            if not pattern_path or path == pattern_path or path.startswith(pattern_path.rstrip('/') + '/'):
+                return True
+        return False
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        """判断请求是否应被拦截"""
+        url_lower = url.lower()
+
+        if url_lower.startswith('data:') or url_lower.startswith('blob:'):
+            return False
+
+        if any(pattern in url_lower for pattern in self.allow_url_patterns):
+            return False
+
+        if resource_type in self.block_resource_types:
+            return True
+
+        return self._is_tracker(url)
+
+    async def _handle_route(self, route, request):
+        """路由处理函数"""
+        self.total_requests += 1
+        resource_type = request.resource_type
+
+        if self.should_block(request.url, resource_type):
+            self.blocked_requests += 1
+            self.blocked_by_type[resource_type] += 1
+            self.bytes_saved += self.estimated_bytes.get(resource_type, self.estimated_bytes.get('other', 0))
+            await route.abort()
+            return
+
+        # Playwright 按注册顺序的逆序执行路由，fallback 交给更早注册的路由（如静态资源缓存），
+        # 没有则正常发出请求
+        await route.fallback()
+
+    async def apply(self, target) -> bool:
+        """
+        在 BrowserContext 或 Page 上安装拦截路由
+
+        同一目标上的路由按注册顺序的逆序执行：要让拦截先于静态资源缓存生效，
+        必须先安装 AssetCache 再调用本方法，否则缓存会先处理（并放行）请求。
+        页面上的路由总是先于上下文上的路由执行，缓存装在页面、本策略装在上下文时，
+        缓存处理的白名单主机脚本和样式不会经过本策略。
+
+        Args:
+            target: BrowserContext 或 Page
+
+        Returns:
+            是否安装成功
+        """
+        if not self.enabled:
+            return False
+
+        try:
+            await target.route("**/*", self._handle_route)
+            logger.info(f"已启用资源拦截策略: {self.provider}")
+            return True
+        except Exception as e:
+            logger.warning(f"启用资源拦截策略失败: {e}")
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取拦截统计"""
+        return {
+            'provider': self.provider,
+            'total_requests': self.total_requests,
+            'blocked_requests': self.blocked_requests,
+            'allowed_requests': self.total_requests - self.blocked_requests,
+            'bytes_saved': self.bytes_saved,
+            'blocked_by_type': dict(self.blocked_by_type)
+        }
+
+    def log_stats(self):
+        """输出拦截统计"""
+        stats = self.get_stats()
+        logger.info(
+            f"资源拦截统计[{self.provider}]: 共 {stats['total_requests']} 个请求，"
+            f"拦截 {stats['blocked_requests']} 个，约节省 {stats['bytes_saved'] / 1024:.1f} KB"
+        )
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+jieba 分词缓存 - 同一段文本在一次报告和多次重新分析之间只分词一次
+
+分词结果按文本内容哈希缓存：内存中保留最近使用的条目，可选的磁盘缓存
+（每条文本一个 JSON 文件）让重新分析已保存的结果几乎不再消耗 CPU。
+过滤停用词和标点后的词流也按文本缓存，DataAnalyzer 的各个方法共用。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import jieba
+
+from config import SEGMENTATION_CACHE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+PUNCTUATION_PATTERN = re.compile(r'^[^\w\s]+$')
+
+
+class SegmentationCache:
+    """按内容哈希缓存的 jieba 分词结果"""
+
+    def __init__(self, stop_words: Optional[Iterable[str]] = None, cache_dir: Optional[str] = None,
+                 max_entries: Optional[int] = None):
+        """
+        初始化分词缓存
+
+        Args:
+            stop_words: 过滤词流时使用的停用词
+            cache_dir: 磁盘缓存目录，配置中为 None 且未传入时只使用内存缓存
+            max_entries: 内存中最多保留的文本数
+        """
+        self.stop_words = set(stop_words or [])
+        self.cache_dir = cache_dir or SEGMENTATION_CACHE_CONFIG.get('cache_dir')
+        self.max_entries = max_entries or SEGMENTATION_CACHE_CONFIG['max_entries']
+        # 词典或分词方式变化后旧的缓存不再有效
+        self.version = SEGMENTATION_CACHE_CONFIG['version']
+
+        self.segments: "OrderedDict[str, List[str]]" = OrderedDict()
+        self.filtered_segments: "OrderedDict[str, List[str]]" = OrderedDict()
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+        # 统计信息
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.version}\0{text}".encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + '.json')
+
+    def _remember(self, store: "OrderedDict[str, List[str]]", key: str, value: List[str]):
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    def _load(self, key: str) -> Optional[List[str]]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, key: str, words: List[str]):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再替换，避免其他进程读到半个文件
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(words, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(f"写入分词缓存失败: {e}")
+
+    def _lookup(self, key: str, text: str) -> List[str]:
+        # 磁盘缓存或重新分词（不经过内存缓存）
+        words = self._load(key)
+        if words is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            words = list(jieba.cut(text))
+            self._store(key, words)
+        return words
+
+    def _filter(self, words: List[str]) -> List[str]:
+        filtered = []
+        for word in words:
+            word = word.strip()
+            if word and len(word) > 1 and word not in self.stop_words and not PUNCTUATION_PATTERN.match(word):
+                filtered.append(word)
+        return filtered
+
+    def segment(self, text: str) -> List[str]:
+        """返回 jieba.cut 的完整结果（不可修改返回的列表）"""
+        key = self._key(text)
+        words = self.segments.get(key)
+        if words is not None:
+            self.memory_hits += 1
+            self.segments.move_to_end(key)
+            return words
+
+        words = self._lookup(key, text)
+        self._remember(self.segments, key, words)
+        return words
+
+    def filtered(self, text: str) -> List[str]:
+        """返回去掉空白、停用词、单字和纯标点后的词流"""
+        key = self._key(text)
+        words = self.filtered_segments.get(key)
+        if words is not None:
+            self.memory_hits += 1
+            self.filtered_segments.move_to_end(key)
+            return words
+
+        words = self._filter(self.segment(text))
+        self._remember(self.filtered_segments, key, words)
+        return words
+
+    def filtered_many(self, texts: Iterable[str]) -> List[str]:
+        """多段文本的过滤后词流（按文本顺序拼接）"""
+        words: List[str] = []
+        for text in texts:
+            words.extend(self.filtered(text))
+        return words
+
+    def iter_filtered(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        """
+        逐段产生过滤后的词流
+
+        已在内存中的结果直接使用，新的结果不写入内存缓存（仍写入磁盘缓存），
+        流式统计大量文本时内存占用不随文本数增长
+        """
+        for text in texts:
+            key = self._key(text)
+            words = self.filtered_segments.get(key)
+            if words is not None:
+                self.memory_hits += 1
+                yield words
+                continue
+            segments = self.segments.get(key)
+            if segments is not None:
+                self.memory_hits += 1
+            else:
+                segments = self._lookup(key, text)
+            yield self._filter(segments)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取缓存统计"""
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'entries': len(self.segments)
+        }
+
+    def log_stats(self):
+        """输出缓存统计"""
+        stats = self.get_stats()
+        logger.info(
+            f"分词缓存统计: 内存命中 {stats['memory_hits']}，磁盘命中 {stats['disk_hits']}，"
+            f"重新分词 {stats['misses']}，内存条目 {stats['entries']}"
+        )
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+中文情感分析 - 基于情感词典，处理否定词和程度副词
+
+TextBlob 只支持英文，对 DeepSeek/Kimi 的中文回答几乎总是给出 0 极性，
+且每段文本都要构建完整的 Blob。这里对中文文本使用 jieba 分词结果查词典：
+情感词按权重计分，同一分句内前面若干个词中的程度副词放大/减弱分数，
+奇数个否定词翻转分数。一批文本的词元拼接后用 NumPy 一次完成计算。
+英文文本仍交给 TextBlob。
+"""
+
+import json
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import SENTIMENT_CONFIG
+from segmentation_cache import SegmentationCache
+
+logger = logging.getLogger(__name__)
+
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+CLAUSE_BREAK_PATTERN = re.compile(r'^[，。！？；：,.!?;:\n\r…]+$')
+NON_WORD_PATTERN = re.compile(r'^[\W_]*$')
+
+# 词典只收录脱离上下文也带有明显褒贬的词。“问题”“风险”“发展”“合作”“支持”“专业”等词
+# 在说明性、介绍性的文字里随处可见，本身并不表达态度，计入后中性文本也会被判为有倾向，
+# 因此不收录；“增长”“下降”等描述趋势的词只给较低的权重
+POSITIVE_WORDS = {
+    '好': 1.0, '良好': 1.0, '优秀': 1.5, '优质': 1.2, '卓越': 1.5, '出色': 1.5, '杰出': 1.5, '领先': 1.2,
+    '先进': 1.0, '创新': 1.0, '突破': 1.2, '成功': 1.2, '成就': 1.0, '增长': 0.4, '上涨': 0.4, '提升': 0.4,
+    '提高': 0.4, '改善': 0.8, '进步': 0.8, '稳定': 0.6, '稳健': 0.8, '可靠': 1.0, '可信': 1.0, '信赖': 1.0,
+    '认可': 1.0, '好评': 1.5, '口碑': 0.8, '赞誉': 1.5, '称赞': 1.2, '推荐': 0.8, '满意': 1.2, '喜欢': 1.0,
+    '喜爱': 1.2, '欢迎': 1.0, '受欢迎': 1.2, '热门': 0.8, '畅销': 1.0, '优势': 1.0, '强大': 1.0, '高效': 1.0,
+    '便捷': 0.8, '方便': 0.8, '实用': 0.8, '精致': 1.0, '精良': 1.0, '耐用': 1.0, '性价比': 0.8, '值得': 1.0,
+    '盈利': 1.0, '获利': 1.0, '获奖': 1.2, '荣获': 1.2, '荣誉': 1.0, '龙头': 1.0, '积极': 1.0, '正面': 1.0,
+    '乐观': 1.0, '利好': 1.2, '繁荣': 1.0, '共赢': 1.0, '流畅': 0.8, '完善': 0.8, '完美': 1.5, '惊艳': 1.5,
+    '亮眼': 1.2, '强劲': 1.0, '稳步': 0.8, '顺利': 0.8, '高兴': 1.0, '开心': 1.0, '赞': 1.2, '棒': 1.2,
+    '厉害': 1.0, '靠谱': 1.0, '不错': 1.0
+}
+
+NEGATIVE_WORDS = {
+    '差': 1.0, '坏': 1.0, '糟糕': 1.5, '恶劣': 1.5, '低劣': 1.5, '劣质': 1.5, '失败': 1.2, '亏损': 1.2,
+    '下跌': 0.4, '下滑': 0.4, '下降': 0.4, '萎缩': 1.0, '衰退': 1.0, '倒闭': 1.5, '破产': 1.5, '裁员': 1.0,
+    '违法': 1.5, '违规': 1.2, '处罚': 1.2, '罚款': 1.2, '诉讼': 1.0, '起诉': 1.0, '纠纷': 1.0, '投诉': 1.0,
+    '差评': 1.5, '批评': 1.0, '质疑': 0.8, '争议': 0.8, '丑闻': 1.5, '欺诈': 1.5, '虚假': 1.2, '造假': 1.5,
+    '危险': 1.0, '隐患': 1.0, '缺陷': 1.0, '故障': 1.0, '漏洞': 1.0, '卡顿': 1.0, '不稳定': 1.0, '落后': 1.0,
+    '困难': 0.8, '困境': 1.0, '危机': 1.2, '担忧': 0.8, '担心': 0.8, '失望': 1.2, '不满': 1.2, '愤怒': 1.5,
+    '抱怨': 1.0, '讨厌': 1.2, '负面': 1.0, '消极': 1.0, '悲观': 1.0, '利空': 1.2, '暴跌': 1.5, '崩盘': 1.5,
+    '泄露': 1.2, '侵权': 1.2, '召回': 1.0, '停产': 1.0, '拖欠': 1.2, '欠薪': 1.5, '跑路': 1.5, '坑': 1.0,
+    '垃圾': 1.5, '难用': 1.2, '昂贵': 0.6, '缓慢': 0.6, '麻烦': 0.8, '混乱': 1.0, '弱': 0.6, '薄弱': 0.8,
+    '不足': 0.6, '痛苦': 1.2, '伤心': 1.0, '不好': 1.0, '不佳': 1.0, '不良': 1.0
+}
+
+NEGATION_WORDS = {
+    '不', '没', '没有', '无', '非', '未', '别', '莫', '勿', '不是', '并非', '毫无', '从未', '从不', '不会',
+    '不能', '难以', '绝非', '不再', '未能', '无法', '否'
+}
+
+DEGREE_WORDS = {
+    '极其': 2.0, '极为': 2.0, '极度': 2.0, '极': 2.0, '最': 2.0, '最为': 2.0, '非常': 1.8, '十分': 1.8,
+    '特别': 1.8, '格外': 1.8, '异常': 1.8, '相当': 1.5, '很': 1.5, '挺': 1.3, '太': 1.6, '超': 1.6,
+    '更': 1.3, '更加': 1.4, '越来越': 1.3, '较': 1.2, '比较': 1.2, '较为': 1.2, '有点': 0.8,
+    '有些': 0.8, '稍': 0.7, '稍微': 0.7, '略': 0.7, '略微': 0.7, '一点': 0.7, '些许': 0.7
+}
+
+
+def polarity_label(polarity: float) -> str:
+    """极性对应的情绪标签（DataAnalyzer、AIAnalyzer 共用）"""
+    if polarity > 0.1:
+        return '积极'
+    if polarity < -0.1:
+        return '消极'
+    return '中性'
+
+
+def is_chinese(text: str, ratio: Optional[float] = None) -> bool:
+    """中文字符占非空白字符的比例达到阈值时视为中文文本"""
+    ratio = SENTIMENT_CONFIG['cjk_ratio'] if ratio is None else ratio
+    stripped = re.sub(r'\s+', '', text or '')
+    if not stripped:
+        return False
+    return len(CJK_PATTERN.findall(stripped)) / len(stripped) >= ratio
+
+
+class SentimentAnalyzer:
+    """词典情感分析器（中文）+ TextBlob（英文）"""
+
+    def __init__(self, segmenter: Optional[SegmentationCache] = None, lexicon_file: Optional[str] = None):
+        """
+        初始化情感分析器
+
+        Args:
+            segmenter: 分词缓存（与 DataAnalyzer 共用可避免重复分词）
+            lexicon_file: 额外的情感词典 JSON 文件 {"positive": {词: 权重}, "negative": {...},
+                          "negation": [...], "degree": {词: 倍数}}
+        """
+        self.segmenter = segmenter or SegmentationCache()
+        self.window = SENTIMENT_CONFIG['window']
+        self.smoothing = SENTIMENT_CONFIG['smoothing']
+        self.negation_weight = SENTIMENT_CONFIG['negation_weight']
+        self.subjectivity_scale = SENTIMENT_CONFIG['subjectivity_scale']
+
+        positive, negative = dict(POSITIVE_WORDS), dict(NEGATIVE_WORDS)
+        negation, degree = set(NEGATION_WORDS), dict(DEGREE_WORDS)
+        lexicon_file = lexicon_file or SENTIMENT_CONFIG.get('lexicon_file')
+        if lexicon_file:
+            try:
+                with open(lexicon_file, 'r', encoding='utf-8') as f:
+                    extra = json.load(f)
+                positive.update(extra.get('positive', {}))
+                negative.update(extra.get('negative', {}))
+                negation.update(extra.get('negation', []))
+                degree.update(extra.get('degree', {}))
+            except (OSError, ValueError) as e:
+                logger.warning(f"加载情感词典失败: {e}")
+
+        self.lexicon: Dict[str, Tuple[float, bool, float]] = {}
+        for word, weight in positive.items():
+            self.lexicon[word] = (weight, False, 1.0)
+        for word, weight in negative.items():
+            self.lexicon[word] = (-weight, False, 1.0)
+        for word in negation:
+            self.lexicon[word] = (0.0, True, 1.0)
+        for word, multiplier in degree.items():
+            self.lexicon[word] = (0.0, False, multiplier)
+
+        # 词元 -> 行号；每行对应 [权重, 是否否定词, 程度倍数, 是否分句边界, 是否为词]
+        self._token_rows: Dict[str, int] = {}
+        self._rows: List[Tuple[float, bool, float, bool, bool]] = []
+        self._table: Optional[np.ndarray] = None
+        self._textblob = None
+
+    def _split_prefix(self, token: str) -> Tuple[float, bool, float]:
+        # jieba 常把单字程度词、否定词和情感词切成一个词（如“很差”“不满意”）
+        head, rest = token[:1], token[1:]
+        weight = self.lexicon.get(rest, (0.0,))[0]
+        prefix = self.lexicon.get(head)
+        if not weight or not prefix:
+            return 0.0, False, 1.0
+        if prefix[1]:
+            return weight * self.negation_weight, False, 1.0
+        return weight * prefix[2], False, 1.0
+
+    def _row(self, token: str) -> int:
+        row = self._token_rows.get(token)
+        if row is None:
+            weight, negation, degree = self.lexicon.get(token) or self._split_prefix(token)
+            is_break = bool(CLAUSE_BREAK_PATTERN.match(token))
+            is_word = not NON_WORD_PATTERN.match(token)
+            row = self._token_rows[token] = len(self._rows)
+            self._rows.append((weight, negation, degree, is_break, is_word))
+            self._table = None
+        return row
+
+    def _lookup_table(self) -> np.ndarray:
+        if self._table is None:
+            self._table = np.array(self._rows, dtype=np.float64).reshape(-1, 5)
+        return self._table
+
+    def _score_chinese(self, texts: List[str]) -> List[Tuple[float, float]]:
+        """批量计算中文文本的 (极性, 主观性)"""
+        rows: List[int] = []
+        lengths = []
+        for text in texts:
+            tokens = self.segmenter.segment(text)
+            rows.extend(self._row(token) for token in tokens)
+            lengths.append(len(tokens))
+
+        n_docs = len(texts)
+        if not rows:
+            return [(0.0, 0.0)] * n_docs
+        table = self._lookup_table()[np.asarray(rows)]
+        weight, negation, degree, is_break, is_word = table.T
+        lengths = np.asarray(lengths)
+        doc = np.repeat(np.arange(n_docs), lengths)
+
+        # 分句编号：遇到标点或新文本时递增，修饰词只作用于同一分句内的情感词
+        doc_start = np.zeros(len(rows), dtype=bool)
+        doc_start[np.cumsum(lengths)[:-1][lengths[1:] > 0]] = True
+        doc_start[0] = True
+        clause = np.cumsum(doc_start | (is_break > 0))
+
+        multiplier = np.ones(len(rows))
+        negations = np.zeros(len(rows))
+        for k in range(1, self.window + 1):
+            same_clause = np.zeros(len(rows), dtype=bool)
+            same_clause[k:] = clause[k:] == clause[:-k]
+            previous_degree = np.ones(len(rows))
+            previous_degree[k:] = degree[:-k]
+            previous_negation = np.zeros(len(rows))
+            previous_negation[k:] = negation[:-k]
+            multiplier *= np.where(same_clause, previous_degree, 1.0)
+            negations += np.where(same_clause, previous_negation, 0.0)
+
+        scores = weight * multiplier * np.where(negations % 2 == 1, self.negation_weight, 1.0)
+        positive = np.bincount(doc, weights=np.maximum(scores, 0), minlength=n_docs)
+        negative = np.bincount(doc, weights=np.maximum(-scores, 0), minlength=n_docs)
+        polarity = (positive - negative) / (positive + negative + self.smoothing)
+
+        # 只有情感词计入主观性；程度副词（“更”“最”等）在客观陈述中也很常见
+        opinion = (weight != 0).astype(np.float64)
+        opinion_count = np.bincount(doc, weights=opinion, minlength=n_docs)
+        word_count = np.bincount(doc, weights=is_word, minlength=n_docs)
+        subjectivity = np.minimum(1.0, opinion_count / np.maximum(word_count, 1) * self.subjectivity_scale)
+
+        return list(zip(polarity.tolist(), subjectivity.tolist()))
+
+    def _score_english(self, text: str) -> Tuple[float, float]:
+        """英文文本使用 TextBlob"""
+        if self._textblob is None:
+            from textblob import TextBlob
+            self._textblob = TextBlob
+        sentiment = self._textblob(text).sentiment
+        return sentiment.polarity, sentiment.subjectivity
+
+    def score_batch(self, texts: List[str]) -> List[Tuple[float, float]]:
+        """
+        批量分析情绪
+
+        Returns:
+            每段文本的 (极性 -1 到 1，主观性 0 到 1)，顺序与输入一致
+        """
+        scores: List[Tuple[float, float]] = [(0.0, 0.0)] * len(texts)
+        chinese = []
+        for index, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            if is_chinese(text):
+                chinese.append(index)
+            else:
+                scores[index] = self._score_english(text)
+
+        if chinese:
+            for index, score in zip(chinese, self._score_chinese([texts[i] for i in chinese])):
+                scores[index] = score
+        return scores
+
+    def score(self, text: str) -> Tuple[float, float]:
+        """分析单段文本的情绪"""
+        return self.score_batch([text])[0]
+
+
+_default_analyzer: Optional[SentimentAnalyzer] = None
+
+
+def get_sentiment_analyzer() -> SentimentAnalyzer:
+    """进程内共用的默认情感分析器"""
+    global _default_analyzer
+    if _default_analyzer is None:
+        _default_analyzer = SentimentAnalyzer()
+    return _default_analyzer
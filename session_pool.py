@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多账号会话池 - 按提供方注册多个登录状态，负载最低的会话优先分配任务
+
+每个会话跟踪进行中的任务数、连续失败次数和限流冷却时间；
+被限流的会话在冷却期内不再分配任务，冷却时间随连续限流指数增长。
+冷却状态持久化到本地文件，重启后仍然生效。
+PooledClients 为每个会话维护一个浏览器客户端（DeepSeekWebSearch、ChatWithLogin 等），
+批量查询按会话负载分配到各账号，任务在该客户端的浏览器监控下执行。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from config import SESSION_POOL_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def detect_rate_limit(text: Optional[str]) -> bool:
+    """判断回复或错误信息是否为限流提示"""
+    if not text:
+        return False
+    text_lower = text.lower()
+    return any(marker.lower() in text_lower for marker in SESSION_POOL_CONFIG['rate_limit_markers'])
+
+
+class Session:
+    """单个账号会话"""
+
+    def __init__(self, provider: str, name: str, storage_state: Optional[str] = None,
+                 user_data_dir: Optional[str] = None, max_concurrency: int = 1):
+        self.provider = provider
+        self.name = name
+        self.storage_state = storage_state
+        self.user_data_dir = user_data_dir
+        self.max_concurrency = max(1, max_concurrency)
+
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.rate_limit_strikes = 0
+        self.cooldown_until = 0.0
+        self.last_used = 0.0
+        self.last_throttled = 0.0
+
+        # 统计信息
+        self.completed = 0
+        self.failed = 0
+        self.rate_limited = 0
+
+    def is_cooling(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) < self.cooldown_until
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < self.max_concurrency
+
+    def load(self) -> float:
+        return self.in_flight / self.max_concurrency
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rate_limited': self.rate_limited,
+            'cooldown_remaining': max(0.0, round(self.cooldown_until - time.time(), 1))
+        }
+
+
+class SessionPool:
+    """多账号会话池"""
+
+    def __init__(self, provider: str, state_file: Optional[str] = None):
+        """
+        初始化会话池
+
+        Args:
+            provider: 提供方名称（DeepSeek、ChatGPT 等）
+            state_file: 冷却状态持久化文件
+        """
+        self.provider = provider
+        self.state_file = state_file or SESSION_POOL_CONFIG['state_file']
+        self.cooldown = SESSION_POOL_CONFIG['cooldown']
+        self.max_cooldown = SESSION_POOL_CONFIG['max_cooldown']
+        self.failure_threshold = SESSION_POOL_CONFIG['failure_threshold']
+        self.sessions: List[Session] = []
+        self._condition: Optional[asyncio.Condition] = None
+
+    @classmethod
+    def from_config(cls, provider: str) -> 'SessionPool':
+        """按 SESSION_POOL_CONFIG['accounts'] 注册会话，跳过登录状态文件不存在的账号"""
+        pool = cls(provider)
+        for account in SESSION_POOL_CONFIG['accounts'].get(provider, []):
+            storage_state = account.get('storage_state')
+            user_data_dir = account.get('user_data_dir')
+            if storage_state and not os.path.exists(storage_state):
+                logger.warning(f"账号 {account['name']} 的登录状态文件不存在: {storage_state}")
+                continue
+            pool.register(account['name'], storage_state=storage_state, user_data_dir=user_data_dir,
+                          max_concurrency=account.get('max_concurrency', 1))
+        return pool
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        # 延迟创建，保证绑定到运行中的事件循环
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    # ---------- 持久化 ----------
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        state = self._load_state()
+        state[self.provider] = {
+            session.name: {
+                'cooldown_until': session.cooldown_until,
+                'rate_limit_strikes': session.rate_limit_strikes
+            }
+            for session in self.sessions
+        }
+        try:
+            directory = os.path.dirname(self.state_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.state_file, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.warning(f"保存会话池状态失败: {e}")
+
+    # ---------- 注册与分配 ----------
+
+    def register(self, name: str, storage_state: Optional[str] = None, user_data_dir: Optional[str] = None,
+                 max_concurrency: int = 1) -> Session:
+        """注册一个账号会话（storage_state 与 user_data_dir 二选一）"""
+        session = Session(self.provider, name, storage_state, user_data_dir, max_concurrency)
+        saved = self._load_state().get(self.provider, {}).get(name, {})
+        session.cooldown_until = saved.get('cooldown_until', 0.0)
+        session.rate_limit_strikes = saved.get('rate_limit_strikes', 0)
+        self.sessions.append(session)
+        logger.info(f"注册 {self.provider} 会话: {name}（并发上限 {session.max_concurrency}）")
+        return session
+
+    def _pick(self) -> Optional[Session]:
+        """选择负载最低的可用会话，负载相同时选择最久未使用的"""
+        now = time.time()
+        candidates = [s for s in self.sessions if s.has_capacity() and not s.is_cooling(now)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda s: (s.load(), s.last_used))
+
+    def _next_available_in(self) -> Optional[float]:
+        """最近一个冷却结束的会话还需等待的时间"""
+        now = time.time()
+        cooling = [s.cooldown_until - now for s in self.sessions if s.is_cooling(now) and s.has_capacity()]
+        return min(cooling) if cooling else None
+
+    async def acquire(self, timeout: Optional[float] = None) -> Optional[Session]:
+        """
+        获取一个会话
+
+        Args:
+            timeout: 最长等待时间（秒），默认使用 SESSION_POOL_CONFIG['acquire_timeout']
+
+        Returns:
+            会话，超时或没有注册会话时返回 None
+        """
+        if not self.sessions:
+            logger.error(f"{self.provider} 会话池中没有可用账号")
+            return None
+
+        timeout = timeout if timeout is not None else SESSION_POOL_CONFIG['acquire_timeout']
+        end_time = time.time() + timeout
+        async with self.condition:
+            while True:
+                session = self._pick()
+                if session:
+                    session.in_flight += 1
+                    session.last_used = time.time()
+                    return session
+
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    logger.warning(f"等待 {self.provider} 空闲会话超时")
+                    return None
+
+                # 冷却中的会话到期后也需要唤醒
+                wait_time = remaining
+                cooling_in = self._next_available_in()
+                if cooling_in is not None:
+                    wait_time = min(wait_time, cooling_in)
+                try:
+                    await asyncio.wait_for(self.condition.wait(), wait_time)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, session: Session, success: bool = True, rate_limited: bool = False):
+        """
+        归还会话并记录结果
+
+        Args:
+            session: acquire 返回的会话
+            success: 任务是否成功
+            rate_limited: 是否检测到限流
+        """
+        session.in_flight = max(0, session.in_flight - 1)
+        if rate_limited:
+            session.last_throttled = time.time()
+
+        if success and not rate_limited:
+            session.completed += 1
+            session.consecutive_failures = 0
+            session.rate_limit_strikes = 0
+        else:
+            session.failed += 1
+            session.consecutive_failures += 1
+            if rate_limited or session.consecutive_failures >= self.failure_threshold:
+                self._cool_down(session)
+
+        async with self.condition:
+            self.condition.notify_all()
+
+    def _cool_down(self, session: Session):
+        session.rate_limited += 1
+        session.rate_limit_strikes += 1
+        session.consecutive_failures = 0
+        cooldown = min(self.cooldown * 2 ** (session.rate_limit_strikes - 1), self.max_cooldown)
+        session.cooldown_until = time.time() + cooldown
+        logger.warning(f"{self.provider} 会话 {session.name} 被限流，冷却 {cooldown:.0f} 秒")
+        self._save_state()
+
+    async def run(self, job: Callable[[Session], Awaitable[Dict[str, Any]]],
+                  timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        在负载最低的会话上执行任务
+
+        Args:
+            job: 接收会话并返回结果字典的协程函数；结果中 'rate_limited' 为真
+                 或错误信息为限流提示时，该会话进入冷却
+            timeout: 等待空闲会话的最长时间（秒）
+        """
+        session = await self.acquire(timeout)
+        if session is None:
+            return {'success': False, 'error': f'没有可用的 {self.provider} 账号会话'}
+
+        result: Dict[str, Any] = {}
+        try:
+            result = await job(session)
+            return result
+        finally:
+            rate_limited = bool(result.get('rate_limited')) or detect_rate_limit(result.get('error'))
+            await self.release(session, success=bool(result.get('success')), rate_limited=rate_limited)
+            if result:
+                result['session'] = session.name
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取会话池统计"""
+        return {
+            'provider': self.provider,
+            'sessions': [session.get_stats() for session in self.sessions]
+        }
+
+    def log_stats(self):
+        """输出会话池统计"""
+        for stats in self.get_stats()['sessions']:
+            logger.info(
+                f"{self.provider} 会话 {stats['name']}: 完成 {stats['completed']}，失败 {stats['failed']}，"
+                f"限流 {stats['rate_limited']} 次"
+            )
+
+
+class PooledClients:
+    """
+    会话池中每个会话对应一个浏览器客户端，查询分配到负载最低的会话
+
+    客户端需要提供 init_browser()/close_browser() 以及 page、asset_cache、supervisor 属性；
+    会话第一次分配到任务时才启动它的浏览器。
+    """
+
+    def __init__(self, pool: SessionPool, make_client: Callable[[Session], Any]):
+        """
+        Args:
+            pool: 会话池
+            make_client: 按会话（storage_state / user_data_dir）创建客户端
+        """
+        self.pool = pool
+        self.make_client = make_client
+        self.clients: Dict[str, Any] = {}
+        self._init_locks: Dict[str, asyncio.Lock] = {}
+
+    async def init_browser(self) -> bool:
+        """检查会话池中是否有账号（浏览器在会话第一次分配到任务时启动）"""
+        if not self.pool.sessions:
+            logger.error(f"{self.pool.provider} 会话池中没有可用账号")
+            return False
+        return True
+
+    async def _client(self, session: Session):
+        lock = self._init_locks.setdefault(session.name, asyncio.Lock())
+        async with lock:
+            if session.name not in self.clients:
+                client = self.make_client(session)
+                if not await client.init_browser():
+                    return None
+                self.clients[session.name] = client
+        return self.clients[session.name]
+
+    async def run(self, query: str, ask: Callable[[Any, str, Any], Awaitable[Dict[str, Any]]],
+                  timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        在负载最低的会话上执行一次查询
+
+        Args:
+            query: 查询内容
+            ask: ask(client, query, page) 协程函数；page 为 None 时使用客户端自己的页面
+            timeout: 等待空闲会话的最长时间（秒）
+        """
+        default = {'success': False, 'query': query, 'error': '浏览器无法恢复'}
+
+        async def job(session: Session) -> Dict[str, Any]:
+            client = await self._client(session)
+            if not client:
+                return {'success': False, 'query': query, 'error': f'账号 {session.name} 浏览器初始化失败'}
+
+            async def attempt() -> Dict[str, Any]:
+                if session.max_concurrency == 1:
+                    return await ask(client, query, None)
+                # 同一账号允许多个并发任务时，每个任务使用独立页面，并纳入浏览器监控
+                page = await client.page.context.new_page()
+                client.supervisor.use_page(page)
+                try:
+                    await client.asset_cache.apply(page)
+                    return await ask(client, query, page)
+                finally:
+                    try:
+                        await page.close()
+                    except Exception:
+                        pass
+
+            # 浏览器崩溃或页面卡死时自动恢复并重试
+            return await client.supervisor.run(attempt, default=default)
+
+        return await self.pool.run(job, timeout)
+
+    async def map(self, queries: Sequence[str],
+                  ask: Callable[[Any, str, Any], Awaitable[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """并发执行多个查询（并发数受各会话的并发上限约束），结果顺序与输入一致"""
+        return list(await asyncio.gather(*(self.run(query, ask) for query in queries)))
+
+    async def close_browser(self):
+        """关闭所有会话的浏览器并输出统计"""
+        for client in self.clients.values():
+            await client.close_browser()
+            client.supervisor.log_stats()
+        self.clients = {}
+        self.pool.log_stats()
@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网页源提取流水线 - 提问 → 等待回复 → 点击"已搜索到N个网页" → 提取参考链接
+
+之前各个 *_sources_extractor.py / js_data_miner.py 脚本中的提取技巧在这里作为
+策略插件实现。策略按历史命中率/平均耗时排序执行，有效链接达到质量阈值后立即停止，
+每个策略的耗时和命中次数持久化到本地文件，生产环境总是优先使用最快的有效技巧。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from config import SOURCE_PIPELINE_CONFIG
+from deadline import Deadline, DeadlineExceeded
+from url_canonicalizer import URLCanonicalizer, canonicalize
+
+logger = logging.getLogger(__name__)
+
+URL_PATTERN = re.compile(r'https?://[^\s"\'<>\\]+')
+
+
+def is_reference_url(url: Optional[str]) -> bool:
+    """判断是否为外部参考链接（排除 DeepSeek 自身和静态资源）"""
+    if not url or not url.startswith('http'):
+        return False
+    url_lower = url.lower()
+    return not any(pattern in url_lower for pattern in SOURCE_PIPELINE_CONFIG['exclude_patterns'])
+
+
+def make_reference(url: str, text: str = '', title: str = '', strategy: str = '') -> Dict[str, Any]:
+    return {
+        'url': url,
+        'text': (text or '').strip()[:120],
+        'title': (title or '').strip()[:120],
+        'domain': urlparse(url).netloc,
+        'strategy': strategy
+    }
+
+
+# ---------- 策略插件 ----------
+
+class SourceStrategy(ABC):
+    """提取策略接口"""
+
+    name = "base"
+
+    async def prepare(self, page):
+        """发送问题之前调用（如注册网络监听）"""
+
+    @abstractmethod
+    async def extract(self, page, deadline: Deadline) -> List[Dict[str, Any]]:
+        """返回提取到的参考链接列表"""
+
+
+class DomLinksStrategy(SourceStrategy):
+    """一次 evaluate 读取页面中所有外部链接"""
+
+    name = "dom_links"
+
+    async def extract(self, page, deadline):
+        links = await page.evaluate("""
+            () => Array.from(document.querySelectorAll('a[href]')).map(a => ({
+                url: a.href, text: a.innerText || '', title: a.getAttribute('title') || ''
+            }))
+        """)
+        return [make_reference(l['url'], l['text'], l['title'], self.name) for l in links]
+
+
+class RightPanelStrategy(SourceStrategy):
+    """滚动右侧参考面板加载全部条目后读取其中的链接"""
+
+    name = "right_panel"
+
+    async def extract(self, page, deadline):
+        for _ in range(3):
+            await page.evaluate("""
+                () => document.querySelectorAll('*').forEach(el => {
+                    const rect = el.getBoundingClientRect();
+                    if (rect.x > 600 && rect.width > 200 && el.scrollHeight > el.clientHeight) {
+                        el.scrollTop = el.scrollHeight;
+                    }
+                })
+            """)
+            await deadline.sleep(page, 800)
+
+        links = await page.evaluate("""
+            () => Array.from(document.querySelectorAll('a[href]'))
+                .filter(a => a.getBoundingClientRect().x > 600)
+                .map(a => ({url: a.href, text: a.innerText || '', title: a.getAttribute('title') || ''}))
+        """)
+        return [make_reference(l['url'], l['text'], l['title'], self.name) for l in links]
+
+
+class IframeStrategy(SourceStrategy):
+    """读取 iframe 中的链接"""
+
+    name = "iframe"
+
+    async def extract(self, page, deadline):
+        references = []
+        for frame in page.frames:
+            if frame == page.main_frame:
+                continue
+            deadline.check()
+            try:
+                links = await frame.evaluate("""
+                    () => Array.from(document.querySelectorAll('a[href]')).map(a => ({
+                        url: a.href, text: a.innerText || '', title: a.getAttribute('title') || ''
+                    }))
+                """)
+            except Exception:
+                continue
+            references.extend(make_reference(l['url'], l['text'], l['title'], self.name) for l in links)
+        return references
+
+
+class NetworkStrategy(SourceStrategy):
+    """从 DeepSeek 接口响应（含搜索结果的流式回复）中提取链接"""
+
+    name = "network"
+
+    def __init__(self):
+        self.bodies: List[str] = []
+        self.pending = set()
+        self.page = None
+
+    async def prepare(self, page):
+        self.bodies = []
+        # 同一页面多次提问时只注册一次监听
+        if self.page is not page:
+            if self.page is not None:
+                self.page.remove_listener("response", self._on_response)
+            page.on("response", self._on_response)
+            self.page = page
+
+    def _on_response(self, response):
+        if "/api/" not in response.url or "deepseek.com" not in response.url:
+            return
+        task = asyncio.ensure_future(self._read(response))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def _read(self, response):
+        try:
+            self.bodies.append(await response.text())
+        except Exception:
+            pass
+
+    async def extract(self, page, deadline):
+        if self.pending:
+            await asyncio.wait(self.pending, timeout=max(0.1, min(5, deadline.remaining())))
+        references = []
+        for body in self.bodies:
+            # 流式回复中的 JSON 字符串可能包含转义的斜杠
+            for url in URL_PATTERN.findall(body.replace('\\/', '/')):
+                references.append(make_reference(url.rstrip('.,;)]}'), strategy=self.name))
+        return references
+
+
+class JsDataStrategy(SourceStrategy):
+    """在页面全局变量和内联脚本中查找链接"""
+
+    name = "js_data"
+
+    async def extract(self, page, deadline):
+        texts = await page.evaluate("""
+            () => {
+                const texts = [];
+                for (const key of Object.keys(window)) {
+                    try {
+                        const value = window[key];
+                        if (typeof value === 'string') texts.push(value);
+                        else if (value && typeof value === 'object' && !(value instanceof Node)) {
+                            texts.push(JSON.stringify(value));
+                        }
+                    } catch (e) {}
+                }
+                document.querySelectorAll('script:not([src])').forEach(s => texts.push(s.textContent || ''));
+                return texts;
+            }
+        """)
+        return [make_reference(url, strategy=self.name) for text in texts for url in URL_PATTERN.findall(text)]
+
+
+class ClickTitlesStrategy(SourceStrategy):
+    """逐个点击右侧参考标题，从新打开的页面获取真实地址（最慢，作为兜底）"""
+
+    name = "click_titles"
+
+    async def extract(self, page, deadline):
+        candidates = await page.evaluate("""
+            () => {
+                const items = [];
+                document.querySelectorAll('*').forEach((el, index) => {
+                    const rect = el.getBoundingClientRect();
+                    const text = (el.innerText || '').trim();
+                    if (rect.x > 650 && rect.height > 10 && rect.height < 120 && text.length > 8
+                            && text.length < 200 && window.getComputedStyle(el).cursor === 'pointer') {
+                        items.push({x: rect.x + rect.width / 2, y: rect.y + rect.height / 2, text: text});
+                    }
+                });
+                return items;
+            }
+        """)
+
+        references = []
+        seen_texts = set()
+        for item in candidates:
+            if len(seen_texts) >= SOURCE_PIPELINE_CONFIG['max_clicks']:
+                break
+            if item['text'] in seen_texts:
+                continue
+            seen_texts.add(item['text'])
+            deadline.check()
+            try:
+                async with page.context.expect_page(timeout=deadline.timeout_ms(5000)) as page_info:
+                    await page.mouse.click(item['x'], item['y'])
+                new_page = await page_info.value
+                try:
+                    await new_page.wait_for_load_state('domcontentloaded', timeout=deadline.timeout_ms(10000))
+                    references.append(make_reference(new_page.url, item['text'], await new_page.title(), self.name))
+                finally:
+                    await new_page.close()
+            except DeadlineExceeded:
+                raise
+            except Exception:
+                continue
+        return references
+
+
+STRATEGY_CLASSES = {
+    cls.name: cls for cls in (
+        DomLinksStrategy, RightPanelStrategy, IframeStrategy, NetworkStrategy, JsDataStrategy, ClickTitlesStrategy
+    )
+}
+
+
+# ---------- 流水线 ----------
+
+class SourceExtractionPipeline:
+    """网页源提取流水线"""
+
+    def __init__(self, strategies: Optional[List[str]] = None, stats_file: Optional[str] = None,
+                 min_references: Optional[int] = None):
+        """
+        初始化提取流水线
+
+        Args:
+            strategies: 启用的策略名称，默认使用 SOURCE_PIPELINE_CONFIG['strategies']
+            stats_file: 策略统计文件
+            min_references: 质量阈值（有效链接数）
+        """
+        names = strategies or SOURCE_PIPELINE_CONFIG['strategies']
+        self.strategies: List[SourceStrategy] = [STRATEGY_CLASSES[name]() for name in names]
+        self.stats_file = stats_file or SOURCE_PIPELINE_CONFIG['stats_file']
+        self.min_references = min_references or SOURCE_PIPELINE_CONFIG['min_references']
+        self.stats: Dict[str, Dict[str, float]] = self._load_stats()
+        self.canonicalizer = URLCanonicalizer()
+
+    # ---------- 统计 ----------
+
+    def _load_stats(self) -> Dict[str, Dict[str, float]]:
+        try:
+            with open(self.stats_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_stats(self):
+        try:
+            directory = os.path.dirname(self.stats_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.stats_file, 'w', encoding='utf-8') as f:
+                json.dump(self.stats, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.warning(f"保存策略统计失败: {e}")
+
+    def _record(self, name: str, elapsed: float, found: int, hit: bool):
+        stats = self.stats.setdefault(name, {'runs': 0, 'hits': 0, 'total_time': 0.0, 'total_refs': 0})
+        stats['runs'] += 1
+        stats['hits'] += int(hit)
+        stats['total_time'] = round(stats['total_time'] + elapsed, 3)
+        stats['total_refs'] += found
+
+    def priority(self, name: str) -> float:
+        """
+        策略优先级：命中率 / 平均耗时（顺序尝试时使期望总耗时最小）
+        命中率使用 (hits + 1) / (runs + 2) 平滑，新策略也有机会被尝试
+        """
+        stats = self.stats.get(name, {})
+        runs = stats.get('runs', 0)
+        hit_rate = (stats.get('hits', 0) + 1) / (runs + 2)
+        latency = stats['total_time'] / runs if runs else SOURCE_PIPELINE_CONFIG['prior_latency']
+        return hit_rate / max(latency, 0.1)
+
+    def ordered_strategies(self) -> List[SourceStrategy]:
+        return sorted(self.strategies, key=lambda s: self.priority(s.name), reverse=True)
+
+    # ---------- 公共步骤 ----------
+
+    async def prepare(self, page):
+        """发送问题前调用，让需要监听的策略（如 network）开始记录"""
+        for strategy in self.strategies:
+            await strategy.prepare(page)
+
+    async def ask(self, page, query: str, deadline: Deadline):
+        """发送问题"""
+        await self.prepare(page)
+        chat_input = await page.wait_for_selector("textarea", timeout=deadline.timeout_ms(10000))
+        await chat_input.fill(query)
+        await chat_input.press('Enter')
+
+    async def wait_for_answer(self, page, deadline: Deadline, max_wait: float = 60):
+        """等待回复内容稳定"""
+        start_time = time.time()
+        stable_count = 0
+        last_content = None
+        while time.time() - start_time < max_wait:
+            elements = await page.query_selector_all(".ds-markdown.ds-markdown--block")
+            current = await elements[-1].inner_text() if elements else ''
+            if current and current == last_content:
+                stable_count += 1
+                if stable_count >= 3:
+                    return
+            else:
+                stable_count = 0
+                last_content = current
+            await deadline.sleep(page, 2000)
+
+    async def open_sources(self, page, deadline: Deadline) -> Dict[str, Any]:
+        """查找并点击"已搜索到N个网页"，返回 {'count', 'text', 'clicked'}"""
+        for selector in SOURCE_PIPELINE_CONFIG['sources_selectors']:
+            deadline.check()
+            try:
+                elements = await page.query_selector_all(selector)
+            except Exception:
+                continue
+            for element in elements:
+                try:
+                    text = await element.inner_text()
+                except Exception:
+                    continue
+                if '搜索到' in text and ('网页' in text or '个' in text):
+                    numbers = re.findall(r'\d+', text)
+                    count = int(numbers[0]) if numbers else 0
+                    try:
+                        await element.click()
+                        await deadline.sleep(page, 2000)
+                        clicked = True
+                    except DeadlineExceeded:
+                        raise
+                    except Exception as e:
+                        logger.warning(f"点击源信息失败: {e}")
+                        clicked = False
+                    logger.info(f"找到源信息: {text}")
+                    return {'count': count, 'text': text, 'clicked': clicked}
+        return {'count': 0, 'text': '', 'clicked': False}
+
+    async def harvest(self, page, deadline: Deadline, expected: int = 0) -> Dict[str, Any]:
+        """
+        按优先级执行策略，有效链接达到阈值后停止
+
+        Args:
+            expected: 页面显示的网页数，小于阈值时以它为准
+
+        Returns:
+            {'references': [...], 'strategy': 达到阈值的策略, 'attempts': [{'strategy', 'elapsed', 'found'}]}
+        """
+        threshold = min(self.min_references, expected) if expected else self.min_references
+        threshold = max(threshold, 1)
+        merged: Dict[str, Dict[str, Any]] = {}
+        attempts = []
+        winner = None
+        in_grace = False
+
+        for strategy in self.ordered_strategies():
+            if in_grace:
+                break
+            if deadline.expired():
+                if attempts:
+                    break
+                # 预算已耗尽时仍给优先级最高的策略一次短暂的宽限，返回部分结果
+                deadline = Deadline(SOURCE_PIPELINE_CONFIG['grace_period'])
+                in_grace = True
+            start_time = time.time()
+            try:
+                found = [ref for ref in await strategy.extract(page, deadline) if is_reference_url(ref['url'])]
+            except DeadlineExceeded:
+                found = []
+            except Exception as e:
+                logger.debug(f"策略 {strategy.name} 失败: {e}")
+                found = []
+            elapsed = time.time() - start_time
+
+            # 跟踪参数不同的同一链接只算一次
+            unique = {canonicalize(ref['url']): ref for ref in found}
+            hit = len(unique) >= threshold
+            self._record(strategy.name, elapsed, len(unique), hit)
+            attempts.append({'strategy': strategy.name, 'elapsed': round(elapsed, 3), 'found': len(unique)})
+            logger.info(f"策略 {strategy.name}: {len(unique)} 个链接，耗时 {elapsed:.2f} 秒")
+
+            for url, ref in unique.items():
+                merged.setdefault(url, ref)
+            if hit:
+                winner = strategy.name
+                break
+
+        self._save_stats()
+        references = await self._dedupe(merged, deadline)
+        return {'references': references, 'strategy': winner, 'attempts': attempts}
+
+    async def _dedupe(self, merged: Dict[str, Dict[str, Any]], deadline: Deadline) -> List[Dict[str, Any]]:
+        """解析跳转链接后再去重一次（不同的跳转链接可能指向同一篇文章），不超过剩余预算"""
+        remaining = deadline.remaining()
+        try:
+            return await asyncio.wait_for(self.canonicalizer.dedupe(list(merged.values())),
+                                          timeout=None if remaining == float('inf') else remaining)
+        except asyncio.TimeoutError:
+            # 跳转服务太慢，改用本地规范化的结果
+            logger.warning(f"解析跳转链接超出任务时间预算，使用本地规范化结果（{len(merged)} 个链接）")
+            return [{**ref, 'canonical_url': url} for url, ref in merged.items()]
+
+    async def run(self, page, query: str, budget: Optional[float] = None) -> Dict[str, Any]:
+        """
+        完整流程：提问 → 等待回复 → 打开参考来源 → 按策略提取
+
+        Args:
+            page: 已登录的 DeepSeek 页面
+            query: 查询内容
+            budget: 任务时间预算（秒）
+        """
+        deadline = Deadline(budget)
+        result = {
+            'query': query,
+            'timestamp': datetime.now().isoformat(),
+            'success': False,
+            'sources_count': 0,
+            'references': [],
+            'strategy': None,
+            'attempts': [],
+            'error': ''
+        }
+        try:
+            await page.goto("https://chat.deepseek.com", timeout=deadline.timeout_ms(30000),
+                            wait_until='domcontentloaded')
+            await self.ask(page, query, deadline)
+            await self.wait_for_answer(page, deadline)
+            sources = await self.open_sources(page, deadline)
+            result['sources_count'] = sources['count']
+        except DeadlineExceeded as e:
+            result['error'] = str(e)
+            result['deadline_exceeded'] = True
+        except Exception as e:
+            result['error'] = str(e)
+            logger.error(f"提取流程出错: {e}")
+
+        # 即使前面的步骤超时，也尝试从当前页面提取
+        harvest = await self.harvest(page, deadline, result['sources_count'])
+        result.update(harvest)
+        result['success'] = bool(result['references'])
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各策略的统计（按当前优先级排序）"""
+        report = {}
+        for strategy in self.ordered_strategies():
+            stats = self.stats.get(strategy.name, {})
+            runs = stats.get('runs', 0)
+            report[strategy.name] = {
+                'runs': runs,
+                'hit_rate': stats.get('hits', 0) / runs if runs else None,
+                'avg_time': stats.get('total_time', 0) / runs if runs else None,
+                'priority': round(self.priority(strategy.name), 4)
+            }
+        return report
+
+
+async def main():
+    """使用持久化登录的用户数据目录运行一次完整提取"""
+    from playwright.async_api import async_playwright
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    query = "小鸡科技的最新信息，包括公司背景、业务范围、最新动态"
+    pipeline = SourceExtractionPipeline()
+
+    playwright = await async_playwright().start()
+    context = None
+    try:
+        context = await playwright.chromium.launch_persistent_context(
+            user_data_dir="./deepseek_user_data",
+            headless=False
+        )
+        page = context.pages[0] if context.pages else await context.new_page()
+        result = await pipeline.run(page, query, budget=180)
+
+        filename = f"sources_pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+        print(f"提取到 {len(result['references'])} 个链接（策略: {result['strategy']}），结果已保存: {filename}")
+        for name, stats in pipeline.get_stats().items():
+            print(f"  {name}: {stats}")
+    finally:
+        if context:
+            await context.close()
+        await playwright.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+热备聊天标签页 - 预先打开聊天页面并聚焦输入框，下一次查询直接取用
+
+用过的标签页归还后在后台通过"新对话"入口重置并放回，而不是整页重新加载；
+内存指标或任务数超限、重置失败的标签页直接关闭，并预热一个新标签页补上。
+池中空闲（就绪、预热中和回收中）的标签页不超过 size 个，替补只在空闲数量不足时预热，
+保证归还的标签页总能放回池中；预热失败时通知等待中的 acquire 立即回退到主页面。
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from config import STANDBY_CONFIG
+from page_recycler import PageRecycler
+
+logger = logging.getLogger(__name__)
+
+
+class StandbyTabPool:
+    """热备标签页池"""
+
+    def __init__(self, context, url: str = "https://chat.deepseek.com", size: Optional[int] = None,
+                 page_setup: Optional[Callable[[Any], Awaitable[Any]]] = None):
+        """
+        初始化热备标签页池
+
+        Args:
+            context: BrowserContext（普通或持久化上下文均可）
+            url: 聊天页面地址
+            size: 保持就绪的标签页数量
+            page_setup: 新标签页导航前执行的初始化（如安装静态资源缓存路由）
+        """
+        self.context = context
+        self.page_setup = page_setup
+        self.url = url
+        self.size = size or STANDBY_CONFIG['pool_size']
+        self.warm_timeout = STANDBY_CONFIG['warm_timeout'] * 1000
+        self.input_selector = ", ".join(STANDBY_CONFIG['input_selectors'])
+        self.new_chat_selectors: List[str] = STANDBY_CONFIG['new_chat_selectors']
+        self.recycler = PageRecycler()
+
+        # 队列元素为 (page, chat_input)；预热失败且有 acquire 在等待时放入 None
+        self.ready: asyncio.Queue = asyncio.Queue()
+        self.tasks = set()
+        self.closed = False
+        # 正在预热和正在回收的标签页数量
+        self.warming = 0
+        self.recycling = 0
+        # 等待中的 acquire 数量，以及队列中 None 标记的数量（不计入空闲标签页）
+        self.waiters = 0
+        self.failure_markers = 0
+
+        # 统计信息
+        self.ready_hits = 0
+        self.cold_misses = 0
+        self.recycled = 0
+        self.retired = 0
+        self.warm_failures = 0
+
+    def start(self):
+        """开始预热标签页"""
+        for _ in range(self.size):
+            self._spawn_warm()
+        logger.info(f"开始预热 {self.size} 个热备标签页: {self.url}")
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def _spawn_warm(self):
+        self.warming += 1
+        self._spawn(self._warm_new_tab())
+
+    def _idle(self) -> int:
+        """就绪、预热中和回收中的标签页数量"""
+        return self.ready.qsize() - self.failure_markers + self.warming + self.recycling
+
+    def _is_full(self, own: int = 0) -> bool:
+        """空闲标签页是否已有 size 个（own 为调用方自身已计入的数量）"""
+        return self._idle() - own >= self.size
+
+    def _replenish(self):
+        """空闲标签页不足 size 个时预热替补"""
+        if not self.closed and not self._is_full():
+            self._spawn_warm()
+
+    async def _prepare(self, page, navigate: bool) -> Optional[Any]:
+        """导航（可选）并等待输入框就绪，返回聚焦后的输入框"""
+        if navigate:
+            await page.goto(self.url, timeout=self.warm_timeout, wait_until='domcontentloaded')
+
+        title = await page.title()
+        if "login" in title.lower() or "sign in" in title.lower():
+            logger.warning("热备标签页需要登录，放弃预热")
+            return None
+
+        # 一次等待所有候选选择器，避免逐个超时
+        chat_input = await page.wait_for_selector(self.input_selector, timeout=self.warm_timeout)
+        if chat_input:
+            await chat_input.focus()
+        return chat_input
+
+    async def _warm_new_tab(self):
+        """打开并预热一个新标签页（调用前已计入 warming）"""
+        page = None
+        chat_input = None
+        try:
+            page = await self.context.new_page()
+            if self.page_setup:
+                await self.page_setup(page)
+            chat_input = await self._prepare(page, navigate=True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"预热标签页失败: {e}")
+        finally:
+            self.warming -= 1
+
+        if chat_input and not self.closed:
+            self.ready.put_nowait((page, chat_input))
+            logger.info("热备标签页已就绪")
+            return
+
+        self.warm_failures += 1
+        if page:
+            await self._close_page(page)
+        # 只为等待中的 acquire 放入空标记，让它立即回退到主页面；没有等待者时不留下标记
+        if self.waiters > self.failure_markers:
+            self.failure_markers += 1
+            self.ready.put_nowait(None)
+
+    async def _start_new_chat(self, page) -> bool:
+        """点击"新对话"入口重置会话"""
+        for selector in self.new_chat_selectors:
+            try:
+                element = await page.query_selector(selector)
+                if element and await element.is_visible():
+                    await element.click()
+                    return True
+            except Exception:
+                continue
+        return False
+
+    async def _recycle(self, page):
+        """重置用过的标签页并放回池中（调用前已计入 recycling）"""
+        try:
+            if await self._recycle_page(page):
+                return
+        finally:
+            self.recycling -= 1
+
+        self.recycler.forget(page)
+        await self._close_page(page)
+        # 回收失败时补上替补，保证等待中的 acquire 能拿到结果
+        self._replenish()
+
+    async def _recycle_page(self, page) -> bool:
+        """重置标签页，成功放回池中时返回 True"""
+        try:
+            # 自身已计入 recycling
+            if page.is_closed() or self.closed or self._is_full(own=1):
+                return False
+
+            # 内存或任务数超限的标签页不再复用，由 acquire 时预热的替补补上
+            if self.recycler.enabled:
+                self.recycler.record_job(page)
+                reason = await self.recycler.check(page)
+                if reason:
+                    logger.info(f"热备标签页达到回收条件（{reason}），关闭")
+                    self.retired += 1
+                    return False
+
+            clicked = await self._start_new_chat(page)
+            chat_input = await self._prepare(page, navigate=not clicked)
+            # 重置期间替补可能已经就绪，池满时不再放回
+            if chat_input and not self.closed and not self._is_full(own=1):
+                self.recycled += 1
+                self.ready.put_nowait((page, chat_input))
+                return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"回收标签页失败: {e}")
+        return False
+
+    @staticmethod
+    async def _close_page(page):
+        try:
+            if not page.is_closed():
+                await page.close()
+        except Exception:
+            pass
+
+    async def acquire(self, timeout: Optional[float] = None) -> Optional[Tuple[Any, Any]]:
+        """
+        取用一个就绪标签页
+
+        Args:
+            timeout: 等待就绪标签页的最长时间（秒），None 表示一直等待
+
+        Returns:
+            (page, chat_input)，无法获得就绪标签页时返回 None
+        """
+        if self.closed:
+            return None
+
+        if self.ready.qsize() > self.failure_markers:
+            self.ready_hits += 1
+        else:
+            self.cold_misses += 1
+            # 空闲标签页不足时新开一个，否则等待预热或回收中的标签页入队
+            self._replenish()
+
+        while True:
+            self.waiters += 1
+            try:
+                item = await asyncio.wait_for(self.ready.get(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("等待热备标签页超时")
+                return None
+            finally:
+                self.waiters -= 1
+
+            if item is None:
+                self.failure_markers -= 1
+                # 标记之后已有标签页就绪（标记可能属于已超时的等待者）
+                if self.ready.qsize() > self.failure_markers:
+                    continue
+                # 为下一次 acquire 预热替补
+                self._replenish()
+                return None
+
+            page, chat_input = item
+            if page.is_closed():
+                self._replenish()
+                continue
+
+            return page, chat_input
+
+    def release(self, page):
+        """归还标签页，在后台开启新对话后放回池中"""
+        if page is None:
+            return
+        # 同步计入，归还后立即调用的 acquire 会等待它而不是另开新标签页
+        self.recycling += 1
+        self._spawn(self._recycle(page))
+
+    async def close(self):
+        """关闭池中所有标签页并取消后台任务"""
+        self.closed = True
+        for task in list(self.tasks):
+            task.cancel()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+        while not self.ready.empty():
+            item = self.ready.get_nowait()
+            if item:
+                await self._close_page(item[0])
+
+        logger.info(
+            f"热备标签页统计: 直接命中 {self.ready_hits}，等待预热 {self.cold_misses}，"
+            f"回收复用 {self.recycled}，内存回收 {self.retired}，预热失败 {self.warm_failures}"
+        )
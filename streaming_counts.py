@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式词频统计 - 内存占用与语料大小无关的高频词、词频和基数估计
+
+逐段文本分词后把词计数送入以下结构，不保留完整的词列表和全量 Counter：
+- Space-Saving：固定容量的高频词表，计数是真实值的上界，误差不超过被挤出的最小计数
+- Count-Min Sketch：固定大小的计数矩阵，与 Space-Saving 的计数取较小值，收紧高频词的上界
+- HyperLogLog：估计不同词、不同域名的个数
+- Bloom 过滤器：固定大小的“是否见过”集合（增量分析用来记录已统计的结果）
+关键词和相关词汇（与关键词互相包含的词）单独精确计数。
+所有结构都可以合并，合并结果与把两段数据流一起统计相同。
+"""
+
+import hashlib
+import heapq
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from config import STREAMING_COUNT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def hash64(items: Iterable[str]) -> np.ndarray:
+    """稳定的 64 位哈希（不受 PYTHONHASHSEED 影响，可以跨进程合并）"""
+    return np.fromiter((int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'little')
+                        for item in items), dtype=np.uint64)
+
+
+class SpaceSaving:
+    """Space-Saving 高频项统计（支持带权更新）"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        # (计数, 项) 的最小堆，计数变化后旧条目惰性作废
+        self._heap: List[Tuple[int, str]] = []
+
+    def _push(self, item: str, count: int):
+        heapq.heappush(self._heap, (count, item))
+        # 作废条目过多时重建堆
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, item) for item, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self) -> Tuple[str, int]:
+        while True:
+            count, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                return item, count
+
+    def update(self, item: str, count: int = 1):
+        """item 出现 count 次"""
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            # 挤出计数最小的项，新项继承它的计数作为误差
+            evicted, floor = self._pop_min()
+            del self.counts[evicted]
+            del self.errors[evicted]
+            self.counts[item] = floor + count
+            self.errors[item] = floor
+        self._push(item, self.counts[item])
+
+    def min_count(self) -> int:
+        """未被记录的项的计数上界"""
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def top(self, n: int) -> List[Tuple[str, int, int]]:
+        """计数最高的 n 项 [(项, 计数上界, 误差), ...]"""
+        items = heapq.nlargest(n, self.counts.items(), key=lambda pair: pair[1])
+        return [(item, count, self.errors[item]) for item, count in items]
+
+    def merge(self, other: 'SpaceSaving'):
+        """合并另一个 Space-Saving（两边未记录的项分别按对方的最小计数补上误差）"""
+        own_floor, other_floor = self.min_count(), other.min_count()
+        merged_counts, merged_errors = {}, {}
+        for item in set(self.counts) | set(other.counts):
+            merged_counts[item] = self.counts.get(item, own_floor) + other.counts.get(item, other_floor)
+            merged_errors[item] = self.errors.get(item, own_floor) + other.errors.get(item, other_floor)
+        kept = heapq.nlargest(self.capacity, merged_counts, key=merged_counts.get)
+        self.counts = {item: merged_counts[item] for item in kept}
+        self.errors = {item: merged_errors[item] for item in kept}
+        self._heap = [(count, item) for item, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+
+class CountMinSketch:
+    """Count-Min Sketch 词频估计"""
+
+    def __init__(self, width: int, depth: int):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self._rows = np.arange(depth, dtype=np.uint64)[:, None]
+
+    def _columns(self, hashes: np.ndarray) -> np.ndarray:
+        # 用两个 32 位哈希组合出 depth 个哈希函数
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = hashes >> np.uint64(32)
+        return ((low[None, :] + self._rows * high[None, :]) % np.uint64(self.width)).astype(np.int64)
+
+    def update(self, hashes: np.ndarray, counts: np.ndarray):
+        """按哈希批量加入计数"""
+        columns = self._columns(hashes)
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], counts)
+
+    def estimate(self, hashes: np.ndarray) -> np.ndarray:
+        """计数估计（真实值的上界）"""
+        columns = self._columns(hashes)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def merge(self, other: 'CountMinSketch'):
+        """合并同样大小的 Count-Min Sketch"""
+        self.table += other.table
+
+
+class HyperLogLog:
+    """HyperLogLog 基数估计"""
+
+    def __init__(self, precision: int):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, hashes: np.ndarray):
+        """按哈希批量加入元素"""
+        if len(hashes) == 0:
+            return
+        shift = np.uint64(64 - self.precision)
+        buckets = (hashes >> shift).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.precision)) - 1)
+        # rest < 2^53，转换为浮点数是精确的，frexp 的指数即二进制位数
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        ranks = (64 - self.precision - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def add(self, items: Iterable[str]):
+        """加入字符串元素"""
+        self.update(hash64(items))
+
+    def estimate(self) -> int:
+        """基数估计"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # 小基数时改用线性计数
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other: 'HyperLogLog'):
+        """合并同样精度的 HyperLogLog"""
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+
+class BloomFilter:
+    """Bloom 过滤器（没见过的元素有小概率被误判为见过，见过的元素不会漏判）"""
+
+    def __init__(self, capacity: int, error_rate: float, hashes: Optional[int] = None, bits: Optional[int] = None):
+        """
+        Args:
+            capacity: 预计的元素个数，超过后误判率上升
+            error_rate: 达到 capacity 时的误判率
+            hashes: 哈希函数个数（恢复状态时使用保存的值）
+            bits: 位数（恢复状态时使用保存的值）
+        """
+        self.capacity = capacity
+        if bits is None:
+            bits = int(np.ceil(-capacity * np.log(error_rate) / np.log(2) ** 2))
+        self.size = (bits + 7) // 8 * 8
+        self.num_hashes = hashes or max(1, int(round(self.size / capacity * np.log(2))))
+        self.bits = np.zeros(self.size // 8, dtype=np.uint8)
+        self._rows = np.arange(self.num_hashes, dtype=np.uint64)[:, None]
+
+    def _positions(self, hashes: np.ndarray) -> np.ndarray:
+        # 与 Count-Min Sketch 相同，用两个 32 位哈希组合出多个哈希函数
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = hashes >> np.uint64(32)
+        return ((low[None, :] + self._rows * high[None, :]) % np.uint64(self.size)).astype(np.int64)
+
+    def update(self, hashes: np.ndarray):
+        """按哈希批量加入元素"""
+        if len(hashes) == 0:
+            return
+        positions = self._positions(hashes).ravel()
+        np.bitwise_or.at(self.bits, positions >> 3, (1 << (positions & 7)).astype(np.uint8))
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        """各元素是否（可能）见过"""
+        if len(hashes) == 0:
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(hashes)
+        return ((self.bits[positions >> 3] >> (positions & 7).astype(np.uint8)) & 1).astype(bool).all(axis=0)
+
+    def estimate(self) -> int:
+        """由置位比例估计已加入的不同元素个数"""
+        ones = int(np.unpackbits(self.bits).sum())
+        if ones >= self.size:
+            return self.capacity
+        return int(round(-self.size / self.num_hashes * np.log(1.0 - ones / self.size)))
+
+    def merge(self, other: 'BloomFilter'):
+        """合并同样大小、同样哈希函数个数的 Bloom 过滤器"""
+        np.bitwise_or(self.bits, other.bits, out=self.bits)
+
+
+def domain_of(result: Dict[str, Any]) -> str:
+    """结果所属的域名（没有链接时使用网站名称）"""
+    link = result.get('link') or result.get('url') or ''
+    host = urlsplit(link).hostname if link.startswith('http') else None
+    if host:
+        return host[4:] if host.startswith('www.') else host
+    return result.get('website', '')
+
+
+class StreamingWordCounter:
+    """固定内存的关键词频度统计"""
+
+    def __init__(self, keyword: str, capacity: Optional[int] = None, width: Optional[int] = None,
+                 depth: Optional[int] = None, precision: Optional[int] = None):
+        """
+        初始化流式词频统计
+
+        Args:
+            keyword: 目标关键词（关键词和相关词汇精确计数）
+            capacity: Space-Saving 记录的高频词个数
+            width: Count-Min Sketch 每行的宽度
+            depth: Count-Min Sketch 的行数
+            precision: HyperLogLog 精度（寄存器个数为 2^precision）
+        """
+        self.keyword = keyword
+        self.top_words = SpaceSaving(capacity or STREAMING_COUNT_CONFIG['capacity'])
+        self.sketch = CountMinSketch(width or STREAMING_COUNT_CONFIG['cms_width'],
+                                     depth or STREAMING_COUNT_CONFIG['cms_depth'])
+        precision = precision or STREAMING_COUNT_CONFIG['hll_precision']
+        self.distinct_terms = HyperLogLog(precision)
+        self.distinct_domains = HyperLogLog(precision)
+        self.related_words: Counter = Counter()
+        self.total_words = 0
+        self.total_texts = 0
+
+    def add_words(self, words: Iterable[str]):
+        """加入一段文本的词流"""
+        counts = Counter(words)
+        self.total_texts += 1
+        if not counts:
+            return
+        self.total_words += sum(counts.values())
+        for word, count in counts.items():
+            self.top_words.update(word, count)
+            if self.keyword in word or word in self.keyword:
+                self.related_words[word] += count
+        hashes = hash64(counts)
+        self.sketch.update(hashes, np.fromiter(counts.values(), dtype=np.int64, count=len(counts)))
+        self.distinct_terms.update(hashes)
+
+    def add_domains(self, domains: Iterable[str]):
+        """加入来源域名"""
+        self.distinct_domains.add(domain for domain in domains if domain)
+
+    def merge(self, other: 'StreamingWordCounter'):
+        """合并同一关键词的另一个统计"""
+        self.top_words.merge(other.top_words)
+        self.sketch.merge(other.sketch)
+        self.distinct_terms.merge(other.distinct_terms)
+        self.distinct_domains.merge(other.distinct_domains)
+        self.related_words.update(other.related_words)
+        self.total_words += other.total_words
+        self.total_texts += other.total_texts
+
+    def to_state(self) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """导出为 (可 JSON 序列化的字段, NumPy 数组)，用于持久化"""
+        meta = {
+            'keyword': self.keyword,
+            'capacity': self.top_words.capacity,
+            'top_counts': self.top_words.counts,
+            'top_errors': self.top_words.errors,
+            'related_words': dict(self.related_words),
+            'total_words': self.total_words,
+            'total_texts': self.total_texts
+        }
+        arrays = {
+            'cms_table': self.sketch.table,
+            'hll_terms': self.distinct_terms.registers,
+            'hll_domains': self.distinct_domains.registers
+        }
+        return meta, arrays
+
+    @classmethod
+    def from_state(cls, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> 'StreamingWordCounter':
+        """由 to_state 的结果恢复（大小以保存的数组为准）"""
+        depth, width = arrays['cms_table'].shape
+        precision = int(np.log2(len(arrays['hll_terms'])))
+        counter = cls(meta['keyword'], meta['capacity'], width, depth, precision)
+        counter.top_words.counts = dict(meta['top_counts'])
+        counter.top_words.errors = dict(meta['top_errors'])
+        counter.top_words._heap = [(count, item) for item, count in counter.top_words.counts.items()]
+        heapq.heapify(counter.top_words._heap)
+        counter.sketch.table = np.array(arrays['cms_table'], dtype=np.int64)
+        counter.distinct_terms.registers = np.array(arrays['hll_terms'], dtype=np.uint8)
+        counter.distinct_domains.registers = np.array(arrays['hll_domains'], dtype=np.uint8)
+        counter.related_words = Counter(meta['related_words'])
+        counter.total_words = meta['total_words']
+        counter.total_texts = meta['total_texts']
+        return counter
+
+    def most_common(self, n: int) -> List[Tuple[str, int]]:
+        """估计的前 n 个高频词（Space-Saving 与 Count-Min 的上界取较小值，关键词相关的词用精确计数）"""
+        # 多取一些候选，收紧计数后重新排序
+        candidates = self.top_words.top(n * 2)
+        if not candidates:
+            return []
+        words = [word for word, _, _ in candidates]
+        estimates = np.minimum([count for _, count, _ in candidates], self.sketch.estimate(hash64(words)))
+        counts = {word: self.related_words.get(word, int(estimate)) for word, estimate in zip(words, estimates)}
+        return sorted(counts.items(), key=lambda pair: pair[1], reverse=True)[:n]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计规模和误差"""
+        return {
+            'total_texts': self.total_texts,
+            'total_words': self.total_words,
+            'tracked_words': len(self.top_words.counts),
+            'max_error': self.top_words.min_count(),
+            'distinct_terms_estimate': self.distinct_terms.estimate(),
+            'distinct_domains_estimate': self.distinct_domains.estimate()
+        }
+
+    def log_stats(self):
+        """输出流式统计"""
+        stats = self.get_stats()
+        logger.info(
+            f"流式词频统计: {stats['total_texts']} 段文本 / {stats['total_words']} 个词，"
+            f"约 {stats['distinct_terms_estimate']} 个不同的词、{stats['distinct_domains_estimate']} 个域名，"
+            f"高频词计数误差不超过 {stats['max_error']}"
+        )
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分词语料模型 - 每条结果只分词一次，所有指标共用同一份紧凑表示
+
+标题和内容转小写后切分为词元：中日韩文字按单字切分，其余按连续的字母数字切分；
+所有词元映射为整数 id，整个语料拼接成一个 int32 数组，并记录每条结果标题和内容的起始位置。
+查询词同样切分为词元序列，在整个数组上做一次向量化的连续匹配就能得到每条结果、
+每个字段中的出现情况。字母数字词元按子串匹配（首个词元匹配以它结尾的词元，末个词元
+匹配以它开头的词元，单个词元匹配包含它的词元），因此 "ai" 能匹配 "openai"，
+与原来 `word in text` 的子串匹配一致。中日韩文字旁边的空白记为断点，
+"小鸡 科技" 不会匹配查询词 "小鸡科技"。
+"""
+
+import re
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+CJK_RANGES = r'\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+TOKEN_PATTERN = re.compile(rf'[{CJK_RANGES}]|[^\W{CJK_RANGES}]+')
+# 与 TOKEN_PATTERN 相同，另外把中日韩文字与相邻词元之间的空白切分为断点
+CORPUS_TOKEN_PATTERN = re.compile(
+    rf'(?<=[{CJK_RANGES}])\s+(?=\w)|(?<=\w)\s+(?=[{CJK_RANGES}])|[{CJK_RANGES}]|[^\W{CJK_RANGES}]+')
+QUERY_WORD_PATTERN = re.compile(r'\b\w+\b')
+
+# 字段分隔符，保证查询词不会跨字段、跨结果匹配
+SEPARATOR = -1
+# 字段内的断点（中日韩文字旁的空白），查询词不会跨断点匹配，也不计入字段长度
+BREAK = -2
+TITLE, CONTENT = 0, 1
+
+
+def tokenize(text: str) -> List[str]:
+    """切分为词元（已转小写）"""
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+def _encode(text: str, vocab: Dict[str, int]) -> List[int]:
+    """切分语料文本并映射为词元 id，断点映射为 BREAK"""
+    return [BREAK if token.isspace() else vocab.setdefault(token, len(vocab))
+            for token in CORPUS_TOKEN_PATTERN.findall((text or '').lower())]
+
+
+class TokenizedCorpus:
+    """一批结果的分词语料"""
+
+    def __init__(self):
+        self.vocab: Dict[str, int] = {}
+        self.tokens = np.empty(0, dtype=np.int32)
+        # 每条结果一行：[标题起始, 内容起始, 结束]
+        self.offsets = np.empty((0, 3), dtype=np.int64)
+        # 每条结果标题和内容的词元数（不含断点）
+        self.lengths = np.empty((0, 2), dtype=np.int64)
+        self.content_chars = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def from_results(cls, results: Sequence[Dict[str, Any]]) -> 'TokenizedCorpus':
+        """对每条结果的标题和内容分词一次"""
+        corpus = cls()
+        vocab = corpus.vocab
+        ids: List[int] = []
+        offsets = []
+        lengths = []
+        content_chars = []
+
+        for result in results:
+            title = result.get('title') or ''
+            content = result.get('content') or ''
+            title_ids = _encode(title, vocab)
+            content_ids = _encode(content, vocab)
+            title_start = len(ids)
+            ids.extend(title_ids)
+            ids.append(SEPARATOR)
+            content_start = len(ids)
+            ids.extend(content_ids)
+            ids.append(SEPARATOR)
+            offsets.append((title_start, content_start, len(ids)))
+            lengths.append((len(title_ids) - title_ids.count(BREAK), len(content_ids) - content_ids.count(BREAK)))
+            content_chars.append(len(content))
+
+        corpus.tokens = np.asarray(ids, dtype=np.int32)
+        corpus.offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 3)
+        corpus.lengths = np.asarray(lengths, dtype=np.int64).reshape(-1, 2)
+        corpus.content_chars = np.asarray(content_chars, dtype=np.int64)
+        return corpus
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def field_lengths(self) -> np.ndarray:
+        """每条结果标题和内容的词元数（不含断点），形状 (结果数, 2)"""
+        return self.lengths
+
+    def _candidates(self, token: str, prefix: bool, suffix: bool) -> np.ndarray:
+        """
+        与查询词元匹配的语料词元 id
+
+        中日韩单字只匹配自身；字母数字词元按子串匹配：prefix 表示词元前面还可以有字符，
+        suffix 表示词元后面还可以有字符
+        """
+        if re.fullmatch(rf'[{CJK_RANGES}]', token) or not (prefix or suffix):
+            token_id = self.vocab.get(token)
+            return np.asarray([] if token_id is None else [token_id], dtype=np.int32)
+        if prefix and suffix:
+            matched = [token_id for word, token_id in self.vocab.items() if token in word]
+        elif prefix:
+            matched = [token_id for word, token_id in self.vocab.items() if word.endswith(token)]
+        else:
+            matched = [token_id for word, token_id in self.vocab.items() if word.startswith(token)]
+        return np.asarray(matched, dtype=np.int32)
+
+    def encode_query(self, query: str) -> List[List[np.ndarray]]:
+        """
+        把查询拆成去重后的查询词，每个词编码为逐位置的候选词元 id 集合
+
+        某个位置没有候选词元的查询词编码为空列表（不会匹配任何结果）
+        """
+        terms = []
+        for word in dict.fromkeys(QUERY_WORD_PATTERN.findall(query.lower())):
+            tokens = tokenize(word)
+            last = len(tokens) - 1
+            term = [self._candidates(token, prefix=(k == 0), suffix=(k == last))
+                    for k, token in enumerate(tokens)]
+            terms.append(term if term and all(len(ids) for ids in term) else [])
+        return terms
+
+    def match_positions(self, term: List[np.ndarray]) -> np.ndarray:
+        """查询词在拼接数组中出现的起始位置"""
+        length = len(term)
+        if length == 0 or length > len(self.tokens):
+            return np.empty(0, dtype=np.int64)
+        span = len(self.tokens) - length + 1
+        hits = np.ones(span, dtype=bool)
+        for k, ids in enumerate(term):
+            window = self.tokens[k:span + k]
+            hits &= window == ids[0] if len(ids) == 1 else np.isin(window, ids)
+        return np.flatnonzero(hits)
+
+    def occurrence_counts(self, terms: List[List[np.ndarray]]) -> np.ndarray:
+        """
+        每个查询词在每条结果各字段中的出现次数
+
+        Returns:
+            形状 (结果数, 查询词数, 2) 的数组，最后一维为 [标题, 内容]
+        """
+        n_docs = len(self)
+        counts = np.zeros((n_docs, len(terms), 2), dtype=np.int64)
+        if n_docs == 0:
+            return counts
+        for index, term in enumerate(terms):
+            positions = self.match_positions(term)
+            if len(positions) == 0:
+                continue
+            docs = np.searchsorted(self.offsets[:, 0], positions, side='right') - 1
+            fields = (positions >= self.offsets[docs, 1]).astype(np.int64)
+            counts[:, index, :] = np.bincount(docs * 2 + fields, minlength=n_docs * 2).reshape(n_docs, 2)
+        return counts
+
+    def presence(self, terms: List[List[np.ndarray]]) -> np.ndarray:
+        """
+        每条结果的标题、内容中出现了几个不同的查询词
+
+        Returns:
+            形状 (结果数, 2) 的数组
+        """
+        return (self.occurrence_counts(terms) > 0).sum(axis=1)
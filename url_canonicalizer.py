@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+来源 URL 规范化 - 去掉跟踪参数、统一主机和路径、解析跳转链接
+
+DeepSeek 和搜索引擎给出的来源链接经常带 utm_* 等跟踪参数，或者是 baidu.com/link?url=
+这类跳转链接，同一篇文章会以多个不同的字符串出现。canonicalize 在本地完成参数和格式的
+规范化；跳转链接通过连接池 HEAD 请求解析最终地址，映射写入带过期时间的本地缓存。
+所有提取器和抓取器都按规范化后的 URL 去重。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import posixpath
+import re
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import URL_CANONICAL_CONFIG
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+# 路径中保持编码的保留字符（%2F 解码成 / 会变成另一个路径）：! # $ % & ' ( ) * + , / : ; = ? @ [ ]
+RESERVED_ESCAPE_PATTERN = re.compile(r'(%(?:2[1346-9A-Ca-cFf]|25|3[ABDFabdf]|40|5[BDbd]))')
+PATH_SAFE_CHARS = "/:@!$&'()*+,;=-._~"
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in URL_CANONICAL_CONFIG['tracking_params'] or any(
+        name.startswith(prefix) for prefix in URL_CANONICAL_CONFIG['tracking_prefixes'])
+
+
+def _matches(pattern: str, parts) -> bool:
+    """pattern 形如 "baidu.com/link"：主机相同或为其子域名，且路径以该前缀开头"""
+    pattern_host, _, pattern_path = pattern.partition('/')
+    host = (parts.hostname or '').rstrip('.')
+    if host != pattern_host and not host.endswith('.' + pattern_host):
+        return False
+    return parts.path.startswith('/' + pattern_path)
+
+
+def _unwrap(parts) -> Optional[str]:
+    """从 google.com/url?q= 这类把目标地址放在参数里的跳转链接中取出目标地址"""
+    for pattern, param in URL_CANONICAL_CONFIG['wrapper_params'].items():
+        if _matches(pattern, parts):
+            for name, value in parse_qsl(parts.query):
+                if name == param and value.startswith('http'):
+                    return value
+    return None
+
+
+def _normalize_escapes(path: str) -> str:
+    """统一路径的百分号编码：非保留字符（含中文）统一编码，保留字符的转义原样保留（十六进制大写）"""
+    pieces = RESERVED_ESCAPE_PATTERN.split(path)
+    return ''.join(piece.upper() if index % 2 else quote(unquote(piece), safe=PATH_SAFE_CHARS)
+                   for index, piece in enumerate(pieces))
+
+
+def canonicalize(url: str) -> str:
+    """
+    本地规范化 URL（不发网络请求）
+
+    - 协议和主机转小写，去掉默认端口、末尾的点和 www. 前缀
+    - 合并重复斜杠、解析 ./ 和 ../，去掉末尾斜杠
+    - 去掉跟踪参数，其余参数按名称排序
+    - 去掉 #片段，单页应用的路由片段（#/、#!）和 keep_fragment_hosts 中主机的片段除外
+    - 展开参数中直接带有目标地址的跳转链接
+    """
+    if not url:
+        return url
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    if parts.scheme.lower() not in DEFAULT_PORTS or not parts.netloc:
+        return url
+
+    target = _unwrap(parts)
+    if target and target != url:
+        return canonicalize(target)
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').rstrip('.')
+    if URL_CANONICAL_CONFIG['strip_www'] and host.startswith('www.'):
+        host = host[4:]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port is None or str(port) == DEFAULT_PORTS[scheme] else f"{host}:{port}"
+
+    path = re.sub(r'/{2,}', '/', parts.path or '/')
+    path = posixpath.normpath(path) if path not in ('', '/') else '/'
+    if not path.startswith('/'):
+        path = '/' + path
+    # 统一百分号编码（已编码与未编码的中文路径视为同一地址）
+    path = _normalize_escapes(path)
+    if len(path) > 1:
+        path = path.rstrip('/')
+
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not _is_tracking_param(name)]
+    query.sort()
+    return urlunsplit((scheme, netloc, path, urlencode(query), _keep_fragment(parts)))
+
+
+def _keep_fragment(parts) -> str:
+    """需要保留的 #片段，不需要时返回空字符串"""
+    fragment = parts.fragment
+    if not fragment:
+        return ''
+    if fragment.startswith(tuple(URL_CANONICAL_CONFIG['route_fragment_prefixes'])):
+        return fragment
+    if any(_matches(pattern, parts) for pattern in URL_CANONICAL_CONFIG['keep_fragment_hosts']):
+        return fragment
+    return ''
+
+
+def needs_resolution(url: str) -> bool:
+    """是否为需要请求才能知道目标地址的跳转链接"""
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return False
+    return any(_matches(pattern, parts) for pattern in URL_CANONICAL_CONFIG['redirect_patterns'])
+
+
+class URLCanonicalizer:
+    """带跳转解析缓存的 URL 规范化器"""
+
+    def __init__(self, cache_file: Optional[str] = None, ttl: Optional[float] = None):
+        """
+        初始化 URL 规范化器
+
+        Args:
+            cache_file: 跳转映射缓存文件
+            ttl: 缓存有效期（秒）
+        """
+        self.cache_file = cache_file or URL_CANONICAL_CONFIG['cache_file']
+        self.ttl = ttl or URL_CANONICAL_CONFIG['ttl']
+        self.cache: Dict[str, Dict[str, Any]] = self._load_cache()
+        self.dirty = False
+
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': URL_CANONICAL_CONFIG['user_agent']})
+        adapter = HTTPAdapter(pool_connections=URL_CANONICAL_CONFIG['max_concurrency'],
+                              pool_maxsize=URL_CANONICAL_CONFIG['max_concurrency'])
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        # 统计信息
+        self.cache_hits = 0
+        self.head_requests = 0
+        self.resolve_failures = 0
+        self.duplicates_removed = 0
+
+    # ---------- 缓存 ----------
+
+    def _load_cache(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        now = time.time()
+        return {url: entry for url, entry in cache.items() if entry.get('expires', 0) > now}
+
+    def save(self):
+        """把跳转映射写入缓存文件（有新增时）"""
+        if not self.dirty:
+            return
+        try:
+            directory = os.path.dirname(self.cache_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump(self.cache, f, ensure_ascii=False, indent=2)
+            self.dirty = False
+        except Exception as e:
+            logger.warning(f"保存 URL 缓存失败: {e}")
+
+    # ---------- 跳转解析 ----------
+
+    def _head(self, url: str) -> str:
+        response = self.session.head(url, allow_redirects=True, timeout=URL_CANONICAL_CONFIG['timeout'])
+        # 部分跳转服务不支持 HEAD，改用不读取正文的 GET
+        if response.status_code in (405, 501):
+            response = self.session.get(url, allow_redirects=True, stream=True,
+                                        timeout=URL_CANONICAL_CONFIG['timeout'])
+            response.close()
+        return response.url
+
+    async def resolve(self, url: str) -> str:
+        """
+        返回规范化后的最终地址（跳转链接通过 HEAD 请求解析，结果缓存）
+        """
+        canonical = canonicalize(url)
+        if not needs_resolution(canonical):
+            return canonical
+
+        entry = self.cache.get(canonical)
+        if entry and entry.get('expires', 0) > time.time():
+            self.cache_hits += 1
+            return entry['canonical']
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(URL_CANONICAL_CONFIG['max_concurrency'])
+        async with self._semaphore:
+            try:
+                self.head_requests += 1
+                final_url = await asyncio.to_thread(self._head, url)
+            except requests.RequestException as e:
+                self.resolve_failures += 1
+                logger.debug(f"解析跳转失败 {url[:60]}: {e}")
+                return canonical
+
+        resolved = canonicalize(final_url)
+        self.cache[canonical] = {'canonical': resolved, 'expires': time.time() + self.ttl}
+        self.dirty = True
+        return resolved
+
+    async def resolve_many(self, urls: List[str]) -> List[str]:
+        """并发解析多个 URL（顺序与输入一致）"""
+        return list(await asyncio.gather(*(self.resolve(url) for url in urls)))
+
+    async def dedupe(self, items: List[Any], key: str = 'url') -> List[Any]:
+        """
+        按规范化地址去重
+
+        Args:
+            items: URL 字符串列表，或包含 key 字段的字典列表
+            key: 字典中 URL 所在的字段
+
+        Returns:
+            去重后的列表（保留第一次出现的项和顺序）；地址本身不改动，
+            字典项增加 canonical_url 字段（规范化只用于判断重复，访问时仍使用原地址）
+        """
+        urls = [item if isinstance(item, str) else item.get(key, '') for item in items]
+        resolved = await self.resolve_many(urls)
+
+        unique: Dict[str, Any] = {}
+        for item, original, canonical in zip(items, urls, resolved):
+            if canonical in unique:
+                continue
+            if isinstance(item, str):
+                unique[canonical] = original
+            else:
+                unique[canonical] = {**item, 'canonical_url': canonical}
+
+        self.duplicates_removed += len(items) - len(unique)
+        self.save()
+        return list(unique.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取规范化统计"""
+        return {
+            'cache_size': len(self.cache),
+            'cache_hits': self.cache_hits,
+            'head_requests': self.head_requests,
+            'resolve_failures': self.resolve_failures,
+            'duplicates_removed': self.duplicates_removed
+        }
+
+    def log_stats(self):
+        """输出规范化统计"""
+        stats = self.get_stats()
+        logger.info(
+            f"URL 规范化统计: 去除重复 {stats['duplicates_removed']} 个，HEAD 请求 {stats['head_requests']} 次，"
+            f"缓存命中 {stats['cache_hits']} 次，解析失败 {stats['resolve_failures']} 次"
+        )
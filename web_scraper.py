@@ -10,7 +10,10 @@ from playwright.async_api import async_playwright, Browser, Page
 from bs4 import BeautifulSoup
 import requests
 
-from config import AI_WEBSITES, SEARCH_CONFIG, DATA_CONFIG
+from config import AI_WEBSITES, SEARCH_CONFIG, DATA_CONFIG, DEADLINE_CONFIG
+from browser_supervisor import BrowserSupervisor
+from deadline import Deadline, DeadlineExceeded
+from resource_policy import ResourcePolicy
 
 # 设置日志
 logging.basicConfig(
@@ -28,6 +31,9 @@ class WebScraper:
         self.browser: Optional[Browser] = None
         self.page: Optional[Page] = None
         self.results = []
+        self.resource_policy = ResourcePolicy()
+        self.deadline = Deadline()
+        self.supervisor = BrowserSupervisor(self, page_setup=self._setup_page)
         
     async def init_browser(self):
         """初始化浏览器"""
@@ -59,10 +65,16 @@ class WebScraper:
                 ignore_https_errors=True,
             )
             
+            # 拦截图片、字体和追踪请求
+            await self.resource_policy.apply(context)
+            
             self.page = await context.new_page()
             
             # 设置页面超时
-            self.page.set_default_timeout(SEARCH_CONFIG['timeout'] * 1000)
+            await self._setup_page(self.page)
+            
+            # 监听浏览器断开和页面崩溃
+            self.supervisor.attach()
             
             logger.info("浏览器初始化成功")
             return True
@@ -73,6 +85,9 @@ class WebScraper:
                 await self.playwright.stop()
             return False
         
+    async def _setup_page(self, page):
+        page.set_default_timeout(SEARCH_CONFIG['timeout'] * 1000)
+        
     async def close_browser(self):
         """关闭浏览器"""
         try:
@@ -82,6 +97,7 @@ class WebScraper:
                 await self.browser.close()
             if hasattr(self, 'playwright'):
                 await self.playwright.stop()
+            self.resource_policy.log_stats()
             logger.info("浏览器已关闭")
         except Exception as e:
             logger.error(f"关闭浏览器时出错: {e}")
@@ -98,8 +114,8 @@ class WebScraper:
                 return results
             
             # 访问网站主页
-            await self.page.goto(website['url'], timeout=SEARCH_CONFIG['timeout'] * 1000)
-            await self.page.wait_for_timeout(SEARCH_CONFIG['wait_time'] * 1000)
+            await self.page.goto(website['url'], timeout=self.deadline.timeout_ms(SEARCH_CONFIG['timeout'] * 1000))
+            await self.deadline.sleep(self.page, SEARCH_CONFIG['wait_time'] * 1000)
             
             # 检查是否为聊天形式的网站
             if website.get('is_chat', False):
@@ -109,6 +125,8 @@ class WebScraper:
             
             logger.info(f"从 {website['name']} 获取到 {len(results)} 个结果")
             
+        except DeadlineExceeded as e:
+            logger.warning(f"搜索 {website['name']} 时{e}")
         except Exception as e:
             logger.error(f"搜索 {website['name']} 时出错: {e}")
             
@@ -121,8 +139,9 @@ class WebScraper:
             # 等待聊天输入框出现
             chat_input = None
             for selector in website['search_selector'].split(', '):
+                self.deadline.check()
                 try:
-                    chat_input = await self.page.wait_for_selector(selector.strip(), timeout=10000)
+                    chat_input = await self.page.wait_for_selector(selector.strip(), timeout=self.deadline.timeout_ms(10000))
                     if chat_input:
                         break
                 except:
@@ -137,14 +156,14 @@ class WebScraper:
             
             # 输入聊天内容
             await chat_input.fill(chat_prompt)
-            await self.page.wait_for_timeout(1000)
+            await self.deadline.sleep(self.page, 1000)
             
             # 发送消息（通常是按Enter键）
             await chat_input.press('Enter')
             
             # 等待回复
             logger.info(f"等待 {website['name']} 回复...")
-            await self.page.wait_for_timeout(SEARCH_CONFIG['chat_wait_time'] * 1000)
+            await self.deadline.sleep(self.page, SEARCH_CONFIG['chat_wait_time'] * 1000)
             
             # 尝试多次等待回复
             for attempt in range(SEARCH_CONFIG['max_chat_attempts']):
@@ -175,6 +194,9 @@ class WebScraper:
                                             results.append(result)
                                             logger.info(f"获取到 {website['name']} 回复: {response_text[:50]}...")
                                             break
+                                    except Exception as e:
+                                        logger.debug(f"读取回复元素失败: {e}")
+                                        continue
                         except Exception as e:
                             logger.debug(f"选择器 {selector} 失败: {e}")
                             continue
@@ -183,15 +205,17 @@ class WebScraper:
                         break
                     else:
                         # 如果没找到回复，再等一下
-                        await self.page.wait_for_timeout(3000)
+                        await self.deadline.sleep(self.page, 3000)
                         
                 except Exception as e:
                     logger.debug(f"第 {attempt + 1} 次尝试获取回复失败: {e}")
-                    await self.page.wait_for_timeout(2000)
+                    await self.deadline.sleep(self.page, 2000)
             
             if not results:
                 logger.warning(f"未能从 {website['name']} 获取到回复")
                 
+        except DeadlineExceeded as e:
+            logger.warning(f"聊天搜索 {website['name']} 时{e}，返回已获取的回复")
         except Exception as e:
             logger.error(f"聊天搜索 {website['name']} 时出错: {e}")
             
@@ -204,8 +228,9 @@ class WebScraper:
             # 尝试查找搜索框
             search_input = None
             for selector in website['search_selector'].split(', '):
+                self.deadline.check()
                 try:
-                    search_input = await self.page.wait_for_selector(selector.strip(), timeout=5000)
+                    search_input = await self.page.wait_for_selector(selector.strip(), timeout=self.deadline.timeout_ms(5000))
                     if search_input:
                         break
                 except:
@@ -215,12 +240,12 @@ class WebScraper:
                 # 在搜索框中输入关键词
                 await search_input.fill(query)
                 await search_input.press('Enter')
-                await self.page.wait_for_timeout(SEARCH_CONFIG['wait_time'] * 1000)
+                await self.deadline.sleep(self.page, SEARCH_CONFIG['wait_time'] * 1000)
             else:
                 # 直接访问搜索URL
                 search_url = website['search_url'].format(query=query)
-                await self.page.goto(search_url, timeout=SEARCH_CONFIG['timeout'] * 1000)
-                await self.page.wait_for_timeout(SEARCH_CONFIG['wait_time'] * 1000)
+                await self.page.goto(search_url, timeout=self.deadline.timeout_ms(SEARCH_CONFIG['timeout'] * 1000))
+                await self.deadline.sleep(self.page, SEARCH_CONFIG['wait_time'] * 1000)
             
             # 获取页面内容
             page_content = await self.page.content()
@@ -281,14 +306,24 @@ class WebScraper:
                     logger.error(f"提取搜索结果时出错: {e}")
                     continue
                     
+        except DeadlineExceeded as e:
+            logger.warning(f"普通搜索 {website['name']} 时{e}，返回已获取的结果")
         except Exception as e:
             logger.error(f"普通搜索 {website['name']} 时出错: {e}")
             
         return results
     
-    async def scrape_all_websites(self, query: str) -> List[Dict]:
-        """在所有配置的网站上搜索关键词"""
+    async def scrape_all_websites(self, query: str, budget: Optional[float] = None) -> List[Dict]:
+        """
+        在所有配置的网站上搜索关键词
+        
+        Args:
+            query: 搜索关键词
+            budget: 任务时间预算（秒），默认使用 DEADLINE_CONFIG['scraper_job_budget']；
+                    预算耗尽后停止访问剩余网站并返回已获取的结果
+        """
         all_results = []
+        self.deadline = Deadline(budget if budget is not None else DEADLINE_CONFIG['scraper_job_budget'])
         
         try:
             # 初始化浏览器
@@ -297,12 +332,17 @@ class WebScraper:
                 return all_results
             
             for website in AI_WEBSITES:
+                if self.deadline.expired():
+                    logger.warning(f"任务时间预算耗尽，跳过剩余网站，已获取 {len(all_results)} 个结果")
+                    break
+                
                 try:
-                    results = await self.search_website(website, query)
+                    # 浏览器崩溃或页面卡死时自动恢复并重新搜索该网站一次
+                    results = await self.supervisor.run(lambda: self.search_website(website, query), default=[])
                     all_results.extend(results)
                     
                     # 添加延迟避免被反爬
-                    await asyncio.sleep(2)
+                    await asyncio.sleep(min(2, self.deadline.remaining()))
                     
                 except Exception as e:
                     logger.error(f"处理网站 {website['name']} 时出错: {e}")
@@ -312,6 +352,7 @@ class WebScraper:
             logger.error(f"搜索过程中出错: {e}")
         finally:
             await self.close_browser()
+            self.supervisor.log_stats()
             
         return all_results
     